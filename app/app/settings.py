@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +44,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # La primera, para que el tiempo total de Server-Timing incluya el resto de middlewares.
+    'pokemon.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -51,6 +54,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # La ultima, porque perfila la vista desde process_view (ver POKEMON_PROFILING).
+    'pokemon.profiling.ProfilingMiddleware',
 ]
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -110,6 +115,27 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'pokemon-api',
+    },
+    # Versiones de la cache de respuestas, del vocabulario y del indice de busqueda. Tienen que estar
+    # en un backend compartido por todos los procesos para que una escritura en uno invalide las
+    # copias del resto (ver el check pokemon.E001). Este vale para los procesos de una misma maquina;
+    # con varias maquinas hay que usar un backend de red como memcached.
+    'pokemon-versions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': Path(tempfile.gettempdir()) / 'pokemon-api-versions',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 1000000},
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -133,7 +159,15 @@ REST_FRAMEWORK = {
     # or allow read-only access for unauthenticated users.
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.DjangoModelPermissionsOrAnonReadOnly'
-    ]
+    ],
+    # JSON con orjson (mismos bytes que el JSONRenderer de DRF) y MessagePack con
+    # Accept: application/msgpack si msgpack esta instalado (ver pokemon/renderers.py).
+    'DEFAULT_RENDERER_CLASSES': [
+        'pokemon.renderers.ORJSONRenderer',
+        'pokemon.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_CONTENT_NEGOTIATION_CLASS': 'pokemon.renderers.ContentNegotiation',
 }
 
 
@@ -160,3 +194,85 @@ STATIC_URL = '/static/'
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Pokemon API
+# Tamaño maximo de pagina para la paginacion por cursor y tamaño de bloque del modo streaming.
+
+POKEMON_PAGE_MAX_LIMIT = 1000
+
+POKEMON_STREAM_CHUNK_SIZE = 500
+
+# Numero de pokemons que se validan e insertan por bloque en la importacion masiva.
+POKEMON_IMPORT_BATCH_SIZE = 500
+
+# Segundos que se guarda el numero de resultados de cada filtro del listado, con el que se elige
+# como ejecutar la consulta (ver pokemon/filters.py).
+POKEMON_FILTER_ESTIMATE_TIMEOUT = 60 * 10
+
+# Cache de respuestas de get/id/<id>, score/<id> y all-pokemons-registered. Las escrituras invalidan
+# las entradas afectadas, por lo que TIMEOUT solo limita cuanto ocupan las entradas sin uso.
+# Las respuestas se guardan en CACHE_ALIAS, que puede ser propia de cada proceso, y las versiones
+# que las invalidan en VERSION_CACHE_ALIAS, que tiene que ser compartida.
+POKEMON_RESPONSE_CACHE = {
+    'ENABLED': True,
+    'CACHE_ALIAS': 'default',
+    'VERSION_CACHE_ALIAS': 'pokemon-versions',
+    'TIMEOUT': 60 * 60,
+}
+
+# Cliente de la pokeapi. Los tiempos de la cache estan en segundos: CACHE_TTL es el tiempo que una
+# respuesta se considera fresca, CACHE_STALE_TTL el tiempo extra en el que se sirve caducada mientras
+# se refresca en segundo plano y CACHE_NEGATIVE_TTL el tiempo que se recuerda un 404.
+# Las llamadas HTTP usan un pool de POOL_SIZE conexiones keep-alive, timeouts de conexion y lectura,
+# MAX_RETRIES reintentos con backoff exponencial con jitter y un circuit breaker que deja de llamar
+# a la pokeapi durante CIRCUIT_RESET_TIMEOUT segundos tras CIRCUIT_FAILURE_THRESHOLD fallos seguidos.
+POKEAPI = {
+    'BASE_URL': 'https://pokeapi.co/api/v2',
+    'CACHE_ALIAS': 'default',
+    'CACHE_TTL': 60 * 60 * 24,
+    'CACHE_STALE_TTL': 60 * 60 * 24 * 7,
+    'CACHE_NEGATIVE_TTL': 60 * 5,
+    'CACHE_MAX_ENTRIES': 2048,
+    # Las peticiones simultaneas de un mismo pokemon se agrupan en una sola llamada a la pokeapi.
+    # Con CACHE_DISTRIBUTED_LOCK tambien entre procesos, si el backend de cache es compartido.
+    'CACHE_DISTRIBUTED_LOCK': False,
+    'CACHE_LOCK_TIMEOUT': 10,
+    'CONNECT_TIMEOUT': 3.05,
+    'READ_TIMEOUT': 10,
+    'MAX_RETRIES': 2,
+    'BACKOFF_BASE': 0.1,
+    'BACKOFF_MAX': 2,
+    'POOL_SIZE': 10,
+    'CIRCUIT_FAILURE_THRESHOLD': 5,
+    'CIRCUIT_RESET_TIMEOUT': 30,
+    # find/batch acepta como mucho BATCH_MAX_NAMES nombres y consulta BATCH_CONCURRENCY a la vez.
+    'BATCH_MAX_NAMES': 50,
+    'BATCH_CONCURRENCY': 8,
+    # Si es True, find/name-id busca primero en la base de datos local (ver ingest_pokeapi_dump).
+    'LOCAL_MIRROR': False,
+    # `manage.py sync_pokemon` consulta SYNC_CONCURRENCY pokemons a la vez, sin pasar de
+    # SYNC_RATE_LIMIT llamadas por segundo entre todos los hilos (0 = sin limite), y guarda los
+    # cambios en transacciones de SYNC_BATCH_SIZE pokemons.
+    'SYNC_CONCURRENCY': 8,
+    'SYNC_RATE_LIMIT': 10,
+    'SYNC_BATCH_SIZE': 100,
+}
+
+# Metricas por peticion: cabecera Server-Timing con el tiempo de base de datos, serializacion y
+# llamadas a la pokeapi, e histogramas por endpoint en /metrics (formato de Prometheus).
+POKEMON_METRICS = {
+    'ENABLED': True,
+    'SERVER_TIMING': True,
+}
+
+# Perfilado opcional de las vistas (ver pokemon/profiling.py). Con ENABLED se perfilan las peticiones
+# con la cabecera HEADER firmada (`manage.py profiles --token`) y una fraccion SAMPLE_RATE del resto.
+# Los perfiles (FORMAT 'pstats' o 'collapsed') se guardan en DIRECTORY, por defecto en el directorio
+# temporal del sistema, conservando los MAX_PROFILES mas recientes. Se consultan con `manage.py profiles`.
+POKEMON_PROFILING = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 0.0,
+    'FORMAT': 'pstats',
+    'MAX_PROFILES': 100,
+}
@@ -1,7 +1,10 @@
 from django.contrib import admin
 from django.urls import include, path
 
+from pokemon.views import metrics
+
 urlpatterns = [
+    path('metrics', metrics, name='metrics'),
     path('pokemon/', include('pokemon.urls')),
     path('admin/', admin.site.urls),
 ]
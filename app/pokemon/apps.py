@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class PokemonConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'pokemon'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import signals  # noqa: F401
+        from .metrics import install_query_recorder
+        from .vocabulary import WARM_DISPATCH_UID, warm_vocabularies
+
+        # Los ids de tipos y habilidades se cargan con la primera conexion y no aqui, porque
+        # durante la inicializacion la base de datos puede no estar lista todavia.
+        connection_created.connect(warm_vocabularies, dispatch_uid=WARM_DISPATCH_UID)
+        # Numero y tiempo de las consultas de cada peticion (ver metrics.py).
+        connection_created.connect(install_query_recorder, dispatch_uid='pokemon_install_query_recorder')
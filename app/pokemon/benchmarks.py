@@ -0,0 +1,463 @@
+"""Benchmarks de rendimiento de la API de pokemons.
+
+Se ejecutan con ``python manage.py benchmark <nombre>``. Cada benchmark crea sus propios
+datos dentro de una transaccion que se revierte al terminar, por lo que la base de datos
+configurada queda intacta.
+"""
+import random
+import statistics
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.db import transaction
+
+from .documents import refresh_documents
+from .models import Ability, Pokemon, Stat, Type
+from .service import numpy
+
+BENCHMARKS = {}
+
+TYPE_NAMES = [
+    'normal', 'fire', 'water', 'grass', 'electric', 'ice', 'fighting', 'poison', 'ground',
+    'flying', 'psychic', 'bug', 'rock', 'ghost', 'dragon', 'dark', 'steel', 'fairy',
+]
+ABILITY_NAMES = [f'ability-{index}' for index in range(300)]
+
+
+def benchmark(name):
+    """Registra una funcion como benchmark disponible en el comando ``benchmark``."""
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+
+@contextmanager
+def rolled_back():
+    """Ejecuta el bloque dentro de una transaccion que siempre se revierte."""
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def rendered(response):
+    """Renderiza las respuestas de DRF; las que construyen su contenido en la vista ya lo estan."""
+    return response.render() if hasattr(response, 'render') else response
+
+
+def measure(func, iterations):
+    """Ejecuta ``func`` varias veces y devuelve la mediana y el p99 en milisegundos."""
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'median_ms': statistics.median(timings),
+        'p99_ms': timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+    }
+
+
+def seed_pokemons(count, start=1, with_details=False, batch_size=5000, seed=0):
+    """Inserta ``count`` pokemons sinteticos con pokemon_id consecutivos a partir de ``start``.
+    Args:
+        count (int): Numero de pokemons a crear.
+        start (int): Primer pokemon_id.
+        with_details (bool): Si es True tambien crea tipos, habilidades, estadisticas y documentos.
+        batch_size (int): Tamaño de cada bulk_create.
+        seed (int): Semilla para que los datos sean reproducibles.
+    """
+    rng = random.Random(seed + start)
+    types = abilities = None
+    if with_details:
+        types = [Type.objects.get_or_create(name=name)[0] for name in TYPE_NAMES]
+        abilities = [Ability.objects.get_or_create(name=name)[0] for name in ABILITY_NAMES]
+
+    for offset in range(0, count, batch_size):
+        pokemons = [
+            Pokemon(
+                id=uuid.uuid4(),
+                pokemon_id=pokemon_id,
+                name=f'pokemon-{pokemon_id}',
+                height=rng.randint(1, 200),
+                weight=rng.randint(1, 10000),
+                sprite_url=f'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/{pokemon_id}.png',
+            )
+            for pokemon_id in range(start + offset, start + min(offset + batch_size, count))
+        ]
+        Pokemon.objects.bulk_create(pokemons, batch_size=batch_size)
+        if not with_details:
+            continue
+
+        Stat.objects.bulk_create([
+            Stat(
+                pokemon=pokemon,
+                hp=rng.randint(1, 255),
+                attack=rng.randint(1, 255),
+                defense=rng.randint(1, 255),
+                special_attack=rng.randint(1, 255),
+                special_defense=rng.randint(1, 255),
+                speed=rng.randint(1, 255),
+            )
+            for pokemon in pokemons
+        ], batch_size=batch_size)
+        Pokemon.types.through.objects.bulk_create([
+            Pokemon.types.through(pokemon_id=pokemon.pk, type_id=type_instance.pk)
+            for pokemon in pokemons
+            for type_instance in rng.sample(types, rng.randint(1, 2))
+        ], batch_size=batch_size)
+        Pokemon.abilities.through.objects.bulk_create([
+            Pokemon.abilities.through(pokemon_id=pokemon.pk, ability_id=ability.pk)
+            for pokemon in pokemons
+            for ability in rng.sample(abilities, rng.randint(1, 3))
+        ], batch_size=batch_size)
+        refresh_documents(
+            Pokemon.objects.filter(pokemon_id__gte=start + offset, pokemon_id__lt=start + offset + batch_size),
+            batch_size=batch_size,
+        )
+
+
+@benchmark('lookup')
+def bench_lookup(sizes, iterations, write):
+    """Latencia de las busquedas por pokemon_id y name a medida que crece la tabla."""
+    write(f"{'rows':>10} {'by pokemon_id (median/p99 ms)':>32} {'by name (median/p99 ms)':>28}")
+    with rolled_back():
+        seeded = 0
+        for size in sorted(sizes):
+            seed_pokemons(size - seeded, start=seeded + 1)
+            seeded = size
+            rng = random.Random(size)
+
+            by_id = measure(lambda: Pokemon.objects.get(pokemon_id=rng.randint(1, size)), iterations)
+            by_name = measure(lambda: Pokemon.objects.get(name=f'pokemon-{rng.randint(1, size)}'), iterations)
+            write(
+                f"{size:>10} {by_id['median_ms']:>18.3f} / {by_id['p99_ms']:<11.3f}"
+                f"{by_name['median_ms']:>16.3f} / {by_name['p99_ms']:<9.3f}"
+            )
+        write(Pokemon.objects.filter(pokemon_id=1).explain())
+
+
+def pokemon_payloads(count, start=1, seed=0):
+    """Genera ``count`` pokemons con el formato de entrada de add_pokemon."""
+    rng = random.Random(seed + start)
+    for pokemon_id in range(start, start + count):
+        yield {
+            'pokemon_id': pokemon_id,
+            'name': f'pokemon-{pokemon_id}',
+            'height': rng.randint(1, 200),
+            'weight': rng.randint(1, 10000),
+            'sprite_url': f'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/{pokemon_id}.png',
+            'types': rng.sample(TYPE_NAMES, rng.randint(1, 2)),
+            'abilities': rng.sample(ABILITY_NAMES, rng.randint(1, 3)),
+            'base_stats': {
+                stat: rng.randint(1, 255)
+                for stat in ('hp', 'attack', 'defense', 'special_attack', 'special_defense', 'speed')
+            },
+        }
+
+
+@benchmark('bulk_import')
+def bench_bulk_import(sizes, iterations, write):
+    """Pokemons por segundo importados con PokemonImporter sobre una tabla vacia."""
+    from .importer import PokemonImporter
+
+    write(f"{'pokemons':>10} {'seconds':>10} {'pokemons/s':>12}")
+    for size in sorted(sizes):
+        with rolled_back():
+            payloads = list(pokemon_payloads(size))
+            start = time.perf_counter()
+            report = PokemonImporter().run(payloads)
+            elapsed = time.perf_counter() - start
+        write(f"{report['created']:>10} {elapsed:>10.3f} {report['created'] / elapsed:>12.0f}")
+
+
+@benchmark('score')
+def bench_score(sizes, iterations, write):
+    """Puntaje de todo el catalogo con calculate_score fila a fila frente a calculate_scores."""
+    from .service import STAT_FIELDS, ScoreService
+
+    write(f"{'pokemons':>10} {'scalar (ms)':>12} {'batch (ms)':>12} {'speedup':>9}")
+    for size in sorted(sizes):
+        rng = random.Random(size)
+        stats = [[rng.randint(1, 255) for _ in STAT_FIELDS] for _ in range(size)]
+        type_counts = [rng.randint(1, 2) for _ in range(size)]
+        ability_counts = [rng.randint(1, 3) for _ in range(size)]
+        heights = [rng.randint(1, 200) for _ in range(size)]
+        weights = [rng.randint(1, 10000) for _ in range(size)]
+        # Entradas de calculate_score tal como las produce PokemonSerializer.
+        rows = [
+            {
+                'types': TYPE_NAMES[:type_counts[index]],
+                'abilities': ABILITY_NAMES[:ability_counts[index]],
+                'base_stats': dict(zip(STAT_FIELDS, stats[index])),
+                'height': heights[index],
+                'weight': weights[index],
+            }
+            for index in range(size)
+        ]
+        if numpy is not None:
+            columns = (numpy.array(stats), numpy.array(type_counts), numpy.array(ability_counts),
+                       numpy.array(heights), numpy.array(weights))
+        else:
+            columns = (stats, type_counts, ability_counts, heights, weights)
+
+        runs = max(1, iterations // 100)
+        scalar = measure(lambda: [ScoreService.calculate_score(row)['pokemon_score'] for row in rows], runs)
+        batch = measure(lambda: ScoreService.calculate_scores(*columns), runs)
+        expected = [ScoreService.calculate_score(row)['pokemon_score'] for row in rows]
+        assert list(ScoreService.calculate_scores(*columns)) == expected, 'calculate_scores differs from calculate_score'
+        write(
+            f"{size:>10} {scalar['median_ms']:>12.2f} {batch['median_ms']:>12.2f} "
+            f"{scalar['median_ms'] / batch['median_ms']:>8.0f}x"
+        )
+
+
+FILTER_QUERIES = {
+    'type': {'types': 'dragon'},
+    'types any': {'types': 'dragon,ice'},
+    'types all': {'types': 'fire,flying', 'types_match': 'all'},
+    'ability': {'abilities': 'ability-7'},
+    'min_attack': {'min_attack': '240'},
+    'speed range': {'min_speed': '100', 'max_speed': '110'},
+    'weight range': {'min_weight': '9000', 'max_weight': '9100'},
+    'type + min_speed': {'types': 'dragon', 'min_speed': '200'},
+    'ability + weight': {'abilities': 'ability-7', 'min_weight': '5000'},
+}
+
+
+@benchmark('filter')
+def bench_filter(sizes, iterations, write):
+    """Latencia de los filtros del listado: primera pagina de 50 pokemons (como ?limit=50) y
+    numero total de resultados."""
+    from .filters import filter_pokemons
+
+    def page(params):
+        queryset = filter_pokemons(Pokemon.objects.all(), params, limit=50).order_by('pokemon_id')
+        return list(queryset.values_list('pokemon_id', flat=True)[:51])
+
+    write(f"{'rows':>10}  {'filter':<18} {'matches':>8} {'page (median/p99 ms)':>24} {'count (median/p99 ms)':>24}")
+    with rolled_back():
+        seeded = 0
+        for size in sorted(sizes):
+            seed_pokemons(size - seeded, start=seeded + 1, with_details=True)
+            seeded = size
+            for label, params in FILTER_QUERIES.items():
+                page_timings = measure(lambda: page(params), iterations)
+                count = measure(lambda: filter_pokemons(Pokemon.objects.all(), params).count(), max(1, iterations // 10))
+                write(
+                    f"{size:>10}  {label:<18} {filter_pokemons(Pokemon.objects.all(), params).count():>8} "
+                    f"{page_timings['median_ms']:>12.3f} / {page_timings['p99_ms']:<9.3f}"
+                    f"{count['median_ms']:>12.3f} / {count['p99_ms']:<9.3f}"
+                )
+        for label in ('type', 'types all', 'type + min_speed'):
+            queryset = filter_pokemons(Pokemon.objects.all(), FILTER_QUERIES[label], limit=50).order_by('pokemon_id')
+            write(f'{label}: {queryset.values_list("pokemon_id", flat=True)[:51].explain()}')
+
+
+NAME_SYLLABLES = (
+    'bul ba saur ivy venu char man der iz ard squir tle war tor blast cat er pie met a pod but ter free '
+    'wee dle ka kuna bee drill pid gey otto rat ti cate spear ow fea row ek ans bo pika chu rai sand shrew '
+    'slash ni dor ina queen rino king cle fa ry vul pix nine tales jig gly puff zu bat gol odd ish gloom vile '
+    'plume pa ras sect veno nat moth dig lett trio meow per sian psy duck go ma nkey prime grow lithe arca '
+    'poli wag whirl abra dab kazam mach op champ bell sprout weepin geo dude grav eler ponyta dash slow poke '
+    'magne mite ton far do duo seel dew gong gri mer muk shell cloy gas tly haun gen gar on ix zee hyp no'
+).split()
+
+
+def synthetic_names(count, seed=0):
+    """Nombres unicos formados por silabas de nombres reales, con muchos trigramas en comun."""
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        names.add(''.join(rng.choice(NAME_SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(names)
+
+
+def misspell(name, rng):
+    position = rng.randrange(len(name) - 1)
+    edit = rng.choice(('swap', 'drop', 'replace'))
+    if edit == 'swap':
+        return name[:position] + name[position + 1] + name[position] + name[position + 2:]
+    if edit == 'drop':
+        return name[:position] + name[position + 1:]
+    return name[:position] + rng.choice('aeiou') + name[position + 1:]
+
+
+@benchmark('search')
+def bench_search(sizes, iterations, write):
+    """Busqueda por nombre en NameIndex: carga del indice y latencia por tipo de consulta."""
+    from .search import NameIndex
+
+    write(f"{'names':>10} {'load (ms)':>10}  {'query':<10} {'median (ms)':>12} {'p99 (ms)':>10}")
+    for size in sorted(sizes):
+        names = synthetic_names(size)
+        rng = random.Random(size)
+        samples = rng.sample(names, min(100, size))
+        queries = {
+            'exact': samples,
+            'prefix': [name[:4] for name in samples],
+            'substring': [name[2:7] for name in samples],
+            'fuzzy': [misspell(name, rng) for name in samples],
+        }
+        index = NameIndex()
+        start = time.perf_counter()
+        index.load((uuid.uuid4(), name, pokemon_id) for pokemon_id, name in enumerate(names, start=1))
+        load_ms = (time.perf_counter() - start) * 1000
+        for kind, kind_queries in queries.items():
+            # Mediana de cada consulta y, entre consultas, la mediana y el p99.
+            timings = sorted(
+                measure(lambda: index.search(query), max(1, iterations // 10))['median_ms'] for query in kind_queries
+            )
+            write(
+                f"{size:>10} {load_ms:>10.1f}  {kind:<10} {statistics.median(timings):>12.3f} "
+                f"{timings[min(len(timings) - 1, int(len(timings) * 0.99))]:>10.3f}"
+            )
+
+
+@benchmark('detail')
+def bench_detail(sizes, iterations, write):
+    """Lectura y actualizacion de un pokemon a traves de las vistas, sin la cache de respuestas:
+    GET de get/id/<id>, una pagina de 50 del listado y un PATCH de peso y estadisticas."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext, override_settings
+    from rest_framework.test import APIRequestFactory
+
+    from .views import get_pokemon, list_pokemon, update_pokemon
+
+    factory = APIRequestFactory()
+    operations = {
+        'detail': lambda pokemon_id, rng: get_pokemon(factory.get(f'/pokemon/get/id/{pokemon_id}/'), pokemon_id=pokemon_id),
+        'page of 50': lambda pokemon_id, rng: list_pokemon(factory.get('/pokemon/', {'limit': 50, 'cursor': pokemon_id})),
+        'patch': lambda pokemon_id, rng: update_pokemon(
+            factory.patch(f'/pokemon/update/{pokemon_id}', {
+                'weight': rng.randint(1, 10000), 'base_stats': {'speed': rng.randint(1, 255)},
+            }, format='json'),
+            pokemon_id=pokemon_id,
+        ),
+    }
+
+    write(f"{'rows':>10}  {'operation':<12} {'queries':>8} {'median (ms)':>12} {'p99 (ms)':>10}")
+    with rolled_back(), override_settings(POKEMON_RESPONSE_CACHE={'ENABLED': False}):
+        seeded = 0
+        for size in sorted(sizes):
+            seed_pokemons(size - seeded, start=seeded + 1, with_details=True)
+            seeded = size
+            rng = random.Random(size)
+            for label, operation in operations.items():
+                connection.queries_log.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    response = rendered(operation(1, rng))
+                assert response.status_code == 200, response.content
+                timings = measure(lambda: rendered(operation(rng.randint(1, max(1, size - 50)), rng)), iterations)
+                write(
+                    f"{size:>10}  {label:<12} {len(queries):>8} {timings['median_ms']:>12.3f} {timings['p99_ms']:>10.3f}"
+                )
+
+
+@benchmark('documents')
+def bench_documents(sizes, iterations, write):
+    """Listado completo a traves de list_pokemon, que concatena los documentos guardados, frente a
+    leer los pokemons y serializarlos como antes, sin la cache de respuestas. Comprueba que los
+    bytes son identicos. Cada repeticion lee el catalogo entero, por lo que se hacen iterations / 100."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext, override_settings
+    from rest_framework.test import APIRequestFactory
+
+    from .renderers import ORJSONRenderer
+    from .serializers import PokemonSerializer
+    from .views import list_pokemon
+
+    factory = APIRequestFactory()
+    variants = {
+        'documents': lambda: rendered(list_pokemon(factory.get('/pokemon/'))).content,
+        'serializer': lambda: ORJSONRenderer().render(
+            PokemonSerializer(Pokemon.objects.with_details().order_by('pokemon_id'), many=True).data
+        ),
+    }
+
+    write(f"{'rows':>10}  {'variant':<12} {'queries':>8} {'median (ms)':>12} {'p99 (ms)':>10}")
+    with rolled_back(), override_settings(POKEMON_RESPONSE_CACHE={'ENABLED': False}):
+        seeded = 0
+        for size in sorted(sizes):
+            seed_pokemons(size - seeded, start=seeded + 1, with_details=True)
+            seeded = size
+            reference = None
+            for label, variant in variants.items():
+                with CaptureQueriesContext(connection) as queries:
+                    content = variant()
+                reference = reference or content
+                assert content == reference, f'{label} differs from the documents output'
+                timings = measure(variant, max(1, iterations // 100))
+                write(
+                    f"{size:>10}  {label:<12} {len(queries):>8} {timings['median_ms']:>12.3f} {timings['p99_ms']:>10.3f}"
+                )
+
+
+def field_serializer_class():
+    """PokemonSerializer con la serializacion campo a campo de DRF, anterior a
+    pokemon_representation. Es la referencia de 'render' y de la prueba de equivalencia."""
+    from rest_framework import serializers
+
+    from .serializers import PokemonSerializer, StatSerializer
+
+    class FieldPokemonSerializer(PokemonSerializer):
+        class Meta(PokemonSerializer.Meta):
+            list_serializer_class = serializers.ListSerializer
+
+        def to_representation(self, instance):
+            representation = serializers.ModelSerializer.to_representation(self, instance)
+            representation['types'] = [type_.name for type_ in instance.types.all()]
+            representation['abilities'] = [ability.name for ability in instance.abilities.all()]
+            stat = instance.get_base_stats()
+            representation['base_stats'] = StatSerializer(stat).data if stat else {}
+            return representation
+
+    return FieldPokemonSerializer
+
+
+@benchmark('render')
+def bench_render(sizes, iterations, write):
+    """Serializacion y renderizado del catalogo completo, ya leido de la base de datos.
+    Compara la serializacion campo a campo de DRF con pokemon_representation y los renderers
+    JSON de DRF, orjson y MessagePack, y comprueba que el JSON es identico byte a byte.
+    Cada repeticion procesa el catalogo entero, por lo que se hacen iterations / 100."""
+    from rest_framework.renderers import JSONRenderer
+
+    from .renderers import MessagePackRenderer, ORJSONRenderer, msgpack, orjson
+    from .serializers import PokemonSerializer
+
+    field_serializer = field_serializer_class()
+    variants = {
+        'drf fields + json': (field_serializer, JSONRenderer()),
+        'plain + json': (PokemonSerializer, JSONRenderer()),
+        'plain + orjson': (PokemonSerializer, ORJSONRenderer()),
+    }
+    if msgpack is not None:
+        variants['plain + msgpack'] = (PokemonSerializer, MessagePackRenderer())
+    if orjson is None:
+        write('orjson is not installed: ORJSONRenderer falls back to the DRF renderer.')
+
+    write(f"{'rows':>10}  {'variant':<18} {'serialize (ms)':>15} {'render (ms)':>12} {'total (ms)':>11} {'bytes':>10}")
+    with rolled_back():
+        seeded = 0
+        for size in sorted(sizes):
+            seed_pokemons(size - seeded, start=seeded + 1, with_details=True)
+            seeded = size
+            pokemons = list(Pokemon.objects.with_details().order_by('pokemon_id'))
+            reference = None
+            for label, (serializer_class, renderer) in variants.items():
+                serialize = lambda: serializer_class(pokemons, many=True).data
+                data = serialize()
+                content = renderer.render(data)
+                if isinstance(renderer, JSONRenderer):
+                    reference = reference or content
+                    assert content == reference, f'{label} JSON differs from the DRF output'
+                serialize_timings = measure(serialize, max(1, iterations // 100))
+                render_timings = measure(lambda: renderer.render(data), max(1, iterations // 100))
+                write(
+                    f"{size:>10}  {label:<18} {serialize_timings['median_ms']:>15.1f} "
+                    f"{render_timings['median_ms']:>12.1f} "
+                    f"{serialize_timings['median_ms'] + render_timings['median_ms']:>11.1f} {len(content):>10}"
+                )
@@ -0,0 +1,272 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+MISSING = object()
+
+
+class LRUCache:
+    """Diccionario acotado y seguro entre hilos que descarta primero las claves menos usadas."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class CacheEntry:
+    __slots__ = ('value', 'fresh_until', 'stale_until')
+
+    def __init__(self, value, fresh_until, stale_until):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+    def __getstate__(self):
+        return (self.value, self.fresh_until, self.stale_until)
+
+    def __setstate__(self, state):
+        self.value, self.fresh_until, self.stale_until = state
+
+
+class SingleFlight:
+    """Agrupa las llamadas concurrentes con la misma clave en una sola ejecucion.
+
+    El primer hilo que pide una clave ejecuta la funcion y los que llegan mientras tanto
+    esperan y reciben su mismo resultado o su misma excepcion.
+    """
+
+    class Call:
+        __slots__ = ('done', 'result', 'error')
+
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self.Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class ReadThroughCache:
+    """Cache de lectura con dos niveles: un LRU en memoria del proceso delante del framework
+    de cache de Django (compartido entre procesos si el backend lo es).
+
+    - Los valores frescos (edad < ttl) se devuelven directamente.
+    - Los valores caducados pero dentro de stale_ttl se devuelven al momento y se refrescan
+      en segundo plano (stale-while-revalidate).
+    - Un resultado None del loader (por ejemplo un 404) se guarda durante negative_ttl.
+    - Las excepciones del loader no se guardan, y un refresco fallido conserva el valor antiguo.
+    - Las cargas concurrentes de la misma clave en el proceso se agrupan con SingleFlight y, si
+      distributed_lock es True, tambien entre procesos con un lock en la cache compartida.
+
+    Los valores devueltos se comparten entre llamadas y no deben modificarse.
+
+    Examples:
+        >>> cache = ReadThroughCache(PokemonApiService.fetch_pokemon_data, prefix='pokeapi')
+        >>> cache.get('bulbasaur')
+        {'name': 'bulbasaur', 'pokemon_id': 1, ...}
+        >>> cache.stats()
+        {'hits': 0, 'misses': 1, ...}
+    """
+
+    def __init__(self, loader, prefix, ttl=3600, stale_ttl=0, negative_ttl=60, max_entries=1024, cache_alias='default',
+                 distributed_lock=False, lock_timeout=10, lock_poll_interval=0.05):
+        self.loader = loader
+        self.prefix = prefix
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.cache_alias = cache_alias
+        self.distributed_lock = distributed_lock
+        self.lock_timeout = lock_timeout
+        self.lock_poll_interval = lock_poll_interval
+        self.local = LRUCache(max_entries)
+        self.flight = SingleFlight()
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._counters = dict.fromkeys(
+            ('hits', 'stale_hits', 'negative_hits', 'misses', 'loads', 'coalesced_remote', 'refreshes',
+             'refresh_errors', 'load_errors'), 0
+        )
+
+    @property
+    def shared(self):
+        return caches[self.cache_alias]
+
+    def make_key(self, key):
+        return f'{self.prefix}:{key}'
+
+    def incr(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats['coalesced'] = self.flight.coalesced
+        served = stats['hits'] + stats['stale_hits'] + stats['negative_hits']
+        total = served + stats['misses']
+        stats['hit_ratio'] = round(served / total, 4) if total else 0.0
+        stats['local_entries'] = len(self.local)
+        return stats
+
+    def lookup(self, key, now):
+        entry = self.local.get(key, MISSING)
+        if entry is MISSING or now >= entry.fresh_until:
+            # Otro proceso puede haber refrescado ya el valor en la cache compartida.
+            shared_entry = self.shared.get(self.make_key(key), MISSING)
+            if shared_entry is not MISSING and (entry is MISSING or shared_entry.fresh_until > entry.fresh_until):
+                self.local.set(key, shared_entry)
+                entry = shared_entry
+        return entry
+
+    def store(self, key, value):
+        now = time.time()
+        ttl = self.negative_ttl if value is None else self.ttl
+        stale_ttl = 0 if value is None else self.stale_ttl
+        entry = CacheEntry(value, now + ttl, now + ttl + stale_ttl)
+        self.local.set(key, entry)
+        self.shared.set(self.make_key(key), entry, timeout=ttl + stale_ttl)
+        return entry
+
+    def get(self, key):
+        now = time.time()
+        entry = self.lookup(key, now)
+        if entry is not MISSING:
+            if now < entry.fresh_until:
+                self.incr('hits' if entry.value is not None else 'negative_hits')
+                return entry.value
+            if now < entry.stale_until:
+                self.incr('stale_hits')
+                self.refresh_in_background(key)
+                return entry.value
+
+        self.incr('misses')
+        return self.flight.do(key, lambda: self.load(key))
+
+    def load(self, key):
+        if not self.distributed_lock:
+            return self.load_and_store(key)
+
+        lock_key = f'{self.make_key(key)}:lock'
+        token = uuid.uuid4().hex
+        acquired_at = time.monotonic()
+        if self.shared.add(lock_key, token, timeout=self.lock_timeout):
+            try:
+                return self.load_and_store(key)
+            finally:
+                self.release_lock(lock_key, token, acquired_at)
+
+        # Otro proceso esta cargando la clave: se espera a que publique el valor. Si libera
+        # el lock sin publicarlo (por ejemplo porque fallo) o se agota el tiempo, se carga aqui.
+        deadline = time.time() + self.lock_timeout
+        while time.time() < deadline:
+            time.sleep(self.lock_poll_interval)
+            entry = self.shared.get(self.make_key(key), MISSING)
+            if entry is not MISSING and time.time() < entry.fresh_until:
+                self.local.set(key, entry)
+                self.incr('coalesced_remote')
+                return entry.value
+            if self.shared.get(lock_key) is None:
+                break
+        return self.load_and_store(key)
+
+    def release_lock(self, lock_key, token, acquired_at):
+        # Si la carga ha durado mas que lock_timeout el lock ha caducado y puede ser ya de otro
+        # proceso, por lo que solo se borra si no ha caducado y sigue guardando nuestro token.
+        # La cache de Django no tiene un borrado condicional atomico; queda una ventana minima
+        # entre el get y el delete.
+        if time.monotonic() - acquired_at < self.lock_timeout and self.shared.get(lock_key) == token:
+            self.shared.delete(lock_key)
+
+    def load_and_store(self, key):
+        self.incr('loads')
+        try:
+            value = self.loader(key)
+        except Exception:
+            self.incr('load_errors')
+            raise
+        return self.store(key, value).value
+
+    def refresh_in_background(self, key):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        threading.Thread(target=self.refresh, args=(key,), daemon=True).start()
+
+    def refresh(self, key):
+        try:
+            self.store(key, self.loader(key))
+            self.incr('refreshes')
+        except Exception:
+            self.incr('refresh_errors')
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def delete(self, key):
+        self.local.delete(key)
+        self.shared.delete(self.make_key(key))
+
+    def clear_local(self):
+        # Solo vacia el nivel en memoria; el nivel compartido caduca por su timeout.
+        self.local.clear()
@@ -0,0 +1,173 @@
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class PokeApiError(Exception):
+    """La pokeapi no respondio correctamente."""
+
+
+class PokeApiUnavailable(PokeApiError):
+    """El circuito esta abierto: la pokeapi ha fallado demasiadas veces seguidas y no se llama."""
+
+
+class CircuitBreaker:
+    """Corta las llamadas a un servicio que falla repetidamente.
+
+    Tras failure_threshold fallos consecutivos el circuito se abre y las llamadas fallan al
+    momento durante reset_timeout segundos. Pasado ese tiempo se deja pasar una llamada de
+    prueba (semiabierto): si funciona el circuito se cierra y si falla se vuelve a abrir.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def before_call(self):
+        """Comprueba si se puede llamar.
+        Returns:
+            bool: True si la llamada es la de prueba del circuito semiabierto.
+        Raises:
+            PokeApiUnavailable: Si el circuito esta abierto.
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return False
+            if time.monotonic() - self.opened_at >= self.reset_timeout and not self._probing:
+                self._probing = True
+                return True
+        raise PokeApiUnavailable('PokeAPI circuit is open.')
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+    def end_probe(self):
+        """Permite otra llamada de prueba; record_success y record_failure ya lo hacen."""
+        with self._lock:
+            self._probing = False
+
+
+class RateLimiter:
+    """Limita las llamadas a rate por segundo entre todos los hilos que lo comparten.
+    Las llamadas se espacian 1 / rate segundos; tras un rato sin llamadas se permiten hasta burst
+    seguidas sin esperar. Con rate 0 o None no limita.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.interval = 1 / rate if rate else 0
+        self.burst = burst
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Espera hasta que la llamada entra en el limite."""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._next = max(self._next, now - (self.burst - 1) * self.interval)
+            wait = self._next - now
+            self._next += self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class PokeApiClient:
+    """Cliente HTTP compartido para la pokeapi.
+
+    Reutiliza las conexiones con un pool keep-alive, limita cada peticion con timeouts de
+    conexion y lectura, reintenta los errores transitorios con backoff exponencial con jitter
+    y corta las llamadas con un CircuitBreaker cuando la pokeapi no esta sana.
+    Se puede usar desde varios hilos a la vez.
+
+    Examples:
+        >>> client = PokeApiClient('https://pokeapi.co/api/v2')
+        >>> client.get('/pokemon/bulbasaur').status_code
+        200
+    """
+
+    def __init__(self, base_url, connect_timeout=3.05, read_timeout=10, max_retries=2, backoff_base=0.1,
+                 backoff_max=2, pool_size=10, failure_threshold=5, reset_timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def backoff(self, attempt):
+        # Full jitter: espera aleatoria entre 0 y el backoff exponencial del intento.
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def get(self, path):
+        """Hace un GET a la pokeapi.
+        Args:
+            path (str): Ruta relativa a la URL base, por ejemplo '/pokemon/bulbasaur'.
+        Returns:
+            requests.Response: Respuesta con un codigo que no requiere reintento (2xx, 3xx o 4xx salvo 429).
+        Raises:
+            PokeApiUnavailable: Si el circuito esta abierto.
+            PokeApiError: Si se agotan los reintentos por timeouts, errores de conexion o respuestas 5xx/429.
+        """
+        probe = self.breaker.before_call()
+        try:
+            return self.get_with_retries(f'{self.base_url}{path}')
+        finally:
+            # Si la llamada de prueba termina con una excepcion inesperada no se anota ni exito ni
+            # fallo; sin esto el circuito se quedaria abierto para siempre.
+            if probe:
+                self.breaker.end_probe()
+
+    def get_with_retries(self, url):
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self.backoff(attempt - 1))
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+            except requests.RequestException as e:
+                error = PokeApiError(f'GET {url} failed: {e}')
+                continue
+            if response.status_code in RETRY_STATUS_CODES:
+                error = PokeApiError(f'GET {url} returned {response.status_code}.')
+                continue
+            self.breaker.record_success()
+            return response
+
+        self.breaker.record_failure()
+        raise error
+
+    def close(self):
+        self.session.close()
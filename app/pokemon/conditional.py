@@ -0,0 +1,67 @@
+"""Validadores para las peticiones GET condicionales (ETag / Last-Modified) de los pokemons.
+
+Se usan con el decorador ``condition`` de Django: si el cliente ya tiene la version actual
+(If-None-Match, o If-Modified-Since en el detalle), la vista no se ejecuta y se responde 304 sin
+consultar los detalles ni serializar.
+
+Cada validador se calcula con una sola consulta que se guarda en la peticion, porque
+``condition`` pide el ETag y el Last-Modified por separado. Los ETag dependen del formato
+negociado, por lo que las vistas responden con Vary: Accept.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+
+from .models import Pokemon
+
+
+def representation_key(request):
+    # La misma URL puede devolver representaciones distintas segun los query params y el
+    # formato negociado, y un ETag fuerte debe cambiar con cada representacion.
+    return f"{request.GET.urlencode()}|{request.META.get('HTTP_ACCEPT', '')}"
+
+
+def make_etag(*parts):
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def get_cached_validators(request, key, compute):
+    validators = request.__dict__.setdefault('_pokemon_validators', {})
+    if key not in validators:
+        validators[key] = compute()
+    return validators[key]
+
+
+def pokemon_detail_validators(request, pokemon_id):
+    """Devuelve (etag, last_modified) de un pokemon, o (None, None) si no existe."""
+    def compute():
+        row = Pokemon.objects.filter(pokemon_id=pokemon_id).values_list('pk', 'updated_at').first()
+        if row is None:
+            return None, None
+        pk, updated_at = row
+        return make_etag('pokemon', pk, updated_at.isoformat(), representation_key(request)), updated_at
+    return get_cached_validators(request, ('detail', pokemon_id), compute)
+
+
+def pokemon_detail_etag(request, pokemon_id):
+    return pokemon_detail_validators(request, pokemon_id)[0]
+
+
+def pokemon_detail_last_modified(request, pokemon_id):
+    return pokemon_detail_validators(request, pokemon_id)[1]
+
+
+def pokemon_list_etag(request):
+    """ETag del catalogo, calculado con una consulta agregada.
+    La fecha de la ultima modificacion detecta altas y cambios, y el numero de pokemons las bajas.
+    El listado no envia Last-Modified: Max(updated_at) no cambia con las bajas y las fechas HTTP
+    tienen resolucion de un segundo, por lo que If-Modified-Since podria responder 304 con un
+    catalogo que ya no es el actual.
+    """
+    def compute():
+        summary = Pokemon.objects.aggregate(last_modified=Max('updated_at'), total=Count('pk'))
+        last_modified = summary['last_modified']
+        return make_etag(
+            'pokemon-list', summary['total'], last_modified.isoformat() if last_modified else '', representation_key(request)
+        )
+    return get_cached_validators(request, 'list', compute)
@@ -0,0 +1,104 @@
+"""Documentos JSON precalculados de cada pokemon.
+
+La columna Pokemon.document guarda los bytes de su representacion de lectura (la de
+PokemonSerializer en JSON compacto), y get_pokemon y list_pokemon responden concatenando esos
+bytes, sin instanciar pokemons ni serializar:
+
+- PokemonSerializer.create y update renderizan el documento en el mismo INSERT o UPDATE del
+  pokemon (ver DocumentField) y el importador los inserta en bloque con los pokemons.
+- Las escrituras que no pasan por el serializador (el admin, la shell) vacian el documento, y
+  renombrar un tipo o una habilidad regenera los de sus pokemons (ver signals.py).
+- Los pokemons sin documento se renderizan al leerlos, sin guardarlo, para no escribir en las
+  lecturas. Las migraciones rellenan los de los pokemons ya registrados y
+  `manage.py refresh_documents` los regenera todos, por ejemplo tras cambiar la representacion o
+  despues de escribir directamente en las tablas.
+
+Los documentos solo sirven para las respuestas JSON compactas (ver renders_compact_json); el resto
+de formatos se serializan como siempre.
+"""
+from django.db import transaction
+
+from .metrics import timed
+from .models import Pokemon
+from .pagination import iter_keyset_chunks, keyset_page
+from .serializers import PokemonSerializer, render_document
+
+DEFAULT_REFRESH_BATCH_SIZE = 500
+
+
+def render_documents(pokemons):
+    """Renderiza los documentos de pokemons leidos con with_details().
+    Returns:
+        dict: Diccionario pk -> contenido.
+    """
+    datetime_field = PokemonSerializer().updated_at_field
+    return {pokemon.pk: render_document(pokemon, datetime_field) for pokemon in pokemons}
+
+
+def refresh_documents(queryset=None, batch_size=DEFAULT_REFRESH_BATCH_SIZE):
+    """Regenera los documentos de los pokemons del queryset (todos por defecto) por bloques.
+    Cada bloque se lee y se reescribe en su propia transaccion.
+    Returns:
+        int: Numero de documentos regenerados.
+    """
+    queryset = (Pokemon.objects.all() if queryset is None else queryset).with_details()
+    refreshed = 0
+    cursor = None
+    while True:
+        with transaction.atomic():
+            page, cursor = keyset_page(queryset, batch_size, cursor)
+            documents = render_documents(page)
+            for pokemon in page:
+                pokemon.document = documents[pokemon.pk]
+            Pokemon.objects.bulk_update(page, ['document'])
+        refreshed += len(page)
+        if cursor is None:
+            return refreshed
+
+
+def forget_documents(pokemons):
+    """Vacia los documentos de los pokemons (pks o queryset), que se renderizaran al leerlos."""
+    Pokemon.objects.filter(pk__in=pokemons).update(document=None)
+
+
+def document_rows(queryset):
+    """Filas (pk, pokemon_id, document) del queryset de pokemons, con document None si no lo tiene.
+    Solo lee esas columnas: no instancia pokemons ni precarga sus relaciones.
+    """
+    return queryset.prefetch_related(None).values_list('pk', 'pokemon_id', 'document', named=True)
+
+
+def document_contents(rows):
+    """Contenido de los documentos de las filas de document_rows, en su orden.
+    Los que faltan se renderizan con una sola lectura de sus pokemons.
+    """
+    with timed('serialize'):
+        missing = [row.pk for row in rows if row.document is None]
+        if not missing:
+            return [row.document for row in rows]
+        rendered = render_documents(Pokemon.objects.with_details().filter(pk__in=missing))
+        return [row.document if row.document is not None else rendered[row.pk] for row in rows]
+
+
+def detail_document(pokemon_id):
+    """Contenido del documento del pokemon, o None si no existe el pokemon o su documento.
+    Leer el documento sustituye a la serializacion y se anota en esa fase; la consulta cuenta en db.
+    """
+    with timed('serialize'):
+        return Pokemon.objects.filter(pokemon_id=pokemon_id).values_list('document', flat=True).first()
+
+
+def list_document(contents):
+    return b'[' + b','.join(contents) + b']'
+
+
+def page_document(contents, next_cursor):
+    # Mismos bytes que renderizar {'results': [...], 'next_cursor': ...} con ORJSONRenderer.
+    cursor = b'null' if next_cursor is None else str(next_cursor).encode()
+    return b'{"results":' + list_document(contents) + b',"next_cursor":' + cursor + b'}'
+
+
+def iter_ndjson_documents(queryset, chunk_size):
+    """Genera una linea JSON por pokemon para respuestas NDJSON en streaming, con los documentos guardados."""
+    for chunk in iter_keyset_chunks(document_rows(queryset), chunk_size):
+        yield b'\n'.join(document_contents(chunk)) + b'\n'
@@ -0,0 +1,225 @@
+import hashlib
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Q
+
+from .models import Pokemon, Stat
+from .serializers import READ_FIELDS
+
+DEFAULT_FILTER_ESTIMATE_TIMEOUT = 60 * 10
+
+STAT_FILTER_FIELDS = ('hp', 'attack', 'defense', 'special_attack', 'special_defense', 'speed')
+POKEMON_FILTER_FIELDS = ('height', 'weight')
+ORDERING_FIELDS = {
+    'pokemon_id': 'pokemon_id',
+    'name': 'name',
+    'height': 'height',
+    'weight': 'weight',
+    'score': 'score',
+    **{field: f'base_stats__{field}' for field in STAT_FILTER_FIELDS},
+}
+MATCH_MODES = ('any', 'all')
+
+
+class FilterError(ValueError):
+    """Parametros de filtrado u ordenacion invalidos."""
+
+
+def get_filter_estimate_timeout():
+    return getattr(settings, 'POKEMON_FILTER_ESTIMATE_TIMEOUT', DEFAULT_FILTER_ESTIMATE_TIMEOUT)
+
+
+def cached_count(queryset):
+    """COUNT del queryset, guardado en la cache durante POKEMON_FILTER_ESTIMATE_TIMEOUT segundos.
+    Solo se usa para estimar: un valor desfasado puede cambiar el plan, pero no los resultados.
+    """
+    key = f'pokemon-filter:count:{hashlib.sha1(str(queryset.query).encode()).hexdigest()}'
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout=get_filter_estimate_timeout())
+    return count
+
+
+class Condition:
+    """Un filtro del listado expresado de dos formas equivalentes:
+
+    - drive: pk IN con los pokemons que cumplen el filtro, leidos de los indices de su tabla. Cuesta
+      en proporcion al numero de resultados, que hay que leer todos antes de ordenar.
+    - scan: el mismo filtro comprobado por pokemon (EXISTS correlacionado o columnas del pokemon)
+      mientras se recorre la tabla en orden de pokemon_id, que termina al completar la pagina.
+
+    samples son consultas cuyo COUNT solo lee un indice y sirven para estimar cuantos pokemons
+    cumplen el filtro; con varias se supone que son independientes.
+    """
+
+    def __init__(self, drive, scan, samples):
+        self.drive = drive
+        self.scan = scan
+        self.samples = samples
+
+    def estimate(self, total):
+        return total * math.prod(cached_count(sample) / total for sample in self.samples)
+
+
+def parse_names(value):
+    return list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+
+
+def parse_int(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise FilterError(f"'{name}' must be an integer.")
+
+
+def names_condition(through, field, names, match):
+    """Condicion sobre tipos o habilidades (tabla intermedia de la relacion ManyToMany)."""
+    if match == 'any':
+        pks = through.objects.filter(**{f'{field}__name__in': names}).values('pokemon_id')
+        samples = [pks]
+        exists = [Exists(pks.filter(pokemon_id=OuterRef('pk')))]
+    else:
+        samples = [through.objects.filter(**{f'{field}__name': name}) for name in names]
+        exists = [Exists(rows.filter(pokemon_id=OuterRef('pk'))) for rows in samples]
+        # Interseccion dentro de la tabla intermedia: cada nombre filtra los pokemon_id del siguiente.
+        pks = samples[-1].values('pokemon_id')
+        for rows in reversed(samples[:-1]):
+            pks = rows.filter(pokemon_id__in=pks).values('pokemon_id')
+    return Condition(drive=Q(pk__in=pks), scan=Q(*exists), samples=samples)
+
+
+def range_conditions(params):
+    """Condiciones de rango inclusivas sobre height, weight y las estadisticas base."""
+    pokemon_ranges, stat_ranges = {}, {}
+    for field in POKEMON_FILTER_FIELDS + STAT_FILTER_FIELDS:
+        for bound, lookup in (('min', 'gte'), ('max', 'lte')):
+            value = params.get(f'{bound}_{field}')
+            if value is None:
+                continue
+            ranges = pokemon_ranges if field in POKEMON_FILTER_FIELDS else stat_ranges
+            ranges[f'{field}__{lookup}'] = parse_int(value, f'{bound}_{field}')
+
+    conditions = []
+    if pokemon_ranges:
+        # Son columnas del pokemon: la base de datos usa sus indices directamente.
+        ranges = Q(**pokemon_ranges)
+        conditions.append(Condition(drive=ranges, scan=ranges, samples=[Pokemon.objects.filter(ranges)]))
+    if stat_ranges:
+        # Subconsulta sobre los indices (estadistica, pokemon) de Stat en lugar de un JOIN.
+        stats = Stat.objects.filter(**stat_ranges)
+        conditions.append(Condition(
+            drive=Q(pk__in=stats.values('pokemon_id')),
+            scan=Q(Exists(stats.filter(pokemon_id=OuterRef('pk')))),
+            samples=[stats],
+        ))
+    return conditions
+
+
+def build_conditions(params):
+    conditions = []
+    for param, through, field in (('types', Pokemon.types.through, 'type'), ('abilities', Pokemon.abilities.through, 'ability')):
+        match = params.get(f'{param}_match', 'any')
+        if match not in MATCH_MODES:
+            raise FilterError(f"'{param}_match' must be one of {', '.join(MATCH_MODES)}.")
+        names = parse_names(params.get(param, ''))
+        if names:
+            conditions.append(names_condition(through, field, names, match))
+    return conditions + range_conditions(params)
+
+
+def prefers_scan(conditions, limit):
+    """True si sale mas barato llenar la pagina recorriendo los pokemons en orden de pokemon_id.
+    Se compara el numero de pokemons que habria que recorrer hasta encontrar limit + 1 que cumplan
+    todos los filtros con el numero de resultados del filtro mas selectivo, que el camino con
+    pk IN tiene que leer enteros.
+    """
+    total = cached_count(Pokemon.objects.all())
+    if not total:
+        return False
+    estimates = [condition.estimate(total) for condition in conditions]
+    selectivity = math.prod(estimate / total for estimate in estimates)
+    if not selectivity:
+        return False
+    return min(total, (limit + 1) / selectivity) < min(estimates)
+
+
+def filter_pokemons(queryset, params, limit=None):
+    """Aplica los filtros de la peticion a un queryset de pokemons.
+
+    Las claves primarias son UUID, por lo que volver de una tabla de filtro al pokemon cuesta
+    una busqueda por pokemon encontrado. Por eso el plan depende de lo selectivos que son los
+    filtros (ver prefers_scan):
+
+    - Si se pide una pagina y los filtros son poco selectivos, cada filtro se comprueba por
+      pokemon con EXISTS mientras se recorre el indice de pokemon_id, y la consulta termina en
+      cuanto completa la pagina.
+    - Si no, cada filtro es un pk IN sobre los indices de su tabla y la base de datos elige por
+      cual empezar.
+
+    La selectividad se estima con un COUNT sobre el indice de cada filtro que se guarda en la
+    cache (ver cached_count), asi que las peticiones con filtros ya vistos no hacen consultas extra.
+
+    Args:
+        queryset (QuerySet): Queryset de pokemons.
+        params (dict): Query params. Acepta:
+            types, abilities (str): Nombres separados por comas.
+            types_match, abilities_match (str): 'any' (por defecto) o 'all'.
+            min_<campo>, max_<campo> (int): Rangos inclusivos sobre height, weight y cada estadistica.
+        limit (int): Tamaño de la pagina si el queryset se va a recorrer por pokemon_id con LIMIT,
+            o None si se van a leer todos los resultados.
+    Returns:
+        QuerySet: Queryset filtrado.
+    Raises:
+        FilterError: Si algun parametro no es valido.
+    Examples:
+        >>> filter_pokemons(Pokemon.objects.all(), {'types': 'fire,flying', 'types_match': 'all', 'min_speed': '100'})
+        <PokemonQuerySet [<Pokemon: charizard>]>
+    """
+    conditions = build_conditions(params)
+    if not conditions:
+        return queryset
+    if limit is not None and prefers_scan(conditions, limit):
+        return queryset.filter(*(condition.scan for condition in conditions))
+    return queryset.filter(*(condition.drive for condition in conditions))
+
+
+def parse_ordering(value):
+    """Convierte ?ordering=-attack,name en argumentos de order_by, con pokemon_id como desempate.
+    Raises:
+        FilterError: Si algun campo no se puede ordenar.
+    """
+    ordering = []
+    for field in (field.strip() for field in value.split(',')):
+        if not field:
+            continue
+        descending = field.startswith('-')
+        name = field.lstrip('-')
+        if name not in ORDERING_FIELDS:
+            raise FilterError(f"Cannot order by '{name}'. Use one of {', '.join(ORDERING_FIELDS)}.")
+        ordering.append(f"{'-' if descending else ''}{ORDERING_FIELDS[name]}")
+    if not any(field.lstrip('-') == 'pokemon_id' for field in ordering):
+        ordering.append('pokemon_id')
+    return ordering
+
+
+def parse_fieldset(params):
+    """Campos de la respuesta pedidos con ?fields= y ?exclude= (nombres separados por comas).
+    Returns:
+        tuple: Campos a representar en el orden de READ_FIELDS, o None si no se restringen.
+    Raises:
+        FilterError: Si algun campo no existe o no queda ninguno.
+    """
+    if 'fields' not in params and 'exclude' not in params:
+        return None
+    requested = parse_names(params.get('fields', '')) if 'fields' in params else list(READ_FIELDS)
+    excluded = parse_names(params.get('exclude', ''))
+    for field in requested + excluded:
+        if field not in READ_FIELDS:
+            raise FilterError(f"Unknown field '{field}'. Use one of {', '.join(READ_FIELDS)}.")
+    fields = tuple(field for field in READ_FIELDS if field in requested and field not in excluded)
+    if not fields:
+        raise FilterError("'fields' and 'exclude' leave no fields to return.")
+    return fields
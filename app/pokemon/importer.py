@@ -0,0 +1,193 @@
+import json
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import as_serializer_error
+
+from .models import Ability, Pokemon, Stat, Type
+from .response_cache import invalidate_all
+from .search import index_on_commit
+from .serializers import PokemonSerializer, remember_relation, render_document
+from .service import ScoreService
+from .vocabulary import get_vocabulary
+
+DEFAULT_IMPORT_BATCH_SIZE = 500
+
+
+def get_import_batch_size():
+    return getattr(settings, 'POKEMON_IMPORT_BATCH_SIZE', DEFAULT_IMPORT_BATCH_SIZE)
+
+
+class InvalidItem:
+    """Elemento de la importacion que no se pudo decodificar."""
+
+    def __init__(self, message):
+        self.message = message
+
+
+def parse_ndjson(lines):
+    """Decodifica un cuerpo NDJSON linea a linea sin cargarlo completo en memoria.
+    Las lineas vacias se ignoran y las lineas invalidas se devuelven como InvalidItem
+    para que se reporten como error de ese elemento.
+    """
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield InvalidItem(f'Invalid JSON: {e}')
+
+
+def resolve_names(model, names):
+    """Obtiene los ids de Type o Ability para una lista de nombres (ver Vocabulary.resolve).
+    Returns:
+        dict: Diccionario nombre -> id.
+    """
+    return get_vocabulary(model).resolve(set(names))
+
+
+class PokemonImporter:
+    """Importa muchos pokemons en una sola transaccion con inserciones en bloque.
+
+    Cada elemento se valida con PokemonSerializer; los elementos invalidos o duplicados
+    se reportan por indice y no impiden que el resto se guarde.
+
+    Examples:
+        >>> PokemonImporter().run([{"pokemon_id": 1, "name": "bulbasaur", ...}, {"name": "ivysaur"}])
+        {'created': 1, 'errors': [{'index': 1, 'errors': {'pokemon_id': ['This field is required.'], ...}}]}
+    """
+
+    def __init__(self, batch_size=None, skip_existing=False):
+        self.batch_size = batch_size or get_import_batch_size()
+        # Con skip_existing los pokemons ya registrados se cuentan en skipped en lugar de como error.
+        self.skip_existing = skip_existing
+        self.created = 0
+        self.skipped = 0
+        self.errors = []
+        self._seen_ids = set()
+        self._seen_names = set()
+        self._created_rows = []
+        # Se reutiliza un unico serializer para no reconstruir sus campos en cada elemento.
+        self.serializer = PokemonSerializer()
+
+    def run(self, items):
+        """Importa un iterable de diccionarios (puede ser un generador) por bloques.
+        Returns:
+            dict: Numero de pokemons creados y errores por elemento.
+        """
+        with transaction.atomic():
+            batch = []
+            for index, item in enumerate(items):
+                batch.append((index, item))
+                if len(batch) >= self.batch_size:
+                    self.import_batch(batch)
+                    batch = []
+            if batch:
+                self.import_batch(batch)
+            if self.created:
+                invalidate_all()
+                index_on_commit(upserts=self._created_rows)
+        return self.report()
+
+    def report(self):
+        return {'created': self.created, 'errors': sorted(self.errors, key=lambda error: error['index'])}
+
+    def add_error(self, index, errors):
+        self.errors.append({'index': index, 'errors': errors})
+
+    def validate_batch(self, batch):
+        valid = []
+        for index, item in batch:
+            if isinstance(item, InvalidItem):
+                self.add_error(index, {'non_field_errors': [item.message]})
+                continue
+            try:
+                data = self.serializer.run_validation(item)
+            except ValidationError as e:
+                self.add_error(index, as_serializer_error(e))
+                continue
+            if data['pokemon_id'] in self._seen_ids:
+                self.add_error(index, {'pokemon_id': [f"A Pokemon with Id {data['pokemon_id']} already exists."]})
+                continue
+            if data['name'] in self._seen_names:
+                self.add_error(index, {'name': [f"A Pokemon with name {data['name']} already exists."]})
+                continue
+            self._seen_ids.add(data['pokemon_id'])
+            self._seen_names.add(data['name'])
+            valid.append((index, data))
+        return valid
+
+    def exclude_existing(self, valid):
+        # Una sola consulta para detectar los pokemons que ya estan registrados.
+        existing = Pokemon.objects.filter(
+            pokemon_id__in=[data['pokemon_id'] for _, data in valid]
+        ) | Pokemon.objects.filter(name__in=[data['name'] for _, data in valid])
+        existing_ids = set()
+        existing_names = set()
+        for pokemon_id, name in existing.values_list('pokemon_id', 'name'):
+            existing_ids.add(pokemon_id)
+            existing_names.add(name)
+
+        remaining = []
+        for index, data in valid:
+            if self.skip_existing and (data['pokemon_id'] in existing_ids or data['name'] in existing_names):
+                self.skipped += 1
+            elif data['pokemon_id'] in existing_ids:
+                self.add_error(index, {'pokemon_id': [f"A Pokemon with Id {data['pokemon_id']} already exists."]})
+            elif data['name'] in existing_names:
+                self.add_error(index, {'name': [f"A Pokemon with name {data['name']} already exists."]})
+            else:
+                remaining.append((index, data))
+        return remaining
+
+    def import_batch(self, batch):
+        valid = self.validate_batch(batch)
+        if valid:
+            valid = self.exclude_existing(valid)
+        if not valid:
+            return
+
+        type_ids = resolve_names(Type, (name for _, data in valid for name in data['types']))
+        ability_ids = resolve_names(Ability, (name for _, data in valid for name in data['abilities']))
+
+        pokemons = []
+        stats = []
+        pokemon_types = []
+        pokemon_abilities = []
+        for _, data in valid:
+            pokemon = Pokemon(
+                pokemon_id=data['pokemon_id'],
+                name=data['name'],
+                height=data['height'],
+                weight=data['weight'],
+                sprite_url=data['sprite_url'],
+                score=ScoreService.score_value(
+                    data['types'], data['abilities'], data['base_stats'], data['height'], data['weight']
+                ),
+            )
+            pokemons.append(pokemon)
+            stats.append(Stat(pokemon=pokemon, **data['base_stats']))
+            types_names = list(dict.fromkeys(data['types']))
+            abilities_names = list(dict.fromkeys(data['abilities']))
+            pokemon_types.extend(
+                Pokemon.types.through(pokemon_id=pokemon.pk, type_id=type_ids[name]) for name in types_names
+            )
+            pokemon_abilities.extend(
+                Pokemon.abilities.through(pokemon_id=pokemon.pk, ability_id=ability_ids[name]) for name in abilities_names
+            )
+            # Los documentos se renderizan con lo que ya esta en memoria, sin releer los pokemons, y
+            # se insertan con ellos (ver DocumentField).
+            remember_relation(pokemon, 'types', [Type(pk=type_ids[name], name=name) for name in types_names])
+            remember_relation(pokemon, 'abilities', [Ability(pk=ability_ids[name], name=name) for name in abilities_names])
+            pokemon.document = partial(render_document, pokemon, self.serializer.updated_at_field)
+
+        Pokemon.objects.bulk_create(pokemons)
+        Stat.objects.bulk_create(stats)
+        Pokemon.types.through.objects.bulk_create(pokemon_types)
+        Pokemon.abilities.through.objects.bulk_create(pokemon_abilities)
+        self.created += len(pokemons)
+        self._created_rows.extend((pokemon.pk, pokemon.name, pokemon.pokemon_id) for pokemon in pokemons)
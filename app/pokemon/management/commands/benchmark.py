@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from pokemon.benchmarks import BENCHMARKS
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta un benchmark de rendimiento sobre datos sinteticos que se revierten al terminar.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(BENCHMARKS), help='Benchmark a ejecutar.')
+        parser.add_argument(
+            '--sizes',
+            default='1000,10000,100000',
+            help='Tamaños del catalogo separados por comas (por defecto 1000,10000,100000).',
+        )
+        parser.add_argument('--iterations', type=int, default=1000, help='Repeticiones por medicion.')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',') if size]
+        except ValueError:
+            raise CommandError('--sizes must be a comma separated list of integers.')
+        if not sizes or min(sizes) < 1:
+            raise CommandError('--sizes must contain positive integers.')
+
+        BENCHMARKS[options['name']](sizes, options['iterations'], self.stdout.write)
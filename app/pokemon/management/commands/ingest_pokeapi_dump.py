@@ -0,0 +1,46 @@
+import tarfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pokemon.importer import get_import_batch_size
+from pokemon.mirror import CheckpointMismatch, DumpIngestor
+
+
+class Command(BaseCommand):
+    help = (
+        'Ingiere un volcado local de la pokeapi (directorio o tarball con pokemon/<id>/index.json) '
+        'para usarlo como espejo con POKEAPI["LOCAL_MIRROR"].'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Directorio o tarball del volcado, por ejemplo api-data/data/api/v2.')
+        parser.add_argument(
+            '--checkpoint',
+            help='Fichero donde guardar el progreso para reanudar la ingesta (por defecto <source>.checkpoint).',
+        )
+        parser.add_argument('--batch-size', type=int, default=get_import_batch_size(), help='Pokemons por transaccion.')
+        parser.add_argument('--restart', action='store_true', help='Ignora el checkpoint y empieza desde el principio.')
+
+    def handle(self, *args, **options):
+        source = options['source'].rstrip('/')
+        ingestor = DumpIngestor(
+            source,
+            checkpoint_path=options['checkpoint'] or f'{source}.checkpoint',
+            batch_size=options['batch_size'],
+            restart=options['restart'],
+            progress=lambda report: self.stdout.write(
+                f"processed={report['processed']} created={report['created']} "
+                f"skipped={report['skipped']} errors={report['errors']}"
+            ),
+        )
+        try:
+            report = ingestor.run()
+        except (CheckpointMismatch, FileNotFoundError, tarfile.ReadError) as e:
+            raise CommandError(str(e))
+
+        for error in ingestor.errors[:20]:
+            self.stderr.write(f"{error['entry']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Done in {report['seconds']}s: {report['created']} created, {report['skipped']} skipped, "
+            f"{report['errors']} errors."
+        ))
@@ -0,0 +1,82 @@
+import io
+import pstats
+from collections import Counter
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pokemon.profiling import get_profile_directory, list_profiles, make_token
+
+SORT_KEYS = ('cumulative', 'tottime', 'ncalls')
+
+
+class Command(BaseCommand):
+    help = (
+        'Lista y resume los perfiles guardados por ProfilingMiddleware (ver POKEMON_PROFILING). '
+        'Con --token imprime el valor de la cabecera que pide perfilar una peticion.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', help='Solo los perfiles de este endpoint (nombre de la url).')
+        parser.add_argument('--summary', action='store_true', help='Suma los perfiles y muestra las funciones mas costosas.')
+        parser.add_argument('--top', type=int, default=20, help='Funciones a mostrar con --summary.')
+        parser.add_argument('--sort', choices=SORT_KEYS, default='cumulative', help='Orden de los perfiles pstats con --summary.')
+        parser.add_argument('--token', action='store_true', help='Imprime un token para la cabecera de perfilado.')
+
+    def handle(self, *args, **options):
+        if options['token']:
+            self.stdout.write(make_token())
+            return
+
+        profiles = list_profiles()
+        if options['endpoint']:
+            profiles = [profile for profile in profiles if profile.endpoint == options['endpoint']]
+        if not profiles:
+            self.stdout.write(f'No profiles in {get_profile_directory()}.')
+            return
+
+        if options['summary']:
+            formats = {profile.format for profile in profiles}
+            if len(formats) > 1:
+                raise CommandError('Profiles mix pstats and collapsed stacks; filter them with --endpoint.')
+            if formats == {'pstats'}:
+                self.summarize_stats(profiles, options['sort'], options['top'])
+            else:
+                self.summarize_stacks(profiles, options['top'])
+            return
+
+        for profile in profiles:
+            created = datetime.fromtimestamp(profile.created, timezone.utc).isoformat(timespec='seconds')
+            self.stdout.write(
+                f'{created}  {profile.method:6} {profile.status}  {profile.duration_ms:>6} ms  '
+                f'{profile.trigger:7}  {profile.endpoint}  {profile.path.name}'
+            )
+        durations = sorted(profile.duration_ms for profile in profiles)
+        self.stdout.write(
+            f'{len(profiles)} profiles, median {durations[len(durations) // 2]} ms, max {durations[-1]} ms.'
+        )
+
+    def summarize_stats(self, profiles, sort, top):
+        output = io.StringIO()
+        stats = pstats.Stats(*(str(profile.path) for profile in profiles), stream=output)
+        stats.strip_dirs().sort_stats(sort).print_stats(top)
+        self.stdout.write(output.getvalue())
+
+    def summarize_stacks(self, profiles, top):
+        # Muestras propias (el marco esta en la cima de la pila) e inclusivas (esta en la pila).
+        own, inclusive = Counter(), Counter()
+        total = 0
+        for profile in profiles:
+            with open(profile.path) as lines:
+                for line in lines:
+                    stack, _, count = line.rstrip('\n').rpartition(' ')
+                    frames = stack.split(';')
+                    own[frames[-1]] += int(count)
+                    for frame in set(frames):
+                        inclusive[frame] += int(count)
+                    total += int(count)
+
+        self.stdout.write(f'{total} samples in {len(profiles)} profiles.')
+        self.stdout.write('  own%   incl%  function')
+        for frame, count in inclusive.most_common(top):
+            self.stdout.write(f'{own[frame] / total:6.1%} {count / total:6.1%}  {frame}')
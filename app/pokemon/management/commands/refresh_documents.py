@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from pokemon.documents import DEFAULT_REFRESH_BATCH_SIZE, refresh_documents
+
+
+class Command(BaseCommand):
+    help = (
+        'Regenera los documentos JSON de todos los pokemons (ver pokemon/documents.py), por ejemplo '
+        'tras cambiar la representacion o escribir directamente en las tablas.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_REFRESH_BATCH_SIZE, help='Pokemons por transaccion.',
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        refreshed = refresh_documents(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Done in {round(time.perf_counter() - start, 3)}s: {refreshed} documents refreshed.'
+        ))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from pokemon.service import ScoreService
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula la columna score de todos los pokemons con ScoreService.calculate_scores, '
+        'por ejemplo tras cambiar los pesos del puntaje.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Pokemons por bulk_update.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        updated = ScoreService.refresh_scores(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Done in {round(time.perf_counter() - start, 3)}s: {updated} scores updated.'
+        ))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from pokemon.client import PokeApiUnavailable
+from pokemon.sync import PokemonSynchronizer
+
+
+class Command(BaseCommand):
+    help = (
+        'Vuelve a descargar de la pokeapi los pokemons registrados y guarda los que han cambiado, '
+        'con un numero acotado de hilos y un limite global de llamadas por segundo (ver POKEAPI["SYNC_*"]).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--checkpoint', default='sync_pokemon.checkpoint',
+            help='Fichero donde guardar el progreso para reanudar la sincronizacion (por defecto sync_pokemon.checkpoint).',
+        )
+        parser.add_argument('--batch-size', type=int, help='Pokemons por transaccion.')
+        parser.add_argument('--concurrency', type=int, help='Descargas simultaneas.')
+        parser.add_argument('--rate', type=float, help='Maximo de llamadas por segundo a la pokeapi (0 = sin limite).')
+        parser.add_argument('--restart', action='store_true', help='Ignora el checkpoint y empieza desde el principio.')
+
+    def handle(self, *args, **options):
+        synchronizer = PokemonSynchronizer(
+            checkpoint_path=options['checkpoint'],
+            batch_size=options['batch_size'],
+            concurrency=options['concurrency'],
+            rate=options['rate'],
+            restart=options['restart'],
+            progress=lambda report: self.stdout.write(
+                f"processed={report['processed']} updated={report['updated']} unchanged={report['unchanged']} "
+                f"missing={report['missing']} errors={report['errors']} per_second={report['per_second']}"
+            ),
+        )
+        try:
+            report = synchronizer.run()
+        except PokeApiUnavailable as e:
+            raise CommandError(f'{e} Run the command again to resume from {options["checkpoint"]}.')
+        finally:
+            for error in synchronizer.errors[:20]:
+                self.stderr.write(f"{error['pokemon_id']}: {error['errors']}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done in {report['seconds']}s ({report['per_second']} pokemons/s): {report['updated']} updated, "
+            f"{report['unchanged']} unchanged, {report['missing']} missing, {report['errors']} errors."
+        ))
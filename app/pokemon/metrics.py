@@ -0,0 +1,267 @@
+"""Metricas de rendimiento por peticion.
+
+MetricsMiddleware mide cada peticion y reparte su tiempo en fases:
+
+- db: consultas a la base de datos (numero y tiempo), medidas con un execute_wrapper que se
+  instala en cada conexion.
+- serialize: PokemonSerializer(...).data y el montaje de las respuestas con los documentos
+  guardados (ver documents.py).
+- pokeapi: llamadas HTTP de PokemonApiService a la pokeapi, reintentos incluidos.
+
+El tiempo de una fase no incluye el de las fases que se ejecutan dentro de ella (por ejemplo las
+consultas que lanza la serializacion al evaluar un queryset). Cada respuesta lleva las fases en la
+cabecera Server-Timing y el middleware las acumula en histogramas por endpoint, que /metrics
+expone en el formato de texto de Prometheus. Los histogramas son del proceso que atiende la
+peticion: con varios procesos Prometheus debe consultar cada uno.
+
+Fuera de una peticion (comandos, hilos de refresco de la cache) las mediciones no hacen nada.
+"""
+import functools
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+DEFAULT_METRICS_SETTINGS = {
+    'ENABLED': True,
+    'SERVER_TIMING': True,
+    # Limites superiores (en segundos) de los histogramas de tiempo.
+    'DURATION_BUCKETS': (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    'QUERY_COUNT_BUCKETS': (0, 1, 2, 3, 5, 10, 20, 50, 100, 500),
+}
+
+PHASES = ('db', 'serialize', 'pokeapi')
+UNMATCHED_ENDPOINT = 'unmatched'
+
+_current = ContextVar('pokemon_request_metrics', default=None)
+
+
+def get_metrics_settings():
+    return {**DEFAULT_METRICS_SETTINGS, **getattr(settings, 'POKEMON_METRICS', {})}
+
+
+class RequestMetrics:
+    """Tiempos y numero de operaciones de cada fase de una peticion."""
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.durations = dict.fromkeys(PHASES, 0.0)
+        self.counts = dict.fromkeys(PHASES, 0)
+        # Suma de los tiempos anotados, para descontar las fases anidadas.
+        self.recorded = 0.0
+        # Las llamadas de get_many_pokemon_data anotan desde varios hilos.
+        self._lock = threading.Lock()
+
+    def add(self, phase, seconds):
+        with self._lock:
+            self.durations[phase] += seconds
+            self.counts[phase] += 1
+            self.recorded += seconds
+
+    def elapsed(self):
+        return perf_counter() - self.started
+
+    def server_timing(self, total):
+        """Valor de la cabecera Server-Timing, con los tiempos en milisegundos."""
+        parts = [f'db;desc="{self.counts["db"]} queries";dur={self.durations["db"] * 1000:.3f}']
+        for phase in PHASES[1:]:
+            if self.counts[phase]:
+                parts.append(f'{phase};dur={self.durations[phase] * 1000:.3f}')
+        parts.append(f'total;dur={total * 1000:.3f}')
+        return ', '.join(parts)
+
+
+@contextmanager
+def timed(phase):
+    """Anota el tiempo del bloque en la fase indicada de la peticion en curso."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    recorded = metrics.recorded
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(phase, perf_counter() - start - (metrics.recorded - recorded))
+
+
+def propagate(func):
+    """Envuelve func para que anote en la peticion en curso aunque se ejecute en otro hilo."""
+    metrics = _current.get()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _current.set(metrics)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return wrapper
+
+
+def record_query(execute, sql, params, many, context):
+    """execute_wrapper que anota cada consulta en la fase db."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add('db', perf_counter() - start)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """Receptor de connection_created: instala record_query en la conexion una sola vez."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class Histogram:
+    """Histograma acumulativo con limites fijos, como los de Prometheus."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        # Los limites son inclusivos (le): el primer limite >= value.
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self):
+        total = 0
+        for count in self.counts:
+            total += count
+            yield total
+
+
+class MetricsRegistry:
+    """Histogramas por endpoint de las peticiones atendidas por el proceso."""
+
+    HISTOGRAMS = (
+        ('pokemon_request_duration_seconds', 'Request duration in seconds.', 'DURATION_BUCKETS'),
+        ('pokemon_request_db_queries', 'Database queries per request.', 'QUERY_COUNT_BUCKETS'),
+        ('pokemon_request_db_duration_seconds', 'Time spent in database queries per request.', 'DURATION_BUCKETS'),
+        ('pokemon_request_serialize_duration_seconds', 'Time spent serializing per request.', 'DURATION_BUCKETS'),
+        ('pokemon_request_pokeapi_duration_seconds', 'Time spent calling the PokeAPI per request.', 'DURATION_BUCKETS'),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._requests = {}
+
+    def observe(self, endpoint, method, status_code, metrics, total):
+        values = (
+            total, metrics.counts['db'], metrics.durations['db'],
+            metrics.durations['serialize'], metrics.durations['pokeapi'],
+        )
+        with self._lock:
+            key = (endpoint, method, status_code)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            for (name, _, buckets), value in zip(self.HISTOGRAMS, values):
+                histogram = self._histograms.get((name, endpoint))
+                if histogram is None:
+                    histogram = Histogram(get_metrics_settings()[buckets])
+                    self._histograms[name, endpoint] = histogram
+                histogram.observe(value)
+
+    def render(self):
+        """Exporta las metricas en el formato de texto de Prometheus (version 0.0.4)."""
+        lines = [
+            '# HELP pokemon_requests_total Requests handled by this process.',
+            '# TYPE pokemon_requests_total counter',
+        ]
+        with self._lock:
+            for (endpoint, method, status_code), count in sorted(self._requests.items()):
+                lines.append(
+                    f'pokemon_requests_total{{endpoint="{endpoint}",method="{method}",status="{status_code}"}} {count}'
+                )
+            for name, description, _ in self.HISTOGRAMS:
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} histogram')
+                for (histogram_name, endpoint), histogram in sorted(self._histograms.items()):
+                    if histogram_name != name:
+                        continue
+                    bounds = [format_bound(bound) for bound in histogram.buckets] + ['+Inf']
+                    for bound, count in zip(bounds, histogram.cumulative_counts()):
+                        lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+                    lines.append(f'{name}_sum{{endpoint="{endpoint}"}} {histogram.sum!r}')
+                    lines.append(f'{name}_count{{endpoint="{endpoint}"}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._requests.clear()
+
+
+def format_bound(bound):
+    return repr(float(bound))
+
+
+registry = MetricsRegistry()
+
+
+def endpoint_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return (match.url_name or match.view_name) if match else UNMATCHED_ENDPOINT
+
+
+class MetricsMiddleware:
+    """Mide cada peticion, añade la cabecera Server-Timing y la anota en los histogramas.
+    Debe ir la primera en MIDDLEWARE para que el tiempo total incluya el resto de middlewares.
+    En las respuestas en streaming la cabecera solo refleja el tiempo hasta empezar a enviar el
+    cuerpo, y la peticion se anota en los histogramas al terminar de enviarlo.
+    """
+
+    def __init__(self, get_response):
+        config = get_metrics_settings()
+        if not config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.server_timing = config['SERVER_TIMING']
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        if self.server_timing:
+            response['Server-Timing'] = metrics.server_timing(metrics.elapsed())
+        observe = functools.partial(
+            registry.observe, endpoint_name(request), request.method, response.status_code, metrics,
+        )
+        if response.streaming:
+            response.streaming_content = self.measure_stream(response.streaming_content, metrics, observe)
+        else:
+            observe(metrics.elapsed())
+        return response
+
+    @staticmethod
+    def measure_stream(content, metrics, observe):
+        iterator = iter(content)
+        try:
+            while True:
+                token = _current.set(metrics)
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    _current.reset(token)
+                yield chunk
+        finally:
+            observe(metrics.elapsed())
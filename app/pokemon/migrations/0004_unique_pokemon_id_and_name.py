@@ -0,0 +1,41 @@
+# Generated by Django 3.2 on 2026-10-18 10:42
+
+from django.db import migrations, models
+
+
+def remove_duplicated_pokemons(apps, schema_editor):
+    # Antes de crear los indices unicos se conserva el pokemon registrado primero
+    # para cada pokemon_id y cada name, y se eliminan los duplicados posteriores.
+    Pokemon = apps.get_model('pokemon', 'Pokemon')
+    for field in ('pokemon_id', 'name'):
+        duplicated_values = (
+            Pokemon.objects.values(field)
+            .annotate(total=models.Count('pk'))
+            .filter(total__gt=1)
+            .values_list(field, flat=True)
+        )
+        for value in list(duplicated_values):
+            duplicates = Pokemon.objects.filter(**{field: value}).order_by('created_at', 'pk')
+            keep = duplicates.first()
+            duplicates.exclude(pk=keep.pk).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pokemon', '0003_alter_pokemon_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicated_pokemons, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='pokemon',
+            name='name',
+            field=models.CharField(max_length=100, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='pokemon',
+            name='pokemon_id',
+            field=models.IntegerField(unique=True),
+        ),
+    ]
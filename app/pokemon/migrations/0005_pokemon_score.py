@@ -0,0 +1,53 @@
+# Generated by Django 3.2 on 2026-10-18 10:51
+
+from django.db import migrations, models
+
+STAT_FIELDS = ('hp', 'attack', 'defense', 'special_attack', 'special_defense', 'speed')
+
+
+# Pesos de ScoreService cuando se escribio esta migracion. La formula se copia aqui para que la
+# migracion calcule siempre lo mismo aunque ScoreService cambie despues.
+PESO_TIPOS = 0.4
+PESO_ESTADISTICAS = 0.3
+PESO_HABILIDADES = 0.2
+PESO_OTROS = 0.1
+
+
+def fill_scores(apps, schema_editor):
+    # Calcula el puntaje de los pokemons ya registrados en bloques para no cargarlos todos en memoria.
+    Pokemon = apps.get_model('pokemon', 'Pokemon')
+    pks = list(Pokemon.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(pks), 500):
+        pokemons = list(
+            Pokemon.objects.filter(pk__in=pks[start:start + 500]).prefetch_related('types', 'abilities', 'base_stats')
+        )
+        for pokemon in pokemons:
+            stats = next(iter(pokemon.base_stats.all()), None)
+            score = (
+                len(pokemon.types.all()) * PESO_TIPOS
+                + (sum(getattr(stats, field) for field in STAT_FIELDS) if stats else 0) * PESO_ESTADISTICAS
+                + len(pokemon.abilities.all()) * PESO_HABILIDADES
+                + (pokemon.height + pokemon.weight) * PESO_OTROS
+            )
+            pokemon.score = round(score, 2)
+        Pokemon.objects.bulk_update(pokemons, ['score'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pokemon', '0004_unique_pokemon_id_and_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pokemon',
+            name='score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(fill_scores, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='pokemon',
+            index=models.Index(fields=['-score', 'pokemon_id'], name='pokemon_score_rank_idx'),
+        ),
+    ]
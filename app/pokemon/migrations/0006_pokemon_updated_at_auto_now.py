@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 10:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pokemon', '0005_pokemon_score'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pokemon',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 3.2 on 2026-10-18 11:06
+
+from django.db import migrations, models
+
+# Las tablas intermedias de types y abilities las crea Django y no admiten Meta.indexes, por lo
+# que sus indices (nombre, pokemon) se crean aqui. Permiten resolver los filtros por tipo o
+# habilidad y sus estimaciones solo con el indice.
+THROUGH_INDEXES = (
+    ('types', ['type', 'pokemon'], 'pokemon_types_filter_idx'),
+    ('abilities', ['ability', 'pokemon'], 'pokemon_abilities_filter_idx'),
+)
+
+
+def add_through_indexes(apps, schema_editor):
+    Pokemon = apps.get_model('pokemon', 'Pokemon')
+    for field, fields, name in THROUGH_INDEXES:
+        schema_editor.add_index(Pokemon._meta.get_field(field).remote_field.through, models.Index(fields=fields, name=name))
+
+
+def remove_through_indexes(apps, schema_editor):
+    Pokemon = apps.get_model('pokemon', 'Pokemon')
+    for field, fields, name in THROUGH_INDEXES:
+        schema_editor.remove_index(Pokemon._meta.get_field(field).remote_field.through, models.Index(fields=fields, name=name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pokemon', '0006_pokemon_updated_at_auto_now'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_through_indexes, remove_through_indexes),
+        migrations.AddIndex(
+            model_name='pokemon',
+            index=models.Index(fields=['height'], name='pokemon_height_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pokemon',
+            index=models.Index(fields=['weight'], name='pokemon_weight_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stat',
+            index=models.Index(fields=['hp', 'pokemon'], name='stat_hp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stat',
+            index=models.Index(fields=['attack', 'pokemon'], name='stat_attack_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stat',
+            index=models.Index(fields=['defense', 'pokemon'], name='stat_defense_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stat',
+            index=models.Index(fields=['special_attack', 'pokemon'], name='stat_special_attack_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stat',
+            index=models.Index(fields=['special_defense', 'pokemon'], name='stat_special_defense_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stat',
+            index=models.Index(fields=['speed', 'pokemon'], name='stat_speed_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2 on 2026-10-18 11:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_extra_stats(apps, schema_editor):
+    # Las lecturas siempre usaban la primera Stat de cada pokemon (la de menor pk), asi que se
+    # conserva esa y se borran las demas antes de crear el indice unico.
+    Stat = apps.get_model('pokemon', 'Stat')
+    first_stats = Stat.objects.values('pokemon_id').annotate(first=Min('pk')).values('first')
+    Stat.objects.exclude(pk__in=first_stats).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pokemon', '0007_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_extra_stats, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='stat',
+            name='pokemon',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='base_stats', to='pokemon.pokemon'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2 on 2026-10-18 11:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pokemon', '0008_stat_one_to_one'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PokemonDocument',
+            fields=[
+                ('pokemon', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='document', serialize=False, to='pokemon.pokemon')),
+                ('content', models.BinaryField()),
+            ],
+        ),
+    ]
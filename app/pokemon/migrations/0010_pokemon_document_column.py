@@ -0,0 +1,40 @@
+# Generated by Django 3.2 on 2026-10-18 12:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import pokemon.models
+
+
+def copy_documents(apps, schema_editor):
+    # Los documentos ya renderizados pasan de la tabla PokemonDocument a la columna con un solo UPDATE.
+    Pokemon = apps.get_model('pokemon', 'Pokemon')
+    PokemonDocument = apps.get_model('pokemon', 'PokemonDocument')
+    Pokemon.objects.update(
+        document=Subquery(PokemonDocument.objects.filter(pokemon=OuterRef('pk')).values('content')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pokemon', '0009_pokemon_document'),
+    ]
+
+    operations = [
+        # Sin el acceso inverso 'document', que coincidiria con el nombre de la columna nueva.
+        migrations.AlterField(
+            model_name='pokemondocument',
+            name='pokemon',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='pokemon.pokemon'),
+        ),
+        migrations.AddField(
+            model_name='pokemon',
+            name='document',
+            field=pokemon.models.DocumentField(null=True),
+        ),
+        migrations.RunPython(copy_documents, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='PokemonDocument',
+        ),
+    ]
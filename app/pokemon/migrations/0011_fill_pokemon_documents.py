@@ -0,0 +1,63 @@
+# Generated by Django 3.2 on 2026-10-18 12:40
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import migrations, models
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+STAT_FIELDS = ('hp', 'attack', 'defense', 'special_attack', 'special_defense', 'speed')
+
+
+# Representacion de PokemonSerializer cuando se escribio esta migracion. Se copia aqui para que la
+# migracion genere siempre lo mismo aunque el serializador cambie despues; los documentos de una
+# representacion nueva se regeneran con `manage.py refresh_documents`.
+def render_document(pokemon, datetime_field):
+    try:
+        stats = pokemon.base_stats
+    except ObjectDoesNotExist:
+        stats = None
+    representation = {
+        'id': str(pokemon.id),
+        'name': pokemon.name,
+        'height': pokemon.height,
+        'weight': pokemon.weight,
+        'pokemon_id': pokemon.pokemon_id,
+        'updated_at': datetime_field.to_representation(pokemon.updated_at),
+        'sprite_url': pokemon.sprite_url,
+        'types': [type_.name for type_ in pokemon.types.all()],
+        'abilities': [ability.name for ability in pokemon.abilities.all()],
+        'base_stats': {field: getattr(stats, field) for field in STAT_FIELDS} if stats else {},
+    }
+    # Los mismos bytes que ORJSONRenderer, que se usa al escribir los documentos.
+    return JSONRenderer().render(representation)
+
+
+def fill_documents(apps, schema_editor):
+    # Renderiza en bloques los documentos que faltan para que las lecturas los usen desde el
+    # despliegue, sin esperar a refresh_documents.
+    Pokemon = apps.get_model('pokemon', 'Pokemon')
+    Type = apps.get_model('pokemon', 'Type')
+    Ability = apps.get_model('pokemon', 'Ability')
+    datetime_field = serializers.DateTimeField()
+    pks = list(Pokemon.objects.filter(document__isnull=True).order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(pks), 500):
+        pokemons = list(
+            Pokemon.objects.filter(pk__in=pks[start:start + 500]).select_related('base_stats').prefetch_related(
+                models.Prefetch('types', queryset=Type.objects.order_by('pk')),
+                models.Prefetch('abilities', queryset=Ability.objects.order_by('pk')),
+            )
+        )
+        for pokemon in pokemons:
+            pokemon.document = render_document(pokemon, datetime_field)
+        Pokemon.objects.bulk_update(pokemons, ['document'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pokemon', '0010_pokemon_document_column'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_documents, migrations.RunPython.noop),
+    ]
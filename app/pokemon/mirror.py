@@ -0,0 +1,128 @@
+import json
+import os
+import re
+import tarfile
+import time
+from pathlib import Path
+
+from .importer import InvalidItem, PokemonImporter
+from .service import PokemonApiService
+
+POKEMON_ENTRY_RE = re.compile(r'(?:^|/)pokemon/(\d+)/index\.json$')
+
+
+class CheckpointMismatch(Exception):
+    """El checkpoint pertenece a otro volcado."""
+
+
+def iter_dump_entries(path):
+    """Recorre los pokemons de un volcado de la pokeapi (formato api-data) sin cargarlo entero.
+    Acepta un directorio con ficheros pokemon/<id>/index.json o un tarball (comprimido o no),
+    que se lee en streaming miembro a miembro. En los directorios el orden es por id.
+    Yields:
+        tuple: Nombre de la entrada y funcion que devuelve su JSON decodificado.
+    """
+    path = Path(path)
+    if path.is_dir():
+        entries = []
+        for root, _, files in os.walk(path):
+            if 'index.json' not in files:
+                continue
+            name = Path(root, 'index.json').relative_to(path).as_posix()
+            match = POKEMON_ENTRY_RE.search(name)
+            if match:
+                entries.append((int(match.group(1)), name))
+        for _, name in sorted(entries):
+            yield name, lambda name=name: json.loads((path / name).read_bytes())
+        return
+
+    with tarfile.open(path, mode='r|*') as archive:
+        for member in archive:
+            if member.isfile() and POKEMON_ENTRY_RE.search(member.name):
+                yield member.name, lambda member=member: json.load(archive.extractfile(member))
+
+
+class DumpIngestor:
+    """Ingiere un volcado local de la pokeapi en las tablas Pokemon, Type, Ability y Stat.
+
+    Cada bloque se importa en su propia transaccion con PokemonImporter y, tras confirmarlo,
+    se guarda en el checkpoint cuantas entradas se han procesado, de forma que una ejecucion
+    interrumpida se reanuda en el siguiente bloque. Los pokemons ya registrados se omiten.
+
+    Examples:
+        >>> DumpIngestor('api-data/data/api/v2', checkpoint_path='ingest.checkpoint').run()
+        {'processed': 1302, 'created': 1302, 'skipped': 0, 'errors': 0, 'seconds': 2.1}
+    """
+
+    def __init__(self, source, checkpoint_path=None, batch_size=500, restart=False, progress=None):
+        self.source = str(Path(source).resolve())
+        self.checkpoint_path = Path(checkpoint_path) if checkpoint_path else None
+        self.batch_size = batch_size
+        self.restart = restart
+        self.progress = progress
+        self.processed = 0
+        self.created = 0
+        self.skipped = 0
+        self.errors = []
+
+    def load_checkpoint(self):
+        if self.restart or not self.checkpoint_path or not self.checkpoint_path.exists():
+            return 0
+        checkpoint = json.loads(self.checkpoint_path.read_text())
+        if checkpoint['source'] != self.source:
+            raise CheckpointMismatch(
+                f"Checkpoint {self.checkpoint_path} belongs to {checkpoint['source']}, not {self.source}."
+            )
+        return checkpoint['processed']
+
+    def save_checkpoint(self, last_entry):
+        if not self.checkpoint_path:
+            return
+        tmp_path = self.checkpoint_path.with_name(self.checkpoint_path.name + '.tmp')
+        tmp_path.write_text(json.dumps({'source': self.source, 'processed': self.processed, 'last_entry': last_entry}))
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def parse_entry(self, name, load):
+        try:
+            return PokemonApiService.parse_pokemon_data(load())
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            return InvalidItem(f'Invalid PokeAPI entry: {e!r}')
+
+    def ingest_batch(self, batch):
+        importer = PokemonImporter(batch_size=self.batch_size, skip_existing=True)
+        report = importer.run(data for _, data in batch)
+        self.created += report['created']
+        self.skipped += importer.skipped
+        self.errors.extend({'entry': batch[error['index']][0], 'errors': error['errors']} for error in report['errors'])
+
+        self.processed += len(batch)
+        self.save_checkpoint(batch[-1][0])
+        if self.progress:
+            self.progress(self.report())
+
+    def run(self):
+        """Ingiere el volcado desde el ultimo checkpoint.
+        Returns:
+            dict: Entradas procesadas, pokemons creados, omitidos por estar ya registrados, errores y segundos.
+        """
+        start = time.perf_counter()
+        resume_from = self.processed = self.load_checkpoint()
+        batch = []
+        for position, (name, load) in enumerate(iter_dump_entries(self.source)):
+            if position < resume_from:
+                continue
+            batch.append((name, self.parse_entry(name, load)))
+            if len(batch) >= self.batch_size:
+                self.ingest_batch(batch)
+                batch = []
+        if batch:
+            self.ingest_batch(batch)
+        return {**self.report(), 'seconds': round(time.perf_counter() - start, 3)}
+
+    def report(self):
+        return {
+            'processed': self.processed,
+            'created': self.created,
+            'skipped': self.skipped,
+            'errors': len(self.errors),
+        }
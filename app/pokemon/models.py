@@ -1,6 +1,8 @@
 import uuid
 from django.db import models
 
+STAT_FIELDS = ('hp', 'attack', 'defense', 'special_attack', 'special_defense', 'speed')
+
 class Type(models.Model):
     name = models.CharField(max_length=50, unique=True)
     
@@ -12,31 +14,114 @@ class Ability(models.Model):
     
     def __str__(self):
         return self.name
-    
+
+class DocumentField(models.BinaryField):
+    """Columna con el documento JSON precalculado del pokemon (ver documents.py).
+    Se le puede asignar una funcion sin argumentos que devuelve el documento: se llama al guardar,
+    despues de que auto_now haya fijado updated_at, para que el documento se escriba en el mismo
+    INSERT o UPDATE que el pokemon y con su updated_at definitivo.
+    """
+
+    def pre_save(self, model_instance, add):
+        value = getattr(model_instance, self.attname)
+        if callable(value):
+            value = value()
+            setattr(model_instance, self.attname, value)
+        return value
+
+class PokemonQuerySet(models.QuerySet):
+    def with_details(self):
+        # Las estadisticas se leen con un JOIN en la misma consulta y los tipos y habilidades
+        # se precargan, para que serializar N pokemons cueste 3 consultas en lugar de 1 + 3N.
+        # Los tipos y habilidades se ordenan por id para que la representacion sea estable y
+        # coincida con los documentos guardados (ver documents.py), que no se leen.
+        return self.defer('document').select_related('base_stats').prefetch_related(
+            models.Prefetch('types', queryset=Type.objects.order_by('pk')),
+            models.Prefetch('abilities', queryset=Ability.objects.order_by('pk')),
+        )
+
+    def with_fields(self, fields):
+        """Como with_details(), pero solo lee lo necesario para representar esos campos: las
+        columnas con only() y las estadisticas, tipos y habilidades solo si se piden.
+        pokemon_id se lee siempre porque es la clave de la paginacion.
+        """
+        relations = {'types': Type, 'abilities': Ability}
+        columns = [field for field in fields if field not in relations and field != 'base_stats']
+        queryset = self
+        if 'base_stats' in fields:
+            columns += [f'base_stats__{field}' for field in STAT_FIELDS]
+            queryset = queryset.select_related('base_stats')
+        queryset = queryset.only('pokemon_id', *columns)
+        return queryset.prefetch_related(*[
+            models.Prefetch(relation, queryset=model.objects.order_by('pk'))
+            for relation, model in relations.items() if relation in fields
+        ])
+
 class Pokemon(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now_add=True)
-    pokemon_id = models.IntegerField()
-    name = models.CharField(max_length=100)
+    # Se actualiza en cada save(), tambien cuando PokemonSerializer.update solo cambia tipos,
+    # habilidades o estadisticas, y sirve de validador para los GET condicionales.
+    updated_at = models.DateTimeField(auto_now=True)
+    pokemon_id = models.IntegerField(unique=True)
+    name = models.CharField(max_length=100, unique=True)
     height = models.IntegerField()
     weight = models.IntegerField()
     sprite_url = models.URLField()
+    # Puntaje de ScoreService guardado en cada escritura para poder ordenar el catalogo por indice.
+    score = models.FloatField(default=0)
+    # Representacion de lectura ya renderizada en JSON, para responder sin serializar (ver
+    # documents.py). Va despues de updated_at, que se fija antes al guardar.
+    document = DocumentField(null=True)
 
     types = models.ManyToManyField(Type)
     abilities = models.ManyToManyField(Ability)
 
+    objects = PokemonQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score', 'pokemon_id'], name='pokemon_score_rank_idx'),
+            # Rangos de los filtros del listado.
+            models.Index(fields=['height'], name='pokemon_height_idx'),
+            models.Index(fields=['weight'], name='pokemon_weight_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
+    def get_base_stats(self):
+        """Stat del pokemon o None si no tiene. Sin consultas si se leyo con with_details()."""
+        try:
+            return self.base_stats
+        except Stat.DoesNotExist:
+            return None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Se recuerda el pokemon_id leido para invalidar tambien las respuestas cacheadas del
+        # id anterior cuando una actualizacion lo cambia.
+        instance._loaded_pokemon_id = instance.__dict__.get('pokemon_id')
+        return instance
+
 class Stat(models.Model):
-    pokemon = models.ForeignKey(Pokemon, related_name='base_stats', on_delete=models.CASCADE)
+    # Una sola fila por pokemon: se lee con select_related y se actualiza en su sitio.
+    pokemon = models.OneToOneField(Pokemon, related_name='base_stats', on_delete=models.CASCADE)
     hp = models.IntegerField()
     attack = models.IntegerField()
     defense = models.IntegerField()
     special_attack = models.IntegerField()
     special_defense = models.IntegerField()
     speed = models.IntegerField()
+
+    class Meta:
+        # Cada indice incluye pokemon_id para resolver los filtros de rango solo con el indice,
+        # sin leer la tabla.
+        indexes = [
+            models.Index(fields=[field, 'pokemon'], name=f'stat_{field}_idx')
+            for field in STAT_FIELDS
+        ]
     
     def __str__(self):
-        return f"hp:{self.hp}, attack:{self.attack}, defense:{self.defense}, special_attack:{self.special_attack}, special_defense:{self.special_defense}, speed:{self.speed}"
\ No newline at end of file
+        return f"hp:{self.hp}, attack:{self.attack}, defense:{self.defense}, special_attack:{self.special_attack}, special_defense:{self.special_defense}, speed:{self.speed}"
@@ -0,0 +1,70 @@
+from django.conf import settings
+
+from .renderers import ORJSONRenderer
+
+DEFAULT_PAGE_MAX_LIMIT = 1000
+DEFAULT_STREAM_CHUNK_SIZE = 500
+
+
+class PaginationError(ValueError):
+    """Parametros de paginacion invalidos."""
+
+
+def get_page_max_limit():
+    return getattr(settings, 'POKEMON_PAGE_MAX_LIMIT', DEFAULT_PAGE_MAX_LIMIT)
+
+
+def get_stream_chunk_size():
+    return getattr(settings, 'POKEMON_STREAM_CHUNK_SIZE', DEFAULT_STREAM_CHUNK_SIZE)
+
+
+def parse_positive_int(value, name, minimum=0):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise PaginationError(f"'{name}' must be an integer.")
+    if value < minimum:
+        raise PaginationError(f"'{name}' must be greater than or equal to {minimum}.")
+    return value
+
+
+def keyset_page(queryset, limit, cursor=None):
+    """Obtiene una pagina ordenada por pokemon_id a partir de un cursor.
+    Args:
+        queryset (QuerySet): Queryset de pokemons a paginar.
+        limit (int): Numero maximo de pokemons de la pagina.
+        cursor (int): pokemon_id del ultimo pokemon de la pagina anterior.
+    Returns:
+        tuple: Lista de pokemons de la pagina y cursor de la siguiente pagina (None si es la ultima).
+    """
+    queryset = queryset.order_by('pokemon_id')
+    if cursor is not None:
+        queryset = queryset.filter(pokemon_id__gt=cursor)
+    # Se pide un elemento extra para saber si existe una pagina siguiente sin un COUNT.
+    page = list(queryset[:limit + 1])
+    if len(page) > limit:
+        page = page[:limit]
+        return page, page[-1].pokemon_id
+    return page, None
+
+
+def iter_keyset_chunks(queryset, chunk_size):
+    """Recorre el queryset en bloques de tamaño fijo ordenados por pokemon_id.
+    Cada bloque es una consulta independiente, por lo que las precargas del queryset
+    se aplican por bloque y la memoria usada no depende del tamaño de la tabla.
+    """
+    cursor = None
+    while True:
+        chunk, cursor = keyset_page(queryset, chunk_size, cursor)
+        if chunk:
+            yield chunk
+        if cursor is None:
+            return
+
+
+def iter_ndjson(queryset, serializer_class, chunk_size, **serializer_kwargs):
+    """Genera una linea JSON por pokemon para respuestas NDJSON en streaming."""
+    renderer = ORJSONRenderer()
+    for chunk in iter_keyset_chunks(queryset, chunk_size):
+        lines = [renderer.render(item) for item in serializer_class(chunk, many=True, **serializer_kwargs).data]
+        yield b'\n'.join(lines) + b'\n'
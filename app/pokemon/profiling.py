@@ -0,0 +1,232 @@
+"""Perfilado opcional de las vistas de la API.
+
+ProfilingMiddleware ejecuta la vista (y el renderizado de su respuesta) dentro de un perfilador
+cuando la peticion lo pide con una cabecera firmada (ver make_token) o cuando cae en el muestreo
+de SAMPLE_RATE, y guarda el resultado en un directorio que funciona como anillo: al superar
+MAX_PROFILES se borran los perfiles mas antiguos.
+
+Hay dos formatos:
+
+- pstats: cProfile, con todas las llamadas. Se lee con pstats o con `manage.py profiles`.
+- collapsed: un hilo toma la pila de la peticion cada SAMPLE_INTERVAL segundos y se guardan las
+  pilas en formato colapsado (una linea 'marco;marco;... muestras'), listo para flamegraph.pl o
+  speedscope. Pesa mucho menos que cProfile sobre las vistas con muchas llamadas.
+
+Con ENABLED = False el middleware se descarta al arrancar (MiddlewareNotUsed) y no cuesta nada.
+En las respuestas en streaming solo se perfila la vista, no la generacion del cuerpo.
+"""
+import cProfile
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, namedtuple
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILING_SETTINGS = {
+    'ENABLED': False,
+    # Fraccion de las peticiones que se perfilan sin cabecera (0 = solo con cabecera).
+    'SAMPLE_RATE': 0.0,
+    'HEADER': 'X-Pokemon-Profile',
+    # Segundos de validez de los tokens de make_token.
+    'TOKEN_MAX_AGE': 60 * 60,
+    'DIRECTORY': None,
+    'MAX_PROFILES': 100,
+    'FORMAT': 'pstats',
+    'SAMPLE_INTERVAL': 0.001,
+}
+
+TOKEN_SALT = 'pokemon.profiling'
+TOKEN_VALUE = 'profile'
+
+ProfileInfo = namedtuple('ProfileInfo', 'path created endpoint method status duration_ms trigger format')
+
+
+def get_profiling_settings():
+    return {**DEFAULT_PROFILING_SETTINGS, **getattr(settings, 'POKEMON_PROFILING', {})}
+
+
+def get_profile_directory():
+    directory = get_profiling_settings()['DIRECTORY']
+    return Path(directory) if directory else Path(tempfile.gettempdir()) / 'pokemon-profiles'
+
+
+def make_token():
+    """Valor de la cabecera que pide perfilar una peticion, firmado con SECRET_KEY."""
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(TOKEN_VALUE)
+
+
+def is_valid_token(token, max_age):
+    try:
+        return signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=max_age) == TOKEN_VALUE
+    except signing.BadSignature:
+        return False
+
+
+class StatsProfiler:
+    """cProfile sobre el hilo de la peticion."""
+
+    extension = 'pstats'
+
+    def __init__(self, interval):
+        self.profile = cProfile.Profile()
+
+    def __enter__(self):
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profile.disable()
+
+    def write(self, path):
+        self.profile.dump_stats(path)
+
+
+class StackSampler:
+    """Toma muestras de la pila del hilo que lo usa desde un hilo aparte."""
+
+    extension = 'collapsed'
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._thread_id = None
+
+    def __enter__(self):
+        self._thread_id = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def write(self, path):
+        with open(path, 'w') as output:
+            for stack, count in self.stacks.most_common():
+                output.write(f'{stack} {count}\n')
+
+
+PROFILERS = {profiler.extension: profiler for profiler in (StatsProfiler, StackSampler)}
+
+
+def profile_name(endpoint, method, status, duration_ms, trigger, extension):
+    return f'{time.time_ns()}-{endpoint}-{method}-{status}-{duration_ms}ms-{trigger}.{extension}'
+
+
+def parse_profile_name(path):
+    """ProfileInfo de un fichero del directorio, o None si no es un perfil."""
+    stem, _, extension = path.name.rpartition('.')
+    created, _, rest = stem.partition('-')
+    # El endpoint es el unico campo que puede contener guiones.
+    parts = rest.rsplit('-', 4)
+    if extension not in PROFILERS or not created.isdigit() or len(parts) != 5 or not parts[3].endswith('ms'):
+        return None
+    endpoint, method, status, duration, trigger = parts
+    return ProfileInfo(
+        path, int(created) / 1e9, endpoint, method, int(status), int(duration[:-2]), trigger, extension,
+    )
+
+
+def list_profiles(directory=None):
+    """Perfiles guardados, del mas antiguo al mas reciente."""
+    directory = directory or get_profile_directory()
+    if not directory.is_dir():
+        return []
+    profiles = (parse_profile_name(path) for path in directory.iterdir())
+    return sorted((profile for profile in profiles if profile), key=lambda profile: profile.created)
+
+
+def save_profile(profiler, directory, max_profiles, **fields):
+    """Escribe el perfil y borra los mas antiguos que sobren."""
+    directory.mkdir(parents=True, exist_ok=True)
+    name = profile_name(**fields, extension=profiler.extension)
+    # Se escribe con otro nombre y se renombra para que nunca se lea un perfil a medias.
+    temporary = directory / f'.{name}.tmp'
+    profiler.write(temporary)
+    os.replace(temporary, directory / name)
+    profiles = list_profiles(directory)
+    for profile in profiles[:max(len(profiles) - max_profiles, 0)]:
+        profile.path.unlink(missing_ok=True)
+
+
+class ProfilingMiddleware:
+    """Perfila las vistas que lo piden con la cabecera firmada o que caen en el muestreo.
+    Debe ir la ultima en MIDDLEWARE: devuelve la respuesta desde process_view, por lo que los
+    process_view de los middlewares posteriores no se ejecutarian en las peticiones perfiladas.
+    """
+
+    def __init__(self, get_response):
+        config = get_profiling_settings()
+        if not config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.config = config
+        self.profiler_class = PROFILERS[config['FORMAT']]
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def trigger(self, request):
+        token = request.headers.get(self.config['HEADER'])
+        if token is not None and is_valid_token(token, self.config['TOKEN_MAX_AGE']):
+            return 'header'
+        if self.config['SAMPLE_RATE'] and random.random() < self.config['SAMPLE_RATE']:
+            return 'sampled'
+        return None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        trigger = self.trigger(request)
+        if trigger is None:
+            return None
+
+        profiler = self.profiler_class(self.config['SAMPLE_INTERVAL'])
+        start = time.perf_counter()
+        with profiler:
+            response = view_func(request, *view_args, **view_kwargs)
+            # Las respuestas de DRF se renderizan despues de la vista; se fuerza aqui para que
+            # la serializacion a JSON tambien salga en el perfil.
+            if callable(getattr(response, 'render', None)):
+                response = response.render()
+        duration_ms = round((time.perf_counter() - start) * 1000)
+
+        match = request.resolver_match
+        directory = get_profile_directory()
+        try:
+            save_profile(
+                profiler,
+                directory,
+                self.config['MAX_PROFILES'],
+                endpoint=match.url_name or match.view_name,
+                method=request.method,
+                status=response.status_code,
+                duration_ms=duration_ms,
+                trigger=trigger,
+            )
+        except OSError:
+            # El perfilado nunca debe hacer fallar la peticion (disco lleno, permisos, etc.).
+            logger.exception('Could not save the profile of %s %s in %s', request.method, request.path, directory)
+        return response
@@ -0,0 +1,82 @@
+"""Renderers de la API con orjson y MessagePack.
+
+ORJSONRenderer genera exactamente los mismos bytes que el JSONRenderer de DRF (JSON compacto y
+UTF-8 sin escapar) varias veces mas rapido. Los tipos que orjson no conoce, y las fechas, que DRF
+recorta a milisegundos, se convierten con el encoder de DRF. Sin orjson instalado, o si se pide
+JSON indentado, se usa el JSONRenderer de DRF. La unica diferencia conocida son los float que se
+escriben con exponente (1e16 en lugar de 1e+16), que la API no devuelve.
+
+MessagePackRenderer responde en MessagePack a los clientes que lo piden con
+Accept: application/msgpack. Solo se ofrece si msgpack esta instalado (ver ContentNegotiation).
+"""
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin el se usa el JSONRenderer de DRF.
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack es opcional: sin el no se ofrece application/msgpack.
+    msgpack = None
+
+LINE_SEPARATOR = '\u2028'.encode()
+PARAGRAPH_SEPARATOR = '\u2029'.encode()
+
+ORJSON_OPTIONS = (
+    orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS if orjson else 0
+)
+
+encode_default = JSONEncoder().default
+
+
+class ORJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or not self.compact or self.ensure_ascii
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            content = orjson.dumps(data, default=encode_default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # Enteros de mas de 64 bits, NaN con strict, etc.: DRF decide como tratarlos.
+            return super().render(data, accepted_media_type, renderer_context)
+        # DRF escapa estos separadores para que el JSON tambien sea JavaScript valido.
+        if LINE_SEPARATOR in content or PARAGRAPH_SEPARATOR in content:
+            content = content.replace(LINE_SEPARATOR, b'\\u2028').replace(PARAGRAPH_SEPARATOR, b'\\u2029')
+        return content
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    available = msgpack is not None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=encode_default, use_bin_type=True)
+
+
+def renders_compact_json(request):
+    """True si la respuesta negociada es JSON compacto, el formato de los documentos de documents.py."""
+    renderer = getattr(request, 'accepted_renderer', None)
+    return (
+        isinstance(renderer, JSONRenderer) and renderer.compact and not renderer.ensure_ascii
+        and renderer.get_indent(request.accepted_media_type, {}) is None
+    )
+
+
+class ContentNegotiation(DefaultContentNegotiation):
+    """Negociacion de DRF sin los renderers cuya dependencia opcional no esta instalada."""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        renderers = [renderer for renderer in renderers if getattr(renderer, 'available', True)]
+        return super().select_renderer(request, renderers, format_suffix)
@@ -0,0 +1,196 @@
+"""Cache de respuestas de los endpoints de lectura de pokemons.
+
+Guarda la respuesta ya renderizada en el framework de cache de Django y la invalida con
+claves versionadas en lugar de borrar entradas:
+
+- Cada pokemon_id tiene una version que forma parte de la clave de get/id/<id> y score/<id>.
+- El catalogo tiene una version que forma parte de la clave del listado.
+- Una generacion global forma parte de todas las claves, para las escrituras masivas.
+
+Cambiar una version deja inaccesibles las entradas antiguas, que caducan por su timeout.
+Las versiones son tokens aleatorios, por lo que si una se pierde de la cache la nueva nunca
+coincide con la de entradas anteriores.
+
+Las respuestas se guardan en CACHE_ALIAS, que puede ser una cache en memoria de cada proceso, y las
+versiones en VERSION_CACHE_ALIAS, que tiene que ser compartida por todos los procesos: si no, una
+escritura solo invalidaria las respuestas del proceso que la hace (ver check_version_cache).
+"""
+import functools
+import hashlib
+import threading
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+DEFAULT_RESPONSE_CACHE_SETTINGS = {
+    'ENABLED': True,
+    'CACHE_ALIAS': 'default',
+    'VERSION_CACHE_ALIAS': 'pokemon-versions',
+    'TIMEOUT': 60 * 60,
+}
+# Backends cuyo contenido no ven los demas procesos.
+PROCESS_LOCAL_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+CACHED_STATUS_CODES = {200, 404}
+CACHED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Vary')
+KEY_PREFIX = 'pokemon-response'
+GENERATION_KEY = f'{KEY_PREFIX}:generation'
+LIST_VERSION_KEY = f'{KEY_PREFIX}:version:list'
+
+_stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+_stats_lock = threading.Lock()
+
+
+def get_response_cache_settings():
+    return {**DEFAULT_RESPONSE_CACHE_SETTINGS, **getattr(settings, 'POKEMON_RESPONSE_CACHE', {})}
+
+
+def get_cache():
+    return caches[get_response_cache_settings()['CACHE_ALIAS']]
+
+
+def get_version_cache():
+    """Cache compartida de las versiones (tambien la usan vocabulary.py y search.py)."""
+    return caches[get_response_cache_settings()['VERSION_CACHE_ALIAS']]
+
+
+@register(Tags.caches)
+def check_version_cache(app_configs, **kwargs):
+    """Exige que VERSION_CACHE_ALIAS exista y sea compartida entre procesos.
+    Con un solo proceso una cache en memoria es suficiente y el check puede silenciarse con
+    SILENCED_SYSTEM_CHECKS = ['pokemon.E001'].
+    """
+    alias = get_response_cache_settings()['VERSION_CACHE_ALIAS']
+    config = settings.CACHES.get(alias)
+    if config is None:
+        return [Error(
+            f"POKEMON_RESPONSE_CACHE['VERSION_CACHE_ALIAS'] is '{alias}', which is not in CACHES.",
+            id='pokemon.E002',
+        )]
+    if config['BACKEND'] in PROCESS_LOCAL_BACKENDS:
+        return [Error(
+            f"The '{alias}' cache holds the pokemon cache versions but is local to each process.",
+            hint='Writes in one worker would not invalidate the cached responses, vocabularies and '
+                 'search index of the others. Use a shared backend (file based, database or memcached).',
+            id='pokemon.E001',
+        )]
+    return []
+
+
+def pokemon_version_key(pokemon_id):
+    return f'{KEY_PREFIX}:version:pokemon:{pokemon_id}'
+
+
+def get_versions(keys):
+    """Lee varias versiones en una sola llamada a la cache y crea las que falten."""
+    cache = get_version_cache()
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump(*keys):
+    cache = get_version_cache()
+    cache.set_many({key: uuid.uuid4().hex for key in keys}, timeout=None)
+
+
+def invalidate(keys):
+    # Se invalida al momento y de nuevo al confirmar la transaccion: una lectura concurrente
+    # anterior al commit podria haber guardado los datos antiguos con la version nueva.
+    bump(*keys)
+    transaction.on_commit(lambda: bump(*keys))
+
+
+def invalidate_pokemon(*pokemon_ids):
+    """Invalida las respuestas de los pokemon_id indicados y el listado."""
+    invalidate([LIST_VERSION_KEY, *(pokemon_version_key(pokemon_id) for pokemon_id in set(pokemon_ids))])
+
+
+def invalidate_all():
+    """Invalida todas las respuestas, para escrituras masivas (importaciones, recalculo de puntajes)."""
+    invalidate([GENERATION_KEY])
+
+
+def record(endpoint, counter):
+    with _stats_lock:
+        _stats[endpoint][counter] += 1
+
+
+def response_cache_stats():
+    """Aciertos y fallos por endpoint desde que arranco el proceso.
+    Returns:
+        dict: {endpoint: {'hits', 'misses', 'hit_ratio'}}.
+    """
+    with _stats_lock:
+        stats = {endpoint: dict(counters) for endpoint, counters in _stats.items()}
+    for counters in stats.values():
+        total = counters['hits'] + counters['misses']
+        counters['hit_ratio'] = round(counters['hits'] / total, 4) if total else 0.0
+    return stats
+
+
+def make_key(request, endpoint, versions):
+    # Los parametros y el formato negociado cambian la representacion.
+    variant = hashlib.sha1(
+        f"{request.GET.urlencode()}|{request.META.get('HTTP_ACCEPT', '')}".encode()
+    ).hexdigest()
+    return f"{KEY_PREFIX}:{endpoint}:{':'.join(versions)}:{variant}"
+
+
+def build_response(request, entry):
+    status_code, content, headers = entry
+    response = HttpResponse(content, status=status_code)
+    for header, value in headers.items():
+        response[header] = value
+    if status_code != 200:
+        return response
+    last_modified = parse_http_date_safe(headers['Last-Modified']) if 'Last-Modified' in headers else None
+    return get_conditional_response(request, etag=headers.get('ETag'), last_modified=last_modified, response=response)
+
+
+def cache_response(endpoint):
+    """Cachea las respuestas GET de una vista de pokemons.
+    Con un argumento pokemon_id la clave depende de la version de ese pokemon y, si no, de la
+    version del catalogo. Las respuestas en streaming y los 304 no se guardan; los aciertos
+    responden a If-None-Match / If-Modified-Since con el ETag guardado sin tocar la base de datos.
+    Args:
+        endpoint (str): Nombre del endpoint en las claves y en las estadisticas.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            config = get_response_cache_settings()
+            if not config['ENABLED'] or request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            version_key = pokemon_version_key(kwargs['pokemon_id']) if 'pokemon_id' in kwargs else LIST_VERSION_KEY
+            key = make_key(request, endpoint, get_versions([GENERATION_KEY, version_key]))
+            cache = get_cache()
+            entry = cache.get(key)
+            if entry is not None:
+                record(endpoint, 'hits')
+                return build_response(request, entry)
+
+            record(endpoint, 'misses')
+            response = view(request, *args, **kwargs)
+            if response.status_code in CACHED_STATUS_CODES and not response.streaming:
+                if hasattr(response, 'render'):
+                    response.render()
+                headers = {header: response[header] for header in CACHED_HEADERS if response.has_header(header)}
+                cache.set(key, (response.status_code, response.content, headers), timeout=config['TIMEOUT'])
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,371 @@
+"""Busqueda local por nombre de los pokemons registrados.
+
+NameIndex mantiene en memoria dos indices sobre Pokemon.name:
+
+- Una lista ordenada de nombres, en la que los prefijos se buscan con bisect.
+- Un indice invertido de trigramas (con relleno al principio y al final del nombre) que da
+  los candidatos de las busquedas por subcadena y de las aproximadas, que despues se
+  verifican con la distancia de edicion.
+
+El indice se construye con una consulta en la primera busqueda y se actualiza al confirmar
+cada alta, cambio o baja de un pokemon (ver signals.py y PokemonImporter). Cada escritura
+incrementa un contador en la cache de versiones, compartida por todos los procesos, y publica sus filas (pk, name, pokemon_id) en una
+clave con el nuevo valor del contador. Al buscar, si el contador no coincide con el que refleja
+el indice, se aplican en orden las escrituras publicadas desde entonces, tambien las de otros
+procesos, sin consultar la base de datos.
+
+El indice solo se reconstruye si no puede ponerse al dia con lo publicado: en la primera
+busqueda, tras escrituras masivas (mas de MAX_PUBLISHED_ROWS filas), si se han perdido claves de
+la cache o si el proceso se ha quedado muy atras. Mientras un hilo lo reconstruye, el resto de
+busquedas siguen usando el indice anterior.
+"""
+import heapq
+import random
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from functools import partial
+
+from django.db import transaction
+
+from .models import Pokemon
+from .response_cache import KEY_PREFIX, get_version_cache
+
+VERSION_KEY = f'{KEY_PREFIX}:version:search'
+# Escrituras publicadas: se guardan una hora y como mucho se aplican MAX_REPLAYED_CHANGES
+# seguidas; un proceso mas atrasado reconstruye el indice.
+CHANGES_TIMEOUT = 60 * 60
+MAX_REPLAYED_CHANGES = 1000
+MAX_PUBLISHED_ROWS = 1000
+RELOAD = 'reload'
+# Tiempo que se espera a que se publique una escritura cuyo contador ya se ha incrementado
+# antes de darla por perdida y reconstruir el indice.
+PUBLISH_GRACE = 2
+PAD = '$'
+MATCH_RANKS = {'exact': 0, 'prefix': 1, 'substring': 2, 'fuzzy': 3}
+
+
+def normalize(name):
+    return name.strip().lower()
+
+
+def padded_trigrams(key):
+    padded = f'{PAD}{PAD}{key}{PAD}'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def trigrams(key):
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+def max_distance(query):
+    """Distancia de edicion admitida segun la longitud de la consulta."""
+    if len(query) < 3:
+        return 0
+    return 1 if len(query) <= 5 else 2
+
+
+def pattern_masks(pattern):
+    """Mascara de bits de las posiciones de cada caracter del patron."""
+    masks = {}
+    for position, char in enumerate(pattern):
+        masks[char] = masks.get(char, 0) | (1 << position)
+    return masks
+
+
+def edit_distance(pattern, text, masks=None):
+    """Distancia de edicion con transposiciones adyacentes (optimal string alignment).
+    Usa el algoritmo de bits en paralelo de Myers con la extension de Hyyrö: cada caracter de
+    text actualiza una columna completa de la matriz con operaciones sobre enteros.
+    Args:
+        masks (dict): pattern_masks(pattern), para reutilizarlas con muchos textos.
+    """
+    if not pattern:
+        return len(text)
+    masks = pattern_masks(pattern) if masks is None else masks
+    full = (1 << len(pattern)) - 1
+    high = 1 << (len(pattern) - 1)
+    vp, vn, d0, previous_eq = full, 0, 0, 0
+    distance = len(pattern)
+    for char in text:
+        eq = masks.get(char, 0)
+        transposed = (((~d0) & eq) << 1) & previous_eq
+        d0 = ((((eq & vp) + vp) ^ vp) | eq | vn | transposed) & full
+        hp = (vn | ~(d0 | vp)) & full
+        hn = vp & d0
+        if hp & high:
+            distance += 1
+        elif hn & high:
+            distance -= 1
+        x = ((hp << 1) | 1) & full
+        vn = x & d0
+        vp = ((hn << 1) | ~(x | d0)) & full
+        previous_eq = eq
+    return distance
+
+
+class NameIndex:
+    """Indice en memoria de los nombres de los pokemons, seguro entre hilos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._version = None
+        self._unpublished_since = None
+        # Cada nombre ocupa una posicion (slot) de _entries y cada trigrama guarda las posiciones
+        # de sus nombres en un array de enteros, mucho mas compacto que un conjunto de UUID.
+        self._entries = []
+        self._free_slots = []
+        self._slots = {}
+        self._sorted = []
+        self._postings = {}
+        # Los mismos trigramas separados por longitud del nombre, para las busquedas aproximadas.
+        self._postings_by_length = {}
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _add(self, pk, name, pokemon_id):
+        self._remove(pk)
+        key = normalize(name)
+        slot = self._free_slots.pop() if self._free_slots else len(self._entries)
+        entry = (key, name, pokemon_id, pk)
+        if slot == len(self._entries):
+            self._entries.append(entry)
+        else:
+            self._entries[slot] = entry
+        self._slots[pk] = slot
+        insort(self._sorted, (key, slot))
+        for trigram in padded_trigrams(key):
+            self._postings.setdefault(trigram, array('i')).append(slot)
+            self._postings_by_length.setdefault((trigram, len(key)), array('i')).append(slot)
+
+    def _remove(self, pk):
+        slot = self._slots.pop(pk, None)
+        if slot is None:
+            return
+        key = self._entries[slot][0]
+        del self._sorted[bisect_left(self._sorted, (key, slot))]
+        for trigram in padded_trigrams(key):
+            for index, index_key in ((self._postings, trigram), (self._postings_by_length, (trigram, len(key)))):
+                postings = index[index_key]
+                postings.remove(slot)
+                if not postings:
+                    del index[index_key]
+        self._entries[slot] = None
+        self._free_slots.append(slot)
+
+    def load(self, rows, version=None):
+        """Reconstruye el indice a partir de tuplas (pk, name, pokemon_id)."""
+        entries, slots = [], {}
+        postings, postings_by_length = defaultdict(partial(array, 'i')), defaultdict(partial(array, 'i'))
+        for pk, name, pokemon_id in rows:
+            if pk in slots:
+                continue
+            key = normalize(name)
+            length = len(key)
+            slot = slots[pk] = len(entries)
+            entries.append((key, name, pokemon_id, pk))
+            for trigram in padded_trigrams(key):
+                postings[trigram].append(slot)
+                postings_by_length[trigram, length].append(slot)
+        postings, postings_by_length = dict(postings), dict(postings_by_length)
+        ordered = sorted((entry[0], slot) for slot, entry in enumerate(entries))
+        with self._lock:
+            self._entries, self._free_slots, self._slots = entries, [], slots
+            self._sorted, self._postings, self._postings_by_length = ordered, postings, postings_by_length
+            self._version = version
+
+    def apply(self, upserts=(), deletes=()):
+        """Publica escrituras ya confirmadas y las aplica al indice junto con las pendientes."""
+        version = publish_changes(upserts, deletes)
+        self.replay(version)
+
+    def replay(self, version):
+        """Aplica las escrituras publicadas entre la version del indice y version.
+        Returns:
+            bool: False si no se pueden aplicar y hay que reconstruir el indice.
+        """
+        start = self._version
+        if start is None or not 0 < version - start <= MAX_REPLAYED_CHANGES:
+            return False
+        keys = [changes_key(number) for number in range(start + 1, version + 1)]
+        published = get_version_cache().get_many(keys)
+        changes = []
+        for key in keys:
+            if key not in published:
+                break
+            if published[key] == RELOAD:
+                return False
+            changes.append(published[key])
+        with self._lock:
+            if self._version != start:
+                # Otro hilo ya las ha aplicado o ha reconstruido el indice.
+                return True
+            for upserts, deletes in changes:
+                for pk in deletes:
+                    self._remove(pk)
+                for pk, name, pokemon_id in upserts:
+                    self._add(pk, name, pokemon_id)
+            self._version = start + len(changes)
+        if len(changes) == len(keys):
+            self._unpublished_since = None
+            return True
+        # El contador se incrementa justo antes de publicar: la siguiente puede estar en camino.
+        now = time.monotonic()
+        if self._unpublished_since is None:
+            self._unpublished_since = now
+        return now - self._unpublished_since < PUBLISH_GRACE
+
+    def ensure_current(self):
+        version = get_version()
+        if version == self._version or self.replay(version):
+            return
+        # Solo espera a la reconstruccion la primera busqueda; despues se sirve el indice anterior.
+        if not self._load_lock.acquire(blocking=self._version is None):
+            return
+        try:
+            # La version se lee antes de consultar: las escrituras durante la carga se aplican despues.
+            version = get_version()
+            if version != self._version and not self.replay(version):
+                self.load(Pokemon.objects.values_list('pk', 'name', 'pokemon_id').iterator(), version)
+                self._unpublished_since = None
+        finally:
+            self._load_lock.release()
+
+    def search(self, query, limit=10):
+        """Busca nombres por coincidencia exacta, prefijo, subcadena y distancia de edicion.
+        Returns:
+            list: Diccionarios con pokemon_id, name, match y distance, del mas al menos relevante.
+        """
+        query = normalize(query)
+        if not query:
+            return []
+        with self._lock:
+            matches = self._prefix_matches(query, limit)
+            if len(matches) < limit:
+                matches.update(self._substring_matches(query, limit - len(matches), matches))
+            # Las coincidencias aproximadas solo se buscan si el nombre no existe tal cual.
+            if len(matches) < limit and not any(match == 'exact' for _, match, _ in matches.values()):
+                matches.update(self._fuzzy_matches(query, limit - len(matches), matches))
+            ranked = sorted(matches.items(), key=lambda item: (item[1][0], self._entries[item[0]][0]))[:limit]
+            return [
+                {
+                    'pokemon_id': self._entries[slot][2],
+                    'name': self._entries[slot][1],
+                    'match': match,
+                    'distance': distance,
+                }
+                for slot, (_, match, distance) in ranked
+            ]
+
+    def _prefix_matches(self, query, limit):
+        matches = {}
+        for position in range(bisect_left(self._sorted, (query,)), len(self._sorted)):
+            key, slot = self._sorted[position]
+            if len(matches) >= limit or not key.startswith(query):
+                break
+            match = 'exact' if key == query else 'prefix'
+            matches[slot] = ((MATCH_RANKS[match],), match, 0)
+        return matches
+
+    def _substring_matches(self, query, limit, seen):
+        query_trigrams = trigrams(query)
+        if not query_trigrams:
+            return {}
+        postings = sorted((self._postings.get(trigram, ()) for trigram in query_trigrams), key=len)
+        candidates = set(postings[0]).intersection(*postings[1:]) - seen.keys()
+        found = (
+            (self._entries[slot][0].find(query), len(self._entries[slot][0]), slot)
+            for slot in candidates
+        )
+        # Primero las coincidencias mas cercanas al principio del nombre y los nombres mas cortos.
+        best = heapq.nsmallest(limit, (item for item in found if item[0] > 0))
+        return {slot: ((MATCH_RANKS['substring'], position, length), 'substring', 0) for position, length, slot in best}
+
+    def _fuzzy_matches(self, query, limit, seen):
+        distance = max_distance(query)
+        if not distance:
+            return {}
+        # Una insercion, borrado o sustitucion cambia como mucho tres trigramas y una transposicion
+        # de dos caracteres vecinos cuatro, asi que un nombre a distancia <= d tiene una longitud
+        # a +-d de la consulta y comparte con ella al menos len(trigramas) - 4d.
+        query_trigrams = padded_trigrams(query)
+        masks = pattern_masks(query)
+        found = []
+        for length in range(max(1, len(query) - distance), len(query) + distance + 1):
+            required = max(len(query_trigrams), length + 1) - 4 * distance
+            shared = Counter()
+            for trigram in query_trigrams:
+                shared.update(self._postings_by_length.get((trigram, length), ()))
+            for slot, count in shared.items():
+                if count < required or slot in seen:
+                    continue
+                key = self._entries[slot][0]
+                found_distance = edit_distance(query, key, masks)
+                if found_distance <= distance:
+                    found.append((found_distance, key, slot))
+        return {
+            slot: ((MATCH_RANKS['fuzzy'], found_distance), 'fuzzy', found_distance)
+            for found_distance, _, slot in heapq.nsmallest(limit, found)
+        }
+
+
+def get_version():
+    cache = get_version_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Valor inicial aleatorio: si el contador se pierde de la cache, el nuevo no coincide
+        # con el de ningun indice ya construido.
+        cache.add(VERSION_KEY, random.getrandbits(62), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    cache = get_version_cache()
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        return get_version()
+
+
+def changes_key(version):
+    return f'{VERSION_KEY}:{version}'
+
+
+def publish_changes(upserts=(), deletes=()):
+    """Anota una escritura en el contador y publica sus filas para el resto de procesos.
+    Returns:
+        int: Version del contador que corresponde a la escritura.
+    """
+    upserts, deletes = list(upserts), list(deletes)
+    changes = (upserts, deletes) if len(upserts) + len(deletes) <= MAX_PUBLISHED_ROWS else RELOAD
+    cache = get_version_cache()
+    while True:
+        version = bump_version()
+        # incr no es atomico entre procesos en todos los backends (FileBasedCache lee y escribe):
+        # si otro proceso ya ha publicado con el mismo numero, se pide el siguiente.
+        if cache.add(changes_key(version), changes, timeout=CHANGES_TIMEOUT):
+            return version
+
+
+name_index = NameIndex()
+
+
+def search_pokemons(query, limit=10):
+    """Busca pokemons registrados por nombre (ver NameIndex.search)."""
+    name_index.ensure_current()
+    return name_index.search(query, limit)
+
+
+def index_on_commit(upserts=(), deletes=()):
+    """Actualiza el indice cuando se confirme la transaccion en curso.
+    Args:
+        upserts (list): Tuplas (pk, name, pokemon_id) de pokemons creados o modificados.
+        deletes (list): Claves primarias de pokemons borrados.
+    """
+    upserts, deletes = list(upserts), list(deletes)
+    transaction.on_commit(lambda: name_index.apply(upserts, deletes))
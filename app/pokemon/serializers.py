@@ -1,5 +1,15 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, transaction
+from django.db.models import CharField, Value
+from django.utils import timezone
+from django.utils.functional import cached_property
 from rest_framework import serializers
 from .models import Pokemon, Type, Ability, Stat
+from .metrics import timed
+from .renderers import ORJSONRenderer
+from .service import STAT_FIELDS, ScoreService
+from .vocabulary import ability_ids, get_vocabulary, type_ids
 
 class TypeSerializer(serializers.ModelSerializer):
     class Meta:
@@ -7,11 +17,9 @@ class TypeSerializer(serializers.ModelSerializer):
         fields = ['name']
     
     def to_internal_value(self, data):
-        # Intenta obtener el tipo por nombre, si no existe, crea uno nuevo.
-        try:
-            return Type.objects.get(name=data['name'])
-        except Type.DoesNotExist:
-            return Type.objects.create(**data)
+        # Obtiene el id del tipo por nombre desde la cache del vocabulario, creandolo si no existe.
+        name = data['name']
+        return Type(pk=type_ids.resolve([name])[name], name=name)
 
 class AbilitySerializer(serializers.ModelSerializer):
     class Meta:
@@ -19,17 +27,22 @@ class AbilitySerializer(serializers.ModelSerializer):
         fields = ['name']
     
     def to_internal_value(self, data):
-        # Intenta obtener la habilidad por nombre, si no existe, crea una nueva.
-        try:
-            return Ability.objects.get(name=data['name'])
-        except Ability.DoesNotExist:
-            return Ability.objects.create(**data)
+        # Obtiene el id de la habilidad por nombre desde la cache del vocabulario, creandola si no existe.
+        name = data['name']
+        return Ability(pk=ability_ids.resolve([name])[name], name=name)
 
 class StatSerializer(serializers.ModelSerializer):
     class Meta:
         model = Stat
         fields = ['hp', 'attack', 'defense', 'special_attack', 'special_defense', 'speed']
 
+class PokemonListSerializer(serializers.ListSerializer):
+
+    @property
+    def data(self):
+        with timed('serialize'):
+            return super().data
+
 class PokemonSerializer(serializers.ModelSerializer):
     types = serializers.ListField(child=serializers.CharField(), write_only=True)
     abilities = serializers.ListField(child=serializers.CharField(), write_only=True)
@@ -37,93 +50,273 @@ class PokemonSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Pokemon
+        list_serializer_class = PokemonListSerializer
         fields = ['id', 'name', 'height', 'weight', 'pokemon_id', 'updated_at', 'sprite_url', 'types', 'abilities', 'base_stats']
 
-    def validate(self, data):
-        name = data.get('name')
-        pokemon_id = data.get('pokemon_id')
+        # La unicidad de pokemon_id y name la garantizan los indices unicos de la base de datos,
+        # por lo que se desactivan los UniqueValidator que harian un exists() por campo en cada escritura.
+        extra_kwargs = {
+            'pokemon_id': {'validators': []},
+            'name': {'validators': []},
+        }
+
+    def __init__(self, *args, fields=None, **kwargs):
+        # Campos de lectura a representar (ver parse_fieldset); None para todos.
+        self.representation_fields = fields
+        super().__init__(*args, **kwargs)
+
+    def unique_errors(self, validated_data):
+        """Construye los errores de unicidad tras un IntegrityError con el mismo formato que la validacion.
+        Solo se ejecuta en el camino de error, por lo que las escrituras correctas no hacen consultas extra.
+        Args:
+            validated_data (dict): Datos validados que se intentaron guardar.
+        Returns:
+            dict: Errores por campo, vacio si el IntegrityError no se debe a pokemon_id o name.
+        """
+        errors = {}
         instance = self.instance  # 'instance' será None si es una creación
+        pokemon_id = validated_data.get('pokemon_id')
+        name = validated_data.get('name')
+        existing = Pokemon.objects.exclude(pk=instance.pk if instance else None)
 
-        # Validación para pokemon_id
-        if pokemon_id is not None:
-            # Comprobar si existe un Pokemon con el mismo pokemon_id que no sea esta instancia
-            existing = Pokemon.objects.filter(pokemon_id=pokemon_id).exclude(pk=instance.pk if instance else None)
-            if existing.exists():
-                raise serializers.ValidationError({"pokemon_id": f"A Pokemon with Id {pokemon_id} already exists."})
-    
-        # Validación para name
-        if name:
-            # Comprobar si existe un Pokemon con el mismo name que no sea esta instancia
-            existing = Pokemon.objects.filter(name=name).exclude(pk=instance.pk if instance else None)
-            if existing.exists():
-                raise serializers.ValidationError({"name": f"A Pokemon with name {name} already exists."})
-        
-        return data
+        if pokemon_id is not None and existing.filter(pokemon_id=pokemon_id).exists():
+            errors['pokemon_id'] = [f"A Pokemon with Id {pokemon_id} already exists."]
+        if name and existing.filter(name=name).exists():
+            errors['name'] = [f"A Pokemon with name {name} already exists."]
+        return errors
 
+    def save(self, **kwargs):
+        try:
+            with transaction.atomic():
+                return super().save(**kwargs)
+        except IntegrityError:
+            errors = self.unique_errors({**self.validated_data, **kwargs})
+            if not errors:
+                raise
+            raise serializers.ValidationError(errors)
 
     def create(self, validated_data):
         stats_data = validated_data.pop('base_stats', {})
-        types_names = validated_data.pop('types', [])
-        abilities_names = validated_data.pop('abilities', [])
-
-        pokemon = Pokemon.objects.create(**validated_data)
-
-        # Process each type name and get or create the Type instance
-        for name in types_names:
-            type_instance, _ = Type.objects.get_or_create(name=name)
-            pokemon.types.add(type_instance)
+        types_names = list(dict.fromkeys(validated_data.pop('types', [])))
+        abilities_names = list(dict.fromkeys(validated_data.pop('abilities', [])))
 
-        # Process each ability name and get or create the Ability instance
-        for name in abilities_names:
-            ability_instance, _ = Ability.objects.get_or_create(name=name)
-            pokemon.abilities.add(ability_instance)
+        validated_data['score'] = ScoreService.score_value(
+            types_names, abilities_names, stats_data, validated_data['height'], validated_data['weight']
+        )
+        pokemon = Pokemon(**validated_data)
 
-        # Create stat
-        if stats_data:
-            Stat.objects.create(pokemon=pokemon, **stats_data)
+        # Los ids salen de la cache del vocabulario y los enlaces se insertan en bloque despues del pokemon.
+        links = []
+        for relation, model, names in (('types', Type, types_names), ('abilities', Ability, abilities_names)):
+            ids = get_vocabulary(model).resolve(names)
+            through = getattr(Pokemon, relation).through
+            column = f'{model._meta.model_name}_id'
+            links.append((through, [through(pokemon_id=pokemon.pk, **{column: ids[name]}) for name in names]))
+            remember_relation(pokemon, relation, [model(pk=ids[name], name=name) for name in names])
+        stat = Stat(pokemon=pokemon, **stats_data) if stats_data else None
 
+        # El documento se renderiza con lo que ya esta en memoria y se escribe en el mismo INSERT
+        # que el pokemon (ver DocumentField).
+        pokemon.document = lambda: render_document(pokemon, self.updated_at_field)
+        pokemon.save(force_insert=True)
+        for through, rows in links:
+            through.objects.bulk_create(rows)
+        # Con bulk_create, sin post_save, para no vaciar el documento recien escrito.
+        if stat is not None:
+            Stat.objects.bulk_create([stat])
         return pokemon
     
     def update(self, instance, validated_data):
-        types_data = validated_data.pop('types', [])
-        abilities_data = validated_data.pop('abilities', [])
-        stats_data = validated_data.pop('base_stats', {})  
-
-        instance.name = validated_data.get('name', instance.name)
-        instance.height = validated_data.get('height', instance.height)
-        instance.weight = validated_data.get('weight', instance.weight)
-        instance.pokemon_id = validated_data.get('pokemon_id', instance.pokemon_id)
-        instance.sprite_url = validated_data.get('sprite_url', instance.sprite_url)
-        instance.save()
-
-        if types_data:
-            instance.types.clear()
-            for type_name in types_data:
-                type_instance, created = Type.objects.get_or_create(name=type_name)
-                instance.types.add(type_instance)
-
-        if abilities_data:
-            instance.abilities.clear()
-            for ability_name in abilities_data:
-                ability_instance, created = Ability.objects.get_or_create(name=ability_name)
-                instance.abilities.add(ability_instance)
-
-        if stats_data:
-            print(Stat.objects.filter(pokemon=instance).get())
-            print("stats",stats_data)
-            Stat.objects.filter(pokemon=instance).delete()
-            if isinstance(stats_data, dict): 
-                Stat.objects.create(pokemon=instance, **stats_data)
+        """Actualiza solo lo que cambia, en la transaccion que abre save().
+        Los tipos y habilidades se comparan con los actuales y se aplican con un DELETE y un
+        INSERT en bloque sobre la tabla intermedia, la estadistica se actualiza con un UPDATE y
+        el pokemon con save(update_fields=...). Si no cambia nada no se escribe.
+        """
+        types_names = list(dict.fromkeys(validated_data.pop('types', None) or []))
+        abilities_names = list(dict.fromkeys(validated_data.pop('abilities', None) or []))
+        stats_data = validated_data.pop('base_stats', None) or {}
+
+        changed = [field for field, value in validated_data.items() if getattr(instance, field) != value]
+        for field in changed:
+            setattr(instance, field, validated_data[field])
+
+        current = self.load_relations(instance)
+        relations_changed = False
+        for relation, model, names in (('types', Type, types_names), ('abilities', Ability, abilities_names)):
+            if names:
+                resolved = get_vocabulary(model).resolve(names)
+                relations_changed |= self.apply_relation(instance, relation, model, current[relation], resolved)
+                objects = [model(pk=resolved[name], name=name) for name in names]
             else:
-                raise TypeError(f"Expected a dictionary in stats data, got {type(stats_data)} instead")
+                objects = [model(pk=pk, name=name) for pk, name in current[relation].items()]
+            remember_relation(instance, relation, objects)
+
+        stat, stat_changed = self.update_stat(instance, stats_data)
 
+        score = ScoreService.score_value(
+            related_names(instance, 'types'),
+            related_names(instance, 'abilities'),
+            {field: getattr(stat, field) for field in STAT_FIELDS} if stat else {},
+            instance.height,
+            instance.weight,
+        )
+        if score != instance.score:
+            instance.score = score
+            changed.append('score')
+        if changed or relations_changed or stat_changed:
+            # El documento se regenera en el mismo UPDATE que el pokemon (ver DocumentField).
+            instance.document = lambda: render_document(instance, self.updated_at_field)
+            instance.save(update_fields=[*changed, 'updated_at', 'document'])
         return instance
 
+    def load_relations(self, instance):
+        """Obtiene los tipos y habilidades actuales del pokemon, de la cache de prefetch_related
+        si se leyo con with_details() (o de los ya escritos) o con una sola consulta si no.
+        Returns:
+            dict: {relacion: {id: nombre}} actuales.
+        """
+        known = {**getattr(instance, '_prefetched_objects_cache', {}), **instance.__dict__.get('_written_relations', {})}
+        if 'types' in known and 'abilities' in known:
+            return {
+                relation: {obj.pk: obj.name for obj in known[relation]}
+                for relation in ('types', 'abilities')
+            }
+
+        current = {'types': {}, 'abilities': {}}
+        queries = [
+            getattr(Pokemon, relation).through.objects.filter(pokemon_id=instance.pk)
+            .values_list(Value(relation, output_field=CharField()), f'{field}_id', f'{field}__name')
+            for relation, field in (('types', 'type'), ('abilities', 'ability'))
+        ]
+        for relation, pk, name in queries[0].union(queries[1], all=True):
+            current[relation][pk] = name
+        return current
+
+    def apply_relation(self, instance, relation, model, current, resolved):
+        """Aplica la diferencia entre los tipos o habilidades actuales y los pedidos.
+        Args:
+            current (dict): {id: nombre} actuales.
+            resolved (dict): {nombre: id} pedidos.
+        Returns:
+            bool: True si la relacion ha cambiado.
+        """
+        wanted = set(resolved.values())
+        removed = current.keys() - wanted
+        added = wanted - current.keys()
+        through = getattr(Pokemon, relation).through
+        column = f'{model._meta.model_name}_id'
+        if removed:
+            through.objects.filter(pokemon_id=instance.pk, **{f'{column}__in': removed}).delete()
+        if added:
+            through.objects.bulk_create([through(pokemon_id=instance.pk, **{column: pk}) for pk in added])
+        return bool(removed or added)
+
+    def update_stat(self, instance, stats_data):
+        """Actualiza en su sitio las columnas de la estadistica que cambian, con un solo UPDATE.
+        No consulta la estadistica si el pokemon se leyo con select_related('base_stats').
+        Returns:
+            tuple: Estadistica resultante (None si el pokemon no tiene) y si ha cambiado.
+        """
+        stat = instance.get_base_stats()
+        if stat is None:
+            if not stats_data:
+                return None, False
+            missing = [field for field in STAT_FIELDS if field not in stats_data]
+            if missing:
+                raise serializers.ValidationError({'base_stats': {field: ['This field is required.'] for field in missing}})
+            # Con bulk_create, sin post_save, para no vaciar el documento que update() regenera.
+            stat = Stat(pokemon=instance, **stats_data)
+            Stat.objects.bulk_create([stat])
+            return stat, True
+
+        changes = {field: value for field, value in stats_data.items() if getattr(stat, field) != value}
+        if changes:
+            Stat.objects.filter(pk=stat.pk).update(**changes)
+            for field, value in changes.items():
+                setattr(stat, field, value)
+        return stat, bool(changes)
+
+    @property
+    def data(self):
+        # Tiempo de serializacion para la cabecera Server-Timing y /metrics (ver metrics.py).
+        with timed('serialize'):
+            return super().data
+
+    @cached_property
+    def updated_at_field(self):
+        # Campo de DRF para updated_at con la zona horaria actual ya resuelta una vez por
+        # serializador: consultarla en cada pokemon es lo mas caro de serializar un listado.
+        return serializers.DateTimeField(default_timezone=timezone.get_current_timezone() if settings.USE_TZ else None)
 
     def to_representation(self, instance):
-        representation = super(PokemonSerializer, self).to_representation(instance)
-        representation['types'] =  [type.name for type in instance.types.all()]
-        representation['abilities'] = [abilitie.name for abilitie in instance.abilities.all()]
-        stat_instance = instance.base_stats.first()
-        representation['base_stats'] = StatSerializer(stat_instance).data if stat_instance else {}
-        return representation
+        return pokemon_representation(instance, self.updated_at_field, self.representation_fields)
+
+def remember_relation(pokemon, relation, objects):
+    """Guarda en el pokemon los tipos o habilidades que se acaban de escribir, para representarlo
+    sin volver a consultarlos (ver related_objects). Descarta la precarga de esa relacion, que ya
+    no es valida, como hace Django al modificar una relacion ManyToMany.
+    """
+    pokemon.__dict__.setdefault('_written_relations', {})[relation] = list(objects)
+    pokemon.__dict__.get('_prefetched_objects_cache', {}).pop(relation, None)
+
+def related_objects(pokemon, relation):
+    # Usa los objetos recien escritos (remember_relation) o la cache de prefetch_related sin crear
+    # el manager de la relacion, que cuesta mas que recorrerla; si no hay ninguno se consulta con .all().
+    written = pokemon.__dict__.get('_written_relations', {}).get(relation)
+    if written is not None:
+        return written
+    prefetched = pokemon.__dict__.get('_prefetched_objects_cache', {}).get(relation)
+    return prefetched if prefetched is not None else getattr(pokemon, relation).all()
+
+def related_names(pokemon, relation):
+    return [obj.name for obj in related_objects(pokemon, relation)]
+
+def stat_representation(pokemon):
+    stat = pokemon.get_base_stats()
+    return {field: getattr(stat, field) for field in STAT_FIELDS} if stat else {}
+
+# Valor de cada campo de PokemonSerializer.Meta.fields en la respuesta.
+FIELD_REPRESENTATIONS = {
+    'id': lambda pokemon, datetime_field: str(pokemon.id),
+    'name': lambda pokemon, datetime_field: pokemon.name,
+    'height': lambda pokemon, datetime_field: pokemon.height,
+    'weight': lambda pokemon, datetime_field: pokemon.weight,
+    'pokemon_id': lambda pokemon, datetime_field: pokemon.pokemon_id,
+    'updated_at': lambda pokemon, datetime_field: datetime_field.to_representation(pokemon.updated_at),
+    'sprite_url': lambda pokemon, datetime_field: pokemon.sprite_url,
+    'types': lambda pokemon, datetime_field: related_names(pokemon, 'types'),
+    'abilities': lambda pokemon, datetime_field: related_names(pokemon, 'abilities'),
+    'base_stats': lambda pokemon, datetime_field: stat_representation(pokemon),
+}
+# Los campos de la respuesta, en su orden, son los de Meta.fields (types, abilities y base_stats
+# son write_only para DRF pero se representan aqui).
+READ_FIELDS = tuple(PokemonSerializer.Meta.fields)
+if set(READ_FIELDS) != set(FIELD_REPRESENTATIONS):
+    raise ImproperlyConfigured(
+        'FIELD_REPRESENTATIONS must define exactly the fields of PokemonSerializer.Meta.fields; '
+        f'missing {sorted(set(READ_FIELDS) - set(FIELD_REPRESENTATIONS))}, '
+        f'unknown {sorted(set(FIELD_REPRESENTATIONS) - set(READ_FIELDS))}.'
+    )
+
+def pokemon_representation(pokemon, datetime_field, fields=None):
+    """Representacion de lectura de PokemonSerializer construida directamente como diccionario.
+    Devuelve lo mismo que la serializacion campo a campo de DRF (mismas claves, en el mismo orden,
+    y mismos valores) sin recorrer sus campos, que en los listados grandes es la mayor parte del
+    tiempo de CPU. Un campo de Meta.fields sin entrada en FIELD_REPRESENTATIONS es un error al
+    importar el modulo.
+    Args:
+        fields (tuple): Campos de READ_FIELDS a incluir, en ese orden; todos si es None. Los que
+            no se piden no se leen, por lo que el pokemon puede venir de with_fields().
+    """
+    fields = READ_FIELDS if fields is None else fields
+    return {field: FIELD_REPRESENTATIONS[field](pokemon, datetime_field) for field in fields}
+
+def render_document(pokemon, datetime_field):
+    """Contenido de Pokemon.document: la representacion del pokemon en JSON compacto.
+    Los tipos y habilidades se ordenan por id, como los lee with_details(), para que el documento
+    sea igual a la respuesta construida desde la base de datos aunque se escribieran en otro orden.
+    """
+    representation = pokemon_representation(pokemon, datetime_field)
+    for relation in ('types', 'abilities'):
+        representation[relation] = [obj.name for obj in sorted(related_objects(pokemon, relation), key=lambda obj: obj.pk)]
+    return ORJSONRenderer().render(representation)
@@ -1,50 +1,296 @@
-import requests
+import math
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, ExpressionWrapper, F, FloatField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+try:
+    import numpy
+except ImportError:  # numpy esta en requirements.txt; sin el, calculate_scores calcula fila a fila.
+    numpy = None
+
+from .cache import ReadThroughCache
+from .client import PokeApiClient, PokeApiError, PokeApiUnavailable
+from .metrics import propagate, timed
+from .models import STAT_FIELDS, Pokemon
+from .response_cache import invalidate_all
+
+
+DEFAULT_POKEAPI_SETTINGS = {
+    'BASE_URL': 'https://pokeapi.co/api/v2',
+    'CACHE_ALIAS': 'default',
+    'CACHE_TTL': 60 * 60 * 24,
+    'CACHE_STALE_TTL': 60 * 60 * 24 * 7,
+    'CACHE_NEGATIVE_TTL': 60 * 5,
+    'CACHE_MAX_ENTRIES': 2048,
+    'CACHE_DISTRIBUTED_LOCK': False,
+    'CACHE_LOCK_TIMEOUT': 10,
+    'CONNECT_TIMEOUT': 3.05,
+    'READ_TIMEOUT': 10,
+    'MAX_RETRIES': 2,
+    'BACKOFF_BASE': 0.1,
+    'BACKOFF_MAX': 2,
+    'POOL_SIZE': 10,
+    'CIRCUIT_FAILURE_THRESHOLD': 5,
+    'CIRCUIT_RESET_TIMEOUT': 30,
+    'BATCH_MAX_NAMES': 50,
+    'BATCH_CONCURRENCY': 8,
+    'LOCAL_MIRROR': False,
+    'SYNC_CONCURRENCY': 8,
+    'SYNC_RATE_LIMIT': 10,
+    'SYNC_BATCH_SIZE': 100,
+}
+
+
+def get_pokeapi_settings():
+    return {**DEFAULT_POKEAPI_SETTINGS, **getattr(settings, 'POKEAPI', {})}
+
 
 class PokemonApiService:
+    _cache = None
+    _client = None
+    _lock = threading.Lock()
+
     @staticmethod
-    def get_pokemon_data(pokemon_name_or_id):
-        """Obtiene los datos de un pokemon de la pokeapi.
+    def normalize_name_or_id(pokemon_name_or_id):
+        """Normaliza el nombre o id para que 'Pikachu', ' pikachu' y 'pikachu' compartan entrada de cache."""
+        text = str(pokemon_name_or_id).strip().lower()
+        # isdigit() tambien acepta digitos no ASCII como '²', que int() no sabe convertir.
+        return str(int(text)) if text.isascii() and text.isdigit() else text
+
+    @classmethod
+    def get_cache(cls):
+        if cls._cache is None:
+            with cls._lock:
+                if cls._cache is None:
+                    config = get_pokeapi_settings()
+                    cls._cache = ReadThroughCache(
+                        cls.fetch_pokemon_data,
+                        prefix='pokeapi:pokemon',
+                        ttl=config['CACHE_TTL'],
+                        stale_ttl=config['CACHE_STALE_TTL'],
+                        negative_ttl=config['CACHE_NEGATIVE_TTL'],
+                        max_entries=config['CACHE_MAX_ENTRIES'],
+                        cache_alias=config['CACHE_ALIAS'],
+                        distributed_lock=config['CACHE_DISTRIBUTED_LOCK'],
+                        lock_timeout=config['CACHE_LOCK_TIMEOUT'],
+                    )
+        return cls._cache
+
+    @classmethod
+    def get_client(cls):
+        if cls._client is None:
+            with cls._lock:
+                if cls._client is None:
+                    config = get_pokeapi_settings()
+                    cls._client = PokeApiClient(
+                        config['BASE_URL'],
+                        connect_timeout=config['CONNECT_TIMEOUT'],
+                        read_timeout=config['READ_TIMEOUT'],
+                        max_retries=config['MAX_RETRIES'],
+                        backoff_base=config['BACKOFF_BASE'],
+                        backoff_max=config['BACKOFF_MAX'],
+                        pool_size=config['POOL_SIZE'],
+                        failure_threshold=config['CIRCUIT_FAILURE_THRESHOLD'],
+                        reset_timeout=config['CIRCUIT_RESET_TIMEOUT'],
+                    )
+        return cls._client
+
+    @classmethod
+    def reset(cls):
+        """Descarta la cache en memoria y el cliente HTTP para que se vuelvan a crear con la configuracion actual."""
+        with cls._lock:
+            if cls._client is not None:
+                cls._client.close()
+            cls._cache = None
+            cls._client = None
+
+    @classmethod
+    def cache_stats(cls):
+        return cls.get_cache().stats()
+
+    @classmethod
+    def get_pokemon_data(cls, pokemon_name_or_id):
+        """Obtiene los datos de un pokemon de la pokeapi pasando por la cache de lectura.
         Args:
             pokemon_name_or_id (str): Nombre o id del pokemon.
         Returns:
-            dict: Diccionario con los datos del pokemon.
+            dict: Diccionario con los datos del pokemon, o None si la pokeapi no lo conoce.
         Examples:
             >>> PokemonApiService.get_pokemon_data('bulbasaur')
             {'name': 'bulbasaur', 'pokemon_id': 1, 'height': 7, 'weight': 69, 'sprite_url': 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/1.png', 'base_stats': {'hp': 45, 'attack': 49, 'defense': 49, 'special_attack': 65, 'special_defense': 65, 'speed': 45}, 'types': ['grass', 'poison'], 'abilities': ['overgrow', 'chlorophyll']}
         """
+        key = cls.normalize_name_or_id(pokemon_name_or_id)
+        if get_pokeapi_settings()['LOCAL_MIRROR']:
+            pokemon_data = cls.get_local_pokemon_data(key)
+            if pokemon_data is not None:
+                return pokemon_data
+        return cls.get_cache().get(key)
+
+    @staticmethod
+    def get_local_pokemon_data(pokemon_name_or_id):
+        """Busca un pokemon en la base de datos local (el espejo creado con ingest_pokeapi_dump).
+        La busqueda usa los indices unicos de pokemon_id o name.
+        Args:
+            pokemon_name_or_id (str): Nombre o id del pokemon ya normalizado.
+        Returns:
+            dict: Diccionario con el mismo formato que la pokeapi, o None si no esta registrado.
+        """
+        is_id = pokemon_name_or_id.isascii() and pokemon_name_or_id.isdigit()
+        lookup = {'pokemon_id': int(pokemon_name_or_id)} if is_id else {'name': pokemon_name_or_id}
+        pokemon = Pokemon.objects.with_details().filter(**lookup).first()
+        return PokemonApiService.pokemon_data(pokemon) if pokemon is not None else None
+
+    @staticmethod
+    def pokemon_data(pokemon):
+        """Datos de un pokemon registrado con el mismo formato que parse_pokemon_data.
+        Sin consultas si se leyo con with_details().
+        """
+        stats = pokemon.get_base_stats()
+        return {
+            'name': pokemon.name,
+            'pokemon_id': pokemon.pokemon_id,
+            'height': pokemon.height,
+            'weight': pokemon.weight,
+            'sprite_url': pokemon.sprite_url,
+            'base_stats': {
+                'hp': stats.hp,
+                'attack': stats.attack,
+                'defense': stats.defense,
+                'special_attack': stats.special_attack,
+                'special_defense': stats.special_defense,
+                'speed': stats.speed,
+            } if stats else {},
+            'types': [type.name for type in pokemon.types.all()],
+            'abilities': [ability.name for ability in pokemon.abilities.all()],
+        }
+
+    @classmethod
+    def get_pokemon_data_result(cls, pokemon_name_or_id):
+        """Obtiene un pokemon y devuelve el resultado con su codigo HTTP en lugar de lanzar excepciones."""
+        try:
+            pokemon_data = cls.get_pokemon_data(pokemon_name_or_id)
+        except PokeApiUnavailable as e:
+            return {'query': pokemon_name_or_id, 'status': 503, 'detail': str(e)}
+        except PokeApiError as e:
+            return {'query': pokemon_name_or_id, 'status': 502, 'detail': str(e)}
+        if not pokemon_data:
+            return {'query': pokemon_name_or_id, 'status': 404, 'data': None}
+        return {'query': pokemon_name_or_id, 'status': 200, 'data': pokemon_data}
+
+    @classmethod
+    def get_many_pokemon_data(cls, pokemon_names_or_ids, max_workers=None):
+        """Obtiene varios pokemons de la pokeapi en paralelo.
+        Los nombres repetidos se consultan una sola vez y como mucho se hacen max_workers llamadas
+        simultaneas, por lo que la latencia total se acerca a la de la consulta mas lenta.
+        Args:
+            pokemon_names_or_ids (list): Nombres o ids de los pokemons.
+            max_workers (int): Maximo de consultas simultaneas, por defecto POKEAPI['BATCH_CONCURRENCY'].
+        Returns:
+            list: Un resultado por nombre, en el mismo orden, con 'query', 'status' y 'data' o 'detail'.
+        Examples:
+            >>> PokemonApiService.get_many_pokemon_data(['bulbasaur', 'missingno'])
+            [{'query': 'bulbasaur', 'status': 200, 'data': {'name': 'bulbasaur', ...}}, {'query': 'missingno', 'status': 404, 'data': None}]
+        """
+        max_workers = max_workers or get_pokeapi_settings()['BATCH_CONCURRENCY']
+        unique_names = list(dict.fromkeys(cls.normalize_name_or_id(name) for name in pokemon_names_or_ids))
+        if not unique_names:
+            return []
+
+        def lookup(name):
+            try:
+                return cls.get_pokemon_data_result(name)
+            finally:
+                # Con LOCAL_MIRROR los hilos abren su propia conexion a la base de datos.
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(unique_names))) as executor:
+            results = dict(zip(unique_names, executor.map(propagate(lookup), unique_names)))
+        return [
+            {**results[cls.normalize_name_or_id(name)], 'query': name}
+            for name in pokemon_names_or_ids
+        ]
+
+    @classmethod
+    def fetch_pokemon_data(cls, pokemon_name_or_id):
+        """Obtiene los datos de un pokemon directamente de la pokeapi, sin cache.
+        Args:
+            pokemon_name_or_id (str): Nombre o id del pokemon.
+        Returns:
+            dict: Diccionario con los datos del pokemon, o None si la pokeapi responde 404.
+        Raises:
+            PokeApiUnavailable: Si el circuito hacia la pokeapi esta abierto.
+            PokeApiError: Si la pokeapi falla tras los reintentos, responde con un error inesperado o
+                con un cuerpo que no se puede interpretar.
+        """
+        with timed('pokeapi'):
+            response = cls.get_client().get(f"/pokemon/{pokemon_name_or_id}")
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            raise PokeApiError(f"PokeAPI returned {response.status_code} for {pokemon_name_or_id}.")
         try:
-            response = requests.get(f"https://pokeapi.co/api/v2/pokemon/{pokemon_name_or_id}")
-            if response.status_code == 200:
-                response = response.json()
-                return {
-                    'name': response['name'],
-                    'pokemon_id': response['id'],
-                    'height': response['height'],
-                    'weight': response['weight'],
-                    'sprite_url': response['sprites']['front_default'],
-                    'base_stats':{
-                        'hp': response['stats'][0]['base_stat'],
-                        'attack': response['stats'][1]['base_stat'],
-                        'defense': response['stats'][2]['base_stat'],
-                        'special_attack': response['stats'][3]['base_stat'],
-                        'special_defense': response['stats'][4]['base_stat'],
-                        'speed': response['stats'][5]['base_stat'],
-                    },
-                    'types': [type_data['type']['name'] for type_data in response['types']],
-                    'abilities': [ability_data['ability']['name'] for ability_data in response['abilities']],
-                }
-                
-        except:
-            return response.raise_for_status(500)
+            return cls.parse_pokemon_data(response.json())
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            # Un 200 con JSON invalido o incompleto es un fallo de la pokeapi, no un error interno.
+            raise PokeApiError(f"PokeAPI returned an invalid body for {pokemon_name_or_id}: {e!r}") from e
 
+    @staticmethod
+    def parse_pokemon_data(response):
+        """Convierte la respuesta de /pokemon/<nombre o id> de la pokeapi al formato de la API."""
+        return {
+            'name': response['name'],
+            'pokemon_id': response['id'],
+            'height': response['height'],
+            'weight': response['weight'],
+            'sprite_url': response['sprites']['front_default'],
+            'base_stats':{
+                'hp': response['stats'][0]['base_stat'],
+                'attack': response['stats'][1]['base_stat'],
+                'defense': response['stats'][2]['base_stat'],
+                'special_attack': response['stats'][3]['base_stat'],
+                'special_defense': response['stats'][4]['base_stat'],
+                'speed': response['stats'][5]['base_stat'],
+            },
+            'types': [type_data['type']['name'] for type_data in response['types']],
+            'abilities': [ability_data['ability']['name'] for ability_data in response['abilities']],
+        }
+
+
+
+
+def relation_count(through):
+    """Subconsulta con el numero de filas de una tabla intermedia (tipos o habilidades) por pokemon.
+    Se usa en lugar de Count('types') para no multiplicar filas al contar dos relaciones a la vez.
+    """
+    return Coalesce(Subquery(
+        through.objects.filter(pokemon_id=OuterRef('pk'))
+        .order_by().values('pokemon_id').annotate(total=Count('*')).values('total')
+    ), 0)
 
 
+def stat_total():
+    """Suma de las estadisticas de cada pokemon (0 si no tiene), con un JOIN a su Stat."""
+    return sum((Coalesce(f'base_stats__{field}', 0) for field in STAT_FIELDS[1:]), Coalesce(f'base_stats__{STAT_FIELDS[0]}', 0))
+
 
 class ScoreService:
     PESO_TIPOS = 0.4
     PESO_ESTADISTICAS = 0.3
     PESO_HABILIDADES = 0.2
     PESO_OTROS = 0.1
+
+    # Parametro de la peticion de cada peso y atributo de la clase con su valor por defecto.
+    WEIGHT_PARAMS = {
+        'w_types': 'PESO_TIPOS',
+        'w_stats': 'PESO_ESTADISTICAS',
+        'w_abilities': 'PESO_HABILIDADES',
+        'w_other': 'PESO_OTROS',
+    }
 	
     @staticmethod
     def calculate_score(pokemon_data):
@@ -88,9 +334,157 @@ class ScoreService:
         score = types_score + stats_score + abilities_score + other_score
 
         return {"pokemon_score":round(score,2)}
-    
 
-        
 
+    @staticmethod
+    def score_value(types, abilities, base_stats, height, weight):
+        """Calcula el puntaje a partir de los campos sueltos de un pokemon.
+        Los tipos y habilidades repetidos cuentan una vez, igual que en las relaciones ManyToMany.
+        Returns:
+            float: Puntaje redondeado a dos decimales.
+        """
+        return ScoreService.calculate_score({
+            'types': list(dict.fromkeys(types)),
+            'abilities': list(dict.fromkeys(abilities)),
+            'base_stats': base_stats,
+            'height': height,
+            'weight': weight,
+        })['pokemon_score']
+
+    @staticmethod
+    def calculate_scores(stats, type_counts, ability_counts, heights, weights):
+        """Calcula el puntaje de muchos pokemons a la vez a partir de columnas.
+        Da exactamente los mismos valores que calculate_score, incluido el redondeo: las sumas se
+        hacen en el mismo orden y en float64, y los valores que quedan casi en la mitad de un
+        centesimo se redondean con round() de Python.
+        Con numpy instalado el calculo es vectorial; sin numpy se recorre fila a fila.
+        Args:
+            stats: Matriz de n filas con las estadisticas en el orden de STAT_FIELDS.
+            type_counts: Numero de tipos de cada pokemon.
+            ability_counts: Numero de habilidades de cada pokemon.
+            heights: Altura de cada pokemon.
+            weights: Peso de cada pokemon.
+        Returns:
+            numpy.ndarray | array.array: Puntajes en float64, en el mismo orden que la entrada.
+        Examples:
+            >>> ScoreService.calculate_scores([[78, 84, 78, 109, 85, 100]], [2], [2], [17], [905])
+            array([253.6])
+        """
+        if numpy is None:
+            return array('d', (
+                round(
+                    types * ScoreService.PESO_TIPOS + sum(row) * ScoreService.PESO_ESTADISTICAS
+                    + abilities * ScoreService.PESO_HABILIDADES + (height + weight) * ScoreService.PESO_OTROS,
+                    2,
+                )
+                for row, types, abilities, height, weight in zip(stats, type_counts, ability_counts, heights, weights)
+            ))
+
+        # Operaciones en el mismo orden que calculate_score y en el sitio para no crear temporales.
+        stats = numpy.asarray(stats, dtype=numpy.int64).reshape(-1, len(STAT_FIELDS))
+        stat_totals = numpy.zeros(len(stats), dtype=numpy.int64)
+        for column in range(len(STAT_FIELDS)):
+            stat_totals += stats[:, column]
+        scores = numpy.asarray(type_counts, dtype=numpy.int64) * ScoreService.PESO_TIPOS
+        scores += stat_totals * ScoreService.PESO_ESTADISTICAS
+        scores += numpy.asarray(ability_counts, dtype=numpy.int64) * ScoreService.PESO_HABILIDADES
+        scores += (numpy.asarray(heights, dtype=numpy.int64) + numpy.asarray(weights, dtype=numpy.int64)) * ScoreService.PESO_OTROS
+
+        # Igual que numpy.round(scores, 2), que puede diferir de round() cuando el valor por 100
+        # queda casi en la mitad de un entero; esos casos se redondean con round().
+        scaled = scores * 100
+        rounded = numpy.rint(scaled)
+        distance = numpy.abs(scaled - rounded, out=scaled)
+        distance -= 0.5
+        near_tie = numpy.flatnonzero(numpy.abs(distance, out=distance) < 1e-6)
+        rounded /= 100
+        for index in near_tie:
+            rounded[index] = round(float(scores[index]), 2)
+        return rounded
 
-        
+    @staticmethod
+    def parse_weights(params):
+        """Lee los pesos de un perfil de puntaje; los que no vienen toman el valor de la clase.
+        Args:
+            params (dict): Parametros de la peticion (w_types, w_stats, w_abilities, w_other).
+        Returns:
+            dict: Peso de cada atributo de la clase, por ejemplo {'PESO_TIPOS': 0.4, ...}.
+        Raises:
+            ValueError: Si algun peso no es un numero finito.
+        """
+        weights = {}
+        for param, attribute in ScoreService.WEIGHT_PARAMS.items():
+            value = params.get(param)
+            if value is None:
+                weights[attribute] = getattr(ScoreService, attribute)
+                continue
+            try:
+                weights[attribute] = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"'{param}' must be a number.")
+            if not math.isfinite(weights[attribute]):
+                raise ValueError(f"'{param}' must be a finite number.")
+        return weights
+
+    @staticmethod
+    def score_expression(weights):
+        """Expresion del ORM con la formula de calculate_score para anotar querysets de Pokemon,
+        de modo que la base de datos calcule y ordene el puntaje con cualquier perfil de pesos.
+        El resultado no se redondea; se redondea al mostrarlo con round() como calculate_score.
+        Args:
+            weights (dict): Pesos devueltos por parse_weights.
+        Examples:
+            >>> Pokemon.objects.annotate(custom_score=ScoreService.score_expression(weights)).order_by('-custom_score')[:50]
+        """
+        def weight(attribute):
+            return Value(weights[attribute], output_field=FloatField())
+
+        return ExpressionWrapper(
+            relation_count(Pokemon.types.through) * weight('PESO_TIPOS')
+            + stat_total() * weight('PESO_ESTADISTICAS')
+            + relation_count(Pokemon.abilities.through) * weight('PESO_HABILIDADES')
+            + (F('height') + F('weight')) * weight('PESO_OTROS'),
+            output_field=FloatField(),
+        )
+
+    @staticmethod
+    def score_columns(queryset):
+        """Lee en una sola consulta las columnas que necesita calculate_scores.
+        Returns:
+            tuple: pks, puntajes guardados y los argumentos de calculate_scores.
+        """
+        rows = queryset.order_by('pk').values_list(
+            'pk', 'score', 'height', 'weight',
+            relation_count(Pokemon.types.through), relation_count(Pokemon.abilities.through),
+            *(Coalesce(f'base_stats__{field}', 0) for field in STAT_FIELDS),
+        )
+        pks, scores, heights, weights, type_counts, ability_counts, stats = [], [], [], [], [], [], []
+        for row in rows:
+            pks.append(row[0])
+            scores.append(row[1])
+            heights.append(row[2])
+            weights.append(row[3])
+            type_counts.append(row[4])
+            ability_counts.append(row[5])
+            stats.append(row[6:])
+        return pks, scores, (stats, type_counts, ability_counts, heights, weights)
+
+    @staticmethod
+    def refresh_scores(queryset=None, batch_size=500):
+        """Recalcula la columna score de los pokemons del queryset (todos por defecto), por ejemplo
+        tras cambiar los pesos. Solo se escriben los pokemons cuyo puntaje cambia.
+        Returns:
+            int: Numero de pokemons actualizados.
+        """
+        queryset = queryset if queryset is not None else Pokemon.objects.all()
+        pks, current, columns = ScoreService.score_columns(queryset)
+        changed = [
+            Pokemon(pk=pk, score=float(score))
+            for pk, old_score, score in zip(pks, current, ScoreService.calculate_scores(*columns))
+            if old_score != score
+        ]
+        with transaction.atomic():
+            Pokemon.objects.bulk_update(changed, ['score'], batch_size=batch_size)
+            if changed:
+                invalidate_all()
+        return len(changed)
@@ -0,0 +1,74 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .documents import forget_documents, refresh_documents
+from .models import Ability, Pokemon, Stat, Type
+from .response_cache import invalidate_pokemon
+from .search import index_on_commit
+from .vocabulary import invalidate_vocabularies
+
+
+@receiver(post_save, sender=Pokemon)
+def invalidate_saved_pokemon(sender, instance, **kwargs):
+    # PokemonSerializer.update guarda el pokemon tambien cuando solo cambian tipos, habilidades
+    # o estadisticas, por lo que este receptor cubre todas las escrituras de add y update.
+    invalidate_pokemon(instance.pokemon_id, getattr(instance, '_loaded_pokemon_id', None) or instance.pokemon_id)
+    instance._loaded_pokemon_id = instance.pokemon_id
+    index_on_commit(upserts=[(instance.pk, instance.name, instance.pokemon_id)])
+
+
+@receiver(post_save, sender=Pokemon)
+def forget_saved_pokemon_document(sender, instance, created, update_fields, **kwargs):
+    # PokemonSerializer escribe el documento en el mismo UPDATE (document esta en update_fields);
+    # el resto de escrituras (admin, shell) pueden haber cambiado cualquier campo.
+    if not created and (update_fields is None or 'document' not in update_fields):
+        forget_documents([instance.pk])
+
+
+@receiver(m2m_changed, sender=Pokemon.types.through)
+@receiver(m2m_changed, sender=Pokemon.abilities.through)
+def forget_relinked_documents(sender, instance, action, reverse, pk_set, **kwargs):
+    # El serializador escribe la tabla intermedia directamente y no pasa por aqui.
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            forget_documents([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        forget_documents(pk_set)
+    elif action == 'pre_clear':
+        forget_documents(instance.pokemon_set.all())
+
+
+@receiver(post_save, sender=Stat)
+@receiver(post_delete, sender=Stat)
+def forget_stat_document(sender, instance, **kwargs):
+    # PokemonSerializer escribe las estadisticas con bulk_create y update(), sin pasar por aqui,
+    # y regenera el documento despues.
+    forget_documents([instance.pokemon_id])
+
+
+@receiver(post_delete, sender=Pokemon)
+def invalidate_deleted_pokemon(sender, instance, **kwargs):
+    invalidate_pokemon(instance.pokemon_id)
+    index_on_commit(deletes=[instance.pk])
+
+
+@receiver(post_save, sender=Type)
+@receiver(post_save, sender=Ability)
+def invalidate_renamed_vocabulary(sender, instance, created, **kwargs):
+    # Las altas no invalidan: los procesos que no conocen un nombre lo buscan al resolverlo.
+    if not created:
+        invalidate_vocabularies()
+        refresh_documents(instance.pokemon_set.all())
+
+
+@receiver(post_delete, sender=Type)
+@receiver(post_delete, sender=Ability)
+def invalidate_deleted_vocabulary(sender, instance, **kwargs):
+    invalidate_vocabularies()
+
+
+@receiver(pre_delete, sender=Type)
+@receiver(pre_delete, sender=Ability)
+def forget_vocabulary_documents(sender, instance, **kwargs):
+    # Antes del borrado, mientras la tabla intermedia aun dice que pokemons lo usan.
+    forget_documents(instance.pokemon_set.all())
@@ -0,0 +1,177 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.db import IntegrityError, transaction
+from rest_framework.exceptions import ValidationError
+
+from .client import PokeApiError, PokeApiUnavailable, RateLimiter
+from .models import Pokemon
+from .pagination import keyset_page
+from .serializers import PokemonSerializer
+from .service import PokemonApiService, get_pokeapi_settings
+
+# Campos que se comparan tal cual; tipos y habilidades se comparan como conjuntos porque las
+# relaciones no guardan el orden de la pokeapi.
+COMPARED_FIELDS = ('name', 'height', 'weight', 'sprite_url', 'base_stats')
+
+
+def has_changed(current, fetched):
+    """True si los datos de la pokeapi difieren de los registrados (ambos con el formato de parse_pokemon_data)."""
+    return (
+        any(current[field] != fetched[field] for field in COMPARED_FIELDS)
+        or set(current['types']) != set(fetched['types'])
+        or set(current['abilities']) != set(fetched['abilities'])
+    )
+
+
+class PokemonSynchronizer:
+    """Vuelve a descargar de la pokeapi los pokemons registrados y guarda los que han cambiado.
+
+    Recorre los pokemons por pokemon_id en bloques de batch_size. Cada bloque se descarga con
+    concurrency hilos, sin pasar de rate llamadas por segundo entre todos (ver RateLimiter), y
+    sin la cache de lectura para obtener datos frescos. Los pokemons que difieren de la base de
+    datos se actualizan con PokemonSerializer en una transaccion por bloque, por lo que solo se
+    escriben las columnas y relaciones que cambian y se regeneran sus documentos y caches.
+
+    Tras confirmar cada bloque se guarda en el checkpoint el ultimo pokemon_id y los contadores,
+    de forma que una ejecucion interrumpida (por ejemplo porque el circuito hacia la pokeapi se
+    abre) se reanuda en el bloque siguiente. Al terminar el recorrido el checkpoint se borra y la
+    siguiente ejecucion empieza desde el principio.
+
+    Examples:
+        >>> PokemonSynchronizer(checkpoint_path='sync.checkpoint').run()
+        {'processed': 1302, 'updated': 12, 'unchanged': 1288, 'missing': 1, 'errors': 1, 'seconds': 130.4, 'per_second': 9.98}
+    """
+
+    def __init__(self, checkpoint_path=None, batch_size=None, concurrency=None, rate=None, restart=False, progress=None):
+        config = get_pokeapi_settings()
+        self.checkpoint_path = Path(checkpoint_path) if checkpoint_path else None
+        self.batch_size = batch_size or config['SYNC_BATCH_SIZE']
+        self.concurrency = concurrency or config['SYNC_CONCURRENCY']
+        self.rate_limiter = RateLimiter(config['SYNC_RATE_LIMIT'] if rate is None else rate)
+        self.restart = restart
+        self.progress = progress
+        self.cursor = None
+        self.counts = {'processed': 0, 'updated': 0, 'unchanged': 0, 'missing': 0, 'errors': 0}
+        self.errors = []
+        self.seconds = 0.0
+
+    def load_checkpoint(self):
+        if self.restart or not self.checkpoint_path or not self.checkpoint_path.exists():
+            return
+        checkpoint = json.loads(self.checkpoint_path.read_text())
+        self.cursor = checkpoint['cursor']
+        self.counts.update(checkpoint['counts'])
+        self.seconds = checkpoint['seconds']
+
+    def save_checkpoint(self):
+        if not self.checkpoint_path:
+            return
+        tmp_path = self.checkpoint_path.with_name(self.checkpoint_path.name + '.tmp')
+        tmp_path.write_text(json.dumps({'cursor': self.cursor, 'counts': self.counts, 'seconds': self.seconds}))
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def fetch(self, pokemon_id):
+        """Descarga un pokemon respetando el limite de llamadas.
+        Returns:
+            tuple: Datos de la pokeapi (None si responde 404) y mensaje de error (None si no falla).
+        Raises:
+            PokeApiUnavailable: Si el circuito esta abierto; interrumpe la sincronizacion.
+        """
+        self.rate_limiter.acquire()
+        try:
+            return PokemonApiService.fetch_pokemon_data(pokemon_id), None
+        except PokeApiUnavailable:
+            raise
+        except PokeApiError as e:
+            return None, str(e)
+
+    def fetch_batch(self, executor, pokemons):
+        return list(executor.map(self.fetch, [pokemon.pokemon_id for pokemon in pokemons]))
+
+    def sync_batch(self, executor, pokemons):
+        results = self.fetch_batch(executor, pokemons)
+        with transaction.atomic():
+            candidates = {}
+            for pokemon, (fetched, error) in zip(pokemons, results):
+                self.counts['processed'] += 1
+                if error is not None:
+                    self.add_error(pokemon.pokemon_id, error)
+                elif fetched is None:
+                    self.counts['missing'] += 1
+                elif not has_changed(PokemonApiService.pokemon_data(pokemon), fetched):
+                    self.counts['unchanged'] += 1
+                else:
+                    candidates[pokemon.pk] = fetched
+            if not candidates:
+                return
+            # Las filas se leyeron antes de las descargas, que con el limite de llamadas pueden
+            # tardar segundos: se vuelven a leer bloqueadas para comparar y escribir sobre los datos
+            # actuales y no deshacer un PATCH confirmado mientras tanto.
+            current = (
+                Pokemon.objects.with_details().select_for_update(of=('self',)).in_bulk(list(candidates))
+            )
+            for pk, fetched in candidates.items():
+                pokemon = current.get(pk)
+                # Un pokemon borrado mientras tanto ya no se sincroniza.
+                if pokemon is None or not has_changed(PokemonApiService.pokemon_data(pokemon), fetched):
+                    self.counts['unchanged'] += 1
+                else:
+                    self.update(pokemon, fetched)
+
+    def update(self, pokemon, fetched):
+        serializer = PokemonSerializer(pokemon, data=fetched)
+        if not serializer.is_valid():
+            self.add_error(pokemon.pokemon_id, serializer.errors)
+            return
+        try:
+            # save() abre un savepoint: un pokemon que falla no deshace el resto del bloque.
+            serializer.save()
+        except ValidationError as e:
+            self.add_error(pokemon.pokemon_id, e.detail)
+            return
+        except IntegrityError as e:
+            self.add_error(pokemon.pokemon_id, str(e))
+            return
+        self.counts['updated'] += 1
+
+    def add_error(self, pokemon_id, errors):
+        self.counts['errors'] += 1
+        self.errors.append({'pokemon_id': pokemon_id, 'errors': errors})
+
+    def run(self):
+        """Sincroniza los pokemons registrados desde el ultimo checkpoint.
+        Returns:
+            dict: Pokemons procesados, actualizados, sin cambios, que la pokeapi ya no conoce y con
+                error, segundos y pokemons por segundo, acumulados desde el inicio del recorrido.
+        """
+        self.load_checkpoint()
+        previous_seconds = self.seconds
+        start = time.perf_counter()
+        queryset = Pokemon.objects.with_details()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while True:
+                page, next_cursor = keyset_page(queryset, self.batch_size, self.cursor)
+                if page:
+                    self.sync_batch(executor, page)
+                    self.cursor = page[-1].pokemon_id
+                self.seconds = previous_seconds + time.perf_counter() - start
+                if next_cursor is None:
+                    break
+                self.save_checkpoint()
+                if self.progress:
+                    self.progress(self.report())
+        if self.checkpoint_path:
+            self.checkpoint_path.unlink(missing_ok=True)
+        return self.report()
+
+    def report(self):
+        seconds = round(self.seconds, 3)
+        return {
+            **self.counts,
+            'seconds': seconds,
+            'per_second': round(self.counts['processed'] / seconds, 2) if seconds else 0.0,
+        }
@@ -0,0 +1,100 @@
+import io
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+
+from .benchmarks import field_serializer_class
+from .models import Pokemon, Stat, Type
+from .test_views import create_pokemon, pokemon_payload
+
+
+def document(pokemon_id):
+    return bytes(Pokemon.objects.values_list('document', flat=True).get(pokemon_id=pokemon_id))
+
+
+def reference(pokemon_id):
+    # Respuesta construida desde la base de datos con la serializacion campo a campo de DRF.
+    pokemon = Pokemon.objects.with_details().get(pokemon_id=pokemon_id)
+    return JSONRenderer().render(field_serializer_class()(pokemon).data)
+
+
+@override_settings(POKEMON_RESPONSE_CACHE={'ENABLED': False})
+class DocumentTests(TestCase):
+
+    def test_writes_regenerate_the_document(self):
+        payload = {**pokemon_payload(1, 'bulbasaur'), 'types': ['poison', 'grass']}
+        self.client.post(reverse('add_pokemon'), payload, content_type='application/json')
+        self.assertEqual(document(1), reference(1))
+
+        self.client.patch(reverse('update_pokemon', args=[1]), {'weight': 79, 'types': ['fire']}, content_type='application/json')
+        self.assertEqual(document(1), reference(1))
+        self.assertEqual(self.client.get(reverse('pokemon_detail', args=[1])).json()['types'], ['fire'])
+
+
+    def test_bulk_import_creates_documents(self):
+        self.client.post(
+            reverse('bulk_add_pokemon'), [pokemon_payload(1, 'bulbasaur'), pokemon_payload(2, 'ivysaur')],
+            content_type='application/json',
+        )
+        self.assertEqual([document(1), document(2)], [reference(1), reference(2)])
+
+    def test_renaming_a_type_refreshes_the_documents_that_use_it(self):
+        create_pokemon(1, 'bulbasaur')
+        grass = Type.objects.get(name='grass')
+        grass.name = 'planta'
+        grass.save()
+        self.assertEqual(self.client.get(reverse('pokemon_detail', args=[1])).json()['types'], ['planta', 'poison'])
+
+        grass.delete()
+        self.assertFalse(Pokemon.objects.filter(document__isnull=False).exists())
+        self.assertEqual(self.client.get(reverse('pokemon_detail', args=[1])).json()['types'], ['poison'])
+
+    def test_writes_outside_the_serializer_forget_the_document(self):
+        pokemon = create_pokemon(1, 'bulbasaur')
+        pokemon.weight = 100
+        pokemon.save()
+        self.assertFalse(Pokemon.objects.filter(document__isnull=False).exists())
+
+        create_pokemon(2, 'ivysaur')
+        Pokemon.objects.get(pokemon_id=2).types.set([Type.objects.get(name='grass')])
+        self.assertFalse(Pokemon.objects.filter(document__isnull=False).exists())
+
+        create_pokemon(3, 'venusaur')
+        stat = Stat.objects.get(pokemon__pokemon_id=3)
+        stat.hp = 999
+        stat.save()
+        self.assertEqual(self.client.get(reverse('pokemon_detail', args=[3])).json()['base_stats']['hp'], 999)
+        stat.delete()
+        self.assertEqual(self.client.get(reverse('pokemon_detail', args=[3])).json()['base_stats'], {})
+
+    def test_missing_documents_are_rendered_without_being_stored(self):
+        create_pokemon(1, 'bulbasaur')
+        create_pokemon(2, 'ivysaur')
+        Pokemon.objects.filter(pokemon_id=2).update(document=None)
+
+        response = self.client.get(reverse('pokemon_list'))
+        self.assertEqual(response.content, b'[' + reference(1) + b',' + reference(2) + b']')
+        self.assertEqual(self.client.get(reverse('pokemon_detail', args=[2])).content, reference(2))
+        self.assertEqual(
+            self.client.get(reverse('pokemon_list'), {'limit': 1, 'cursor': 1}).content,
+            b'{"results":[' + reference(2) + b'],"next_cursor":null}',
+        )
+        self.assertEqual(Pokemon.objects.filter(document__isnull=False).count(), 1)
+
+    def test_other_formats_are_serialized(self):
+        create_pokemon(1, 'bulbasaur')
+        Pokemon.objects.update(document=b'{}')
+        response = self.client.get(reverse('pokemon_detail', args=[1]), HTTP_ACCEPT='application/json; indent=2')
+        self.assertEqual(response.json()['name'], 'bulbasaur')
+        self.assertEqual(self.client.get(reverse('pokemon_detail', args=[1])).json(), {})
+
+    def test_refresh_documents_command(self):
+        create_pokemon(1, 'bulbasaur')
+        create_pokemon(2, 'ivysaur')
+        Pokemon.objects.update(document=None)
+        out = io.StringIO()
+        call_command('refresh_documents', '--batch-size', '1', stdout=out)
+        self.assertIn('2 documents refreshed', out.getvalue())
+        self.assertEqual([document(1), document(2)], [reference(1), reference(2)])
@@ -0,0 +1,84 @@
+import re
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .metrics import Histogram, RequestMetrics, _current, registry, timed
+from .service import PokemonApiService
+from .test_views import create_pokemon
+
+
+def server_timing(response):
+    return dict(
+        (match.group(1), match.group(0))
+        for match in re.finditer(r'(\w+)(?:;desc="[^"]*")?;dur=[\d.]+', response['Server-Timing'])
+    )
+
+
+@override_settings(POKEMON_RESPONSE_CACHE={'ENABLED': False})
+class MetricsMiddlewareTests(TestCase):
+
+    def setUp(self):
+        registry.reset()
+        self.addCleanup(registry.reset)
+        create_pokemon(1, 'bulbasaur')
+
+    def test_server_timing_reports_queries_and_serialization(self):
+        with self.assertNumQueries(2) as queries:
+            response = self.client.get(reverse('pokemon_detail', args=[1]))
+        self.assertEqual(response.status_code, 200)
+        phases = server_timing(response)
+        self.assertEqual(set(phases), {'db', 'serialize', 'total'})
+        self.assertIn(f'desc="{len(queries.captured_queries)} queries"', phases['db'])
+
+    def test_metrics_endpoint_exposes_histograms_per_endpoint(self):
+        self.client.get(reverse('pokemon_detail', args=[1]))
+        self.client.get(reverse('pokemon_detail', args=[2]))
+        body = self.client.get(reverse('metrics')).content.decode()
+
+        self.assertIn('pokemon_requests_total{endpoint="pokemon_detail",method="GET",status="200"} 1', body)
+        self.assertIn('pokemon_requests_total{endpoint="pokemon_detail",method="GET",status="404"} 1', body)
+        self.assertIn('pokemon_request_duration_seconds_bucket{endpoint="pokemon_detail",le="+Inf"} 2', body)
+        self.assertIn('pokemon_request_db_queries_count{endpoint="pokemon_detail"} 2', body)
+        self.assertIn('# TYPE pokemon_request_serialize_duration_seconds histogram', body)
+
+    def test_streaming_response_is_observed_when_the_body_is_sent(self):
+        response = self.client.get(reverse('pokemon_list'), {'stream': 'ndjson'})
+        self.assertNotIn('pokemon_list', registry.render())
+
+        b''.join(response.streaming_content)
+        # Las consultas que se lanzan al generar el cuerpo tambien se cuentan.
+        self.assertIn('pokemon_request_db_queries_bucket{endpoint="pokemon_list",le="0.0"} 0', registry.render())
+        self.assertIn('pokemon_request_db_queries_count{endpoint="pokemon_list"} 1', registry.render())
+
+    def test_pokeapi_calls_are_timed(self):
+        with mock.patch.object(PokemonApiService, 'get_client') as get_client:
+            get_client.return_value.get.return_value.status_code = 404
+            response = self.client.get(reverse('find_pokemon_by_name_or_id', args=['missingno']))
+        self.assertIn('pokeapi', server_timing(response))
+
+    @override_settings(POKEMON_METRICS={'ENABLED': False})
+    def test_disabled_metrics_do_not_touch_responses(self):
+        response = self.client.get(reverse('pokemon_detail', args=[1]))
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.assertNotIn('pokemon_detail', registry.render())
+
+
+class MetricsTests(TestCase):
+
+    def test_histogram_buckets_are_inclusive_and_cumulative(self):
+        histogram = Histogram((1, 5))
+        for value in (0, 1, 2, 5, 6):
+            histogram.observe(value)
+        self.assertEqual(list(histogram.cumulative_counts()), [2, 4, 5])
+        self.assertEqual((histogram.sum, histogram.count), (14, 5))
+
+    def test_nested_phases_are_not_counted_twice(self):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        self.addCleanup(_current.reset, token)
+        with mock.patch('pokemon.metrics.perf_counter', side_effect=[0.0, 3.0]):
+            with timed('serialize'):
+                metrics.add('db', 2.0)
+        self.assertEqual(metrics.durations, {'db': 2.0, 'serialize': 1.0, 'pokeapi': 0.0})
@@ -0,0 +1,93 @@
+import io
+import json
+import tarfile
+import tempfile
+from pathlib import Path
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from .mirror import DumpIngestor
+from .models import Pokemon
+from .service import PokemonApiService
+from .test_service import BULBASAUR_RESPONSE
+
+
+def dump_entry(pokemon_id, name):
+    return {**BULBASAUR_RESPONSE, 'id': pokemon_id, 'name': name}
+
+
+class DumpIngestTests(TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        self.entries = {
+            'pokemon/1/index.json': dump_entry(1, 'bulbasaur'),
+            'pokemon/2/index.json': dump_entry(2, 'ivysaur'),
+            'pokemon/3/index.json': {'id': 3},
+            'pokemon/10/index.json': dump_entry(10, 'caterpie'),
+            'pokemon-species/1/index.json': {'id': 1, 'name': 'bulbasaur'},
+        }
+
+    def write_directory(self):
+        root = self.tmp / 'api' / 'v2'
+        for name, data in self.entries.items():
+            path = root / name
+            path.parent.mkdir(parents=True)
+            path.write_text(json.dumps(data))
+        return root
+
+    def write_tarball(self):
+        path = self.tmp / 'dump.tar.gz'
+        with tarfile.open(path, 'w:gz') as archive:
+            for name, data in self.entries.items():
+                content = json.dumps(data).encode()
+                info = tarfile.TarInfo(f'api-data/data/api/v2/{name}')
+                info.size = len(content)
+                archive.addfile(info, io.BytesIO(content))
+        return path
+
+    def test_ingest_directory_with_checkpoint(self):
+        source = self.write_directory()
+        checkpoint = self.tmp / 'ingest.checkpoint'
+
+        report = DumpIngestor(source, checkpoint_path=checkpoint, batch_size=2).run()
+
+        self.assertEqual((report['processed'], report['created'], report['errors']), (4, 3, 1))
+        self.assertEqual(json.loads(checkpoint.read_text())['last_entry'], 'pokemon/10/index.json')
+        caterpie = Pokemon.objects.with_details().get(pokemon_id=10)
+        self.assertEqual(sorted(t.name for t in caterpie.types.all()), ['grass', 'poison'])
+
+        resumed = DumpIngestor(source, checkpoint_path=checkpoint, batch_size=2).run()
+        self.assertEqual((resumed['processed'], resumed['created']), (4, 0))
+
+    def test_ingest_tarball_skips_registered_pokemons(self):
+        Pokemon.objects.create(pokemon_id=1, name='bulbasaur', height=7, weight=69, sprite_url='https://example.com/1.png')
+
+        report = DumpIngestor(self.write_tarball(), batch_size=10).run()
+
+        self.assertEqual((report['created'], report['skipped'], report['errors']), (2, 1, 1))
+        self.assertEqual(Pokemon.objects.count(), 3)
+
+    def test_command(self):
+        source = self.write_directory()
+        call_command('ingest_pokeapi_dump', str(source), stdout=io.StringIO(), stderr=io.StringIO())
+
+        self.assertTrue(Path(f'{source}.checkpoint').exists())
+        self.assertEqual(Pokemon.objects.count(), 3)
+
+    @override_settings(POKEAPI={'LOCAL_MIRROR': True, 'BASE_URL': 'http://127.0.0.1:9', 'MAX_RETRIES': 0})
+    def test_lookups_are_answered_by_the_local_mirror(self):
+        PokemonApiService.reset()
+        self.addCleanup(PokemonApiService.reset)
+        DumpIngestor(self.write_directory()).run()
+
+        with self.assertNumQueries(3):
+            self.assertEqual(PokemonApiService.get_pokemon_data('Ivysaur')['pokemon_id'], 2)
+        self.assertEqual(PokemonApiService.get_pokemon_data('10')['name'], 'caterpie')
+        bulbasaur = PokemonApiService.get_pokemon_data('1')
+        self.assertEqual(bulbasaur['base_stats'], PokemonApiService.parse_pokemon_data(dump_entry(1, 'bulbasaur'))['base_stats'])
+        self.assertEqual(sorted(bulbasaur['abilities']), ['chlorophyll', 'overgrow'])
+        self.assertIsNone(PokemonApiService.get_local_pokemon_data('²'))
@@ -1,9 +1,16 @@
+import io
+import random
+from unittest import mock
+
+from django.core.management import call_command
 from django.test import TestCase
 
+from . import service
 from .models import Pokemon
 from .models import Type
 from .models import Ability
-from .service import ScoreService
+from .models import Stat
+from .service import STAT_FIELDS, ScoreService
 
 class ModelTests(TestCase):
 
@@ -100,4 +107,51 @@ class ModelTests(TestCase):
             }
         }
        
-        self.assertEqual(ScoreService.calculate_score(pokemon)["pokemon_score"],253.6)
\ No newline at end of file
+        self.assertEqual(ScoreService.calculate_score(pokemon)["pokemon_score"],253.6)
+
+class ScoreBatchTests(TestCase):
+
+    def random_columns(self, count):
+        rng = random.Random(count)
+        return (
+            [[rng.randint(0, 255) for _ in STAT_FIELDS] for _ in range(count)],
+            [rng.randint(0, 3) for _ in range(count)],
+            [rng.randint(0, 4) for _ in range(count)],
+            [rng.randint(0, 300) for _ in range(count)],
+            [rng.randint(0, 10000) for _ in range(count)],
+        )
+
+    def scalar_scores(self, stats, type_counts, ability_counts, heights, weights):
+        return [
+            ScoreService.calculate_score({
+                'types': ['type'] * types,
+                'abilities': ['ability'] * abilities,
+                'base_stats': dict(zip(STAT_FIELDS, row)),
+                'height': height,
+                'weight': weight,
+            })['pokemon_score']
+            for row, types, abilities, height, weight in zip(stats, type_counts, ability_counts, heights, weights)
+        ]
+
+    def test_batch_matches_scalar_scores(self):
+        columns = self.random_columns(20000)
+        expected = self.scalar_scores(*columns)
+        self.assertEqual(list(ScoreService.calculate_scores(*columns)), expected)
+        with mock.patch.object(service, 'numpy', None):
+            self.assertEqual(list(ScoreService.calculate_scores(*columns)), expected)
+
+    def test_batch_rounds_ties_like_round(self):
+        # Con estos pesos muchos puntajes terminan en ...5 en la tercera cifra decimal.
+        columns = self.random_columns(20000)
+        with mock.patch.object(ScoreService, 'PESO_ESTADISTICAS', 0.125), mock.patch.object(ScoreService, 'PESO_OTROS', 0.005):
+            self.assertEqual(list(ScoreService.calculate_scores(*columns)), self.scalar_scores(*columns))
+
+    def test_rescore_command_updates_stored_scores(self):
+        pokemon = Pokemon.objects.create(pokemon_id=6, name='charizard', height=17, weight=905, sprite_url='https://example.com/6.png')
+        pokemon.types.set([Type.objects.create(name='fire'), Type.objects.create(name='flying')])
+        pokemon.abilities.set([Ability.objects.create(name='blaze')])
+        Stat.objects.create(pokemon=pokemon, hp=78, attack=84, defense=78, special_attack=109, special_defense=85, speed=100)
+        Pokemon.objects.create(pokemon_id=7, name='squirtle', height=5, weight=90, sprite_url='https://example.com/7.png')
+
+        call_command('rescore_pokemons', stdout=io.StringIO())
+        self.assertEqual(dict(Pokemon.objects.values_list('name', 'score')), {'charizard': 253.4, 'squirtle': 9.5})
@@ -0,0 +1,86 @@
+import io
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .profiling import ProfilingMiddleware, StackSampler, list_profiles, make_token
+from .test_views import create_pokemon
+
+
+@override_settings(POKEMON_RESPONSE_CACHE={'ENABLED': False})
+class ProfilingMiddlewareTests(TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = Path(tmp.name)
+        create_pokemon(1, 'bulbasaur')
+
+    def profiling(self, **config):
+        return override_settings(POKEMON_PROFILING={'ENABLED': True, 'DIRECTORY': self.directory, **config})
+
+    def test_signed_header_profiles_the_view(self):
+        with self.profiling():
+            self.client.get(reverse('pokemon_detail', args=[1]), HTTP_X_POKEMON_PROFILE='profile:forged')
+            self.assertEqual(list_profiles(self.directory), [])
+            response = self.client.get(reverse('pokemon_detail', args=[1]), HTTP_X_POKEMON_PROFILE=make_token())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'bulbasaur')
+        [profile] = list_profiles(self.directory)
+        self.assertEqual(
+            (profile.endpoint, profile.method, profile.status, profile.trigger, profile.format),
+            ('pokemon_detail', 'GET', 200, 'header', 'pstats'),
+        )
+
+        output = io.StringIO()
+        with self.profiling():
+            call_command('profiles', '--summary', stdout=output)
+        # La vista perfilada siempre aparece; la serializacion ya no pesa lo bastante para salir en el resumen.
+        self.assertIn('(get_pokemon)', output.getvalue())
+
+    def test_sampled_profiles_are_kept_in_a_ring(self):
+        with self.profiling(SAMPLE_RATE=1, MAX_PROFILES=2):
+            for pokemon_id in (1, 2, 3):
+                self.client.get(reverse('pokemon_detail', args=[pokemon_id]))
+
+        profiles = list_profiles(self.directory)
+        self.assertEqual([(profile.status, profile.trigger) for profile in profiles], [(404, 'sampled')] * 2)
+
+        output = io.StringIO()
+        with self.profiling():
+            call_command('profiles', '--endpoint', 'pokemon_detail', stdout=output)
+        self.assertIn('2 profiles', output.getvalue())
+
+    def test_profiles_that_cannot_be_saved_do_not_fail_the_request(self):
+        not_a_directory = self.directory / 'file'
+        not_a_directory.write_text('')
+        with override_settings(POKEMON_PROFILING={'ENABLED': True, 'DIRECTORY': not_a_directory, 'SAMPLE_RATE': 1}):
+            with self.assertLogs('pokemon.profiling', 'ERROR'):
+                response = self.client.get(reverse('pokemon_detail', args=[1]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_disabled_profiling_removes_the_middleware(self):
+        with override_settings(POKEMON_PROFILING={'ENABLED': False}):
+            with self.assertRaises(MiddlewareNotUsed):
+                ProfilingMiddleware(lambda request: None)
+
+
+class StackSamplerTests(TestCase):
+
+    def test_samples_are_written_as_collapsed_stacks(self):
+        with StackSampler(0.001) as sampler:
+            time.sleep(0.05)
+        with tempfile.NamedTemporaryFile('r') as output:
+            sampler.write(output.name)
+            lines = output.read().splitlines()
+
+        self.assertTrue(lines)
+        stack, _, count = lines[0].rpartition(' ')
+        self.assertTrue(count.isdigit())
+        self.assertIn('test_samples_are_written_as_collapsed_stacks', stack.split(';')[-1])
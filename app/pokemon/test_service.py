@@ -0,0 +1,346 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from .cache import LRUCache, ReadThroughCache
+from .client import PokeApiClient, PokeApiError, PokeApiUnavailable
+from .service import PokemonApiService
+
+BULBASAUR_RESPONSE = {
+    'id': 1,
+    'name': 'bulbasaur',
+    'height': 7,
+    'weight': 69,
+    'sprites': {'front_default': 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/1.png'},
+    'stats': [{'base_stat': value} for value in (45, 49, 49, 65, 65, 45)],
+    'types': [{'type': {'name': 'grass'}}, {'type': {'name': 'poison'}}],
+    'abilities': [{'ability': {'name': 'overgrow'}}, {'ability': {'name': 'chlorophyll'}}],
+}
+
+
+class ReadThroughCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.loader = mock.Mock(side_effect=lambda key: None if key == 'missingno' else {'name': key})
+
+    def test_hits_and_misses(self):
+        read_through = ReadThroughCache(self.loader, prefix='test')
+
+        self.assertEqual(read_through.get('pikachu'), {'name': 'pikachu'})
+        self.assertEqual(read_through.get('pikachu'), {'name': 'pikachu'})
+
+        self.assertEqual(self.loader.call_count, 1)
+        stats = read_through.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['hit_ratio'], 0.5)
+
+    def test_shared_level_survives_local_eviction(self):
+        read_through = ReadThroughCache(self.loader, prefix='test', max_entries=1)
+        read_through.get('pikachu')
+        read_through.get('raichu')
+
+        self.assertEqual(len(read_through.local), 1)
+        self.assertEqual(read_through.get('pikachu'), {'name': 'pikachu'})
+        self.assertEqual(self.loader.call_count, 2)
+
+    def test_not_found_is_cached(self):
+        read_through = ReadThroughCache(self.loader, prefix='test', negative_ttl=60)
+
+        self.assertIsNone(read_through.get('missingno'))
+        self.assertIsNone(read_through.get('missingno'))
+        self.assertEqual(self.loader.call_count, 1)
+        self.assertEqual(read_through.stats()['negative_hits'], 1)
+
+    def test_stale_value_is_served_while_refreshing(self):
+        read_through = ReadThroughCache(self.loader, prefix='test', ttl=0, stale_ttl=60)
+        read_through.get('pikachu')
+        self.loader.side_effect = lambda key: {'name': key, 'refreshed': True}
+
+        self.assertEqual(read_through.get('pikachu'), {'name': 'pikachu'})
+        for _ in range(100):
+            if read_through.stats()['refreshes']:
+                break
+            time.sleep(0.01)
+        self.assertEqual(read_through.local.get('pikachu').value, {'name': 'pikachu', 'refreshed': True})
+        self.assertEqual(read_through.stats()['stale_hits'], 1)
+
+    def test_loader_errors_are_not_cached(self):
+        self.loader.side_effect = ConnectionError
+        read_through = ReadThroughCache(self.loader, prefix='test')
+
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                read_through.get('pikachu')
+        self.assertEqual(read_through.stats()['load_errors'], 2)
+
+    def run_concurrently(self, func, count=10):
+        barrier = threading.Barrier(count)
+        results = [None] * count
+
+        def worker(index):
+            barrier.wait()
+            try:
+                results[index] = func()
+            except Exception as e:
+                results[index] = e
+
+        threads = [threading.Thread(target=worker, args=(index,)) for index in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_misses_are_coalesced(self):
+        def slow_loader(key):
+            time.sleep(0.1)
+            return {'name': key}
+        self.loader.side_effect = slow_loader
+        read_through = ReadThroughCache(self.loader, prefix='test')
+
+        results = self.run_concurrently(lambda: read_through.get('pikachu'))
+
+        self.assertEqual(results, [{'name': 'pikachu'}] * 10)
+        self.assertEqual(self.loader.call_count, 1)
+        self.assertEqual(read_through.stats()['coalesced'], 9)
+
+    def test_coalesced_callers_share_the_error(self):
+        def failing_loader(key):
+            time.sleep(0.1)
+            raise ConnectionError(key)
+        self.loader.side_effect = failing_loader
+        read_through = ReadThroughCache(self.loader, prefix='test')
+
+        results = self.run_concurrently(lambda: read_through.get('pikachu'))
+
+        self.assertTrue(all(isinstance(result, ConnectionError) for result in results))
+        self.assertEqual(self.loader.call_count, 1)
+
+    def test_waits_for_another_process_holding_the_lock(self):
+        read_through = ReadThroughCache(self.loader, prefix='test', distributed_lock=True, lock_poll_interval=0.01)
+        other_process = ReadThroughCache(mock.Mock(return_value={'name': 'pikachu', 'other': True}), prefix='test')
+        cache.add('test:pikachu:lock', 1)
+
+        def publish():
+            time.sleep(0.05)
+            other_process.get('pikachu')
+            cache.delete('test:pikachu:lock')
+        threading.Thread(target=publish).start()
+
+        self.assertEqual(read_through.get('pikachu'), {'name': 'pikachu', 'other': True})
+        self.assertEqual(self.loader.call_count, 0)
+        self.assertEqual(read_through.stats()['coalesced_remote'], 1)
+
+    def test_expired_lock_taken_by_another_process_is_not_released(self):
+        def slow_loader(key):
+            # El lock caduca durante la carga y otro proceso lo toma.
+            time.sleep(0.15)
+            cache.add('test:pikachu:lock', 'other')
+            return {'name': key}
+        read_through = ReadThroughCache(slow_loader, prefix='test', distributed_lock=True, lock_timeout=0.1)
+
+        self.assertEqual(read_through.get('pikachu'), {'name': 'pikachu'})
+        self.assertEqual(cache.get('test:pikachu:lock'), 'other')
+
+    def test_lru_evicts_least_recently_used(self):
+        lru = LRUCache(max_entries=2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+
+        self.assertEqual(lru.get('a'), 1)
+        self.assertIsNone(lru.get('b'))
+
+
+class PokeApiStub:
+    """Servidor HTTP local que imita /pokemon/<nombre o id> de la pokeapi para los tests."""
+
+    def __init__(self, pokemons=None):
+        self.pokemons = pokemons if pokemons is not None else {'bulbasaur': BULBASAUR_RESPONSE, '1': BULBASAUR_RESPONSE}
+        self.queued_statuses = []
+        self.delay = 0
+        self.paths = []
+        self.connections = set()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                stub.paths.append(self.path)
+                stub.connections.add(self.client_address)
+                if stub.delay:
+                    time.sleep(stub.delay)
+                name = self.path.rstrip('/').rsplit('/', 1)[-1]
+                if stub.queued_statuses:
+                    self.respond(stub.queued_statuses.pop(0), {'detail': 'error'})
+                elif name in stub.pokemons:
+                    self.respond(200, stub.pokemons[name])
+                else:
+                    self.respond(404, {'detail': 'Not found.'})
+
+            def respond(self, status_code, body):
+                content = json.dumps(body).encode()
+                try:
+                    self.send_response(status_code)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(content)))
+                    self.end_headers()
+                    self.wfile.write(content)
+                except (BrokenPipeError, ConnectionResetError):
+                    # El cliente ya cerro la conexion, por ejemplo tras un timeout.
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_port}'
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class PokeApiClientTests(SimpleTestCase):
+
+    def setUp(self):
+        self.stub = PokeApiStub()
+        self.addCleanup(self.stub.stop)
+
+    def make_client(self, **kwargs):
+        client = PokeApiClient(self.stub.url, backoff_base=0, **kwargs)
+        self.addCleanup(client.close)
+        return client
+
+    def test_connections_are_reused(self):
+        client = self.make_client()
+        for _ in range(3):
+            self.assertEqual(client.get('/pokemon/bulbasaur').status_code, 200)
+
+        self.assertEqual(len(self.stub.paths), 3)
+        self.assertEqual(len(self.stub.connections), 1)
+
+    def test_transient_errors_are_retried(self):
+        self.stub.queued_statuses = [503, 502]
+        response = self.make_client(max_retries=2).get('/pokemon/bulbasaur')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.stub.paths), 3)
+
+    def test_read_timeout(self):
+        self.stub.delay = 0.5
+        with self.assertRaises(PokeApiError):
+            self.make_client(read_timeout=0.05, max_retries=0).get('/pokemon/bulbasaur')
+
+    def test_circuit_opens_after_repeated_failures(self):
+        self.stub.queued_statuses = [500] * 10
+        client = self.make_client(max_retries=0, failure_threshold=2, reset_timeout=60)
+
+        for _ in range(2):
+            with self.assertRaises(PokeApiError):
+                client.get('/pokemon/bulbasaur')
+        with self.assertRaises(PokeApiUnavailable):
+            client.get('/pokemon/bulbasaur')
+        self.assertEqual(len(self.stub.paths), 2)
+        self.assertEqual(client.breaker.state, 'open')
+
+    def test_circuit_closes_after_successful_probe(self):
+        self.stub.queued_statuses = [500]
+        client = self.make_client(max_retries=0, failure_threshold=1, reset_timeout=0)
+
+        with self.assertRaises(PokeApiError):
+            client.get('/pokemon/bulbasaur')
+        self.assertEqual(client.get('/pokemon/bulbasaur').status_code, 200)
+        self.assertEqual(client.breaker.state, 'closed')
+
+    def test_probe_that_raises_unexpectedly_allows_another_probe(self):
+        self.stub.queued_statuses = [500]
+        client = self.make_client(max_retries=0, failure_threshold=1, reset_timeout=0)
+        with self.assertRaises(PokeApiError):
+            client.get('/pokemon/bulbasaur')
+
+        with mock.patch.object(client.session, 'get', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                client.get('/pokemon/bulbasaur')
+        self.assertEqual(client.get('/pokemon/bulbasaur').status_code, 200)
+        self.assertEqual(client.breaker.state, 'closed')
+
+
+class PokemonApiServiceTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.stub = PokeApiStub()
+        self.addCleanup(self.stub.stop)
+        settings_override = override_settings(POKEAPI={'BASE_URL': self.stub.url, 'BACKOFF_BASE': 0})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        PokemonApiService.reset()
+        self.addCleanup(PokemonApiService.reset)
+
+    def test_get_pokemon_data_is_cached_by_normalized_name(self):
+        first = PokemonApiService.get_pokemon_data('Bulbasaur')
+        second = PokemonApiService.get_pokemon_data(' bulbasaur ')
+
+        self.assertEqual(first, second)
+        self.assertEqual(first['base_stats']['special_attack'], 65)
+        self.assertEqual(self.stub.paths, ['/pokemon/bulbasaur'])
+        self.assertEqual(PokemonApiService.cache_stats()['hits'], 1)
+
+    def test_not_found_returns_none(self):
+        self.assertIsNone(PokemonApiService.get_pokemon_data('missingno'))
+        self.assertIsNone(PokemonApiService.get_pokemon_data('missingno'))
+        self.assertEqual(len(self.stub.paths), 1)
+
+    def test_non_ascii_digits_are_looked_up_as_names(self):
+        self.assertEqual(PokemonApiService.normalize_name_or_id(' 025 '), '25')
+        self.assertEqual(PokemonApiService.normalize_name_or_id('²'), '²')
+        response = self.client.get(reverse('find_pokemon_by_name_or_id', args=['²']))
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.stub.paths, ['/pokemon/%C2%B2'])
+
+    def test_find_view_reports_upstream_errors(self):
+        self.stub.queued_statuses = [500] * 10
+        response = self.client.get(reverse('find_pokemon_by_name_or_id', args=['pikachu']))
+
+        self.assertEqual(response.status_code, 502)
+
+    def test_batch_lookups_run_concurrently(self):
+        self.stub.pokemons.update({name: {**BULBASAUR_RESPONSE, 'name': name} for name in ('ivysaur', 'venusaur')})
+        self.stub.delay = 0.2
+        start = time.perf_counter()
+        response = self.client.get(reverse('find_pokemon_batch'), {'names': 'bulbasaur,ivysaur,venusaur,missingno,Bulbasaur'})
+        elapsed = time.perf_counter() - start
+
+        results = response.json()
+        self.assertEqual([result['status'] for result in results], [200, 200, 200, 404, 200])
+        self.assertEqual([result['query'] for result in results], ['bulbasaur', 'ivysaur', 'venusaur', 'missingno', 'Bulbasaur'])
+        self.assertEqual(results[1]['data']['name'], 'ivysaur')
+        self.assertEqual(len(self.stub.paths), 4)
+        self.assertLess(elapsed, 0.6)
+
+    def test_malformed_bodies_are_upstream_errors(self):
+        self.stub.pokemons.update({'ivysaur': {'name': 'ivysaur'}, 'venusaur': {**BULBASAUR_RESPONSE, 'stats': []}})
+        response = self.client.get(reverse('find_pokemon_batch'), {'names': 'bulbasaur,ivysaur,venusaur'})
+        self.assertEqual([result['status'] for result in response.json()], [200, 502, 502])
+        self.assertEqual(self.client.get(reverse('find_pokemon_by_name_or_id', args=['ivysaur'])).status_code, 502)
+
+    def test_batch_requires_names(self):
+        response = self.client.get(reverse('find_pokemon_batch'))
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,128 @@
+import io
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from .client import PokeApiUnavailable, RateLimiter
+from .models import Pokemon
+from .service import PokemonApiService
+from .sync import PokemonSynchronizer
+from .test_service import BULBASAUR_RESPONSE, PokeApiStub
+from .test_documents import document, reference
+from .test_views import create_pokemon
+
+IVYSAUR_RESPONSE = {
+    **BULBASAUR_RESPONSE,
+    'id': 2,
+    'name': 'ivysaur',
+    'weight': 130,
+    'sprites': {'front_default': 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/2.png'},
+    'types': [{'type': {'name': 'grass'}}],
+}
+
+
+class PokemonSynchronizerTests(TestCase):
+
+    def setUp(self):
+        self.stub = PokeApiStub({'1': BULBASAUR_RESPONSE, '2': IVYSAUR_RESPONSE})
+        self.addCleanup(self.stub.stop)
+        settings_override = override_settings(
+            POKEAPI={'BASE_URL': self.stub.url, 'BACKOFF_BASE': 0, 'MAX_RETRIES': 0, 'SYNC_RATE_LIMIT': 0},
+            POKEMON_RESPONSE_CACHE={'ENABLED': False},
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        PokemonApiService.reset()
+        self.addCleanup(PokemonApiService.reset)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.checkpoint = Path(tmp.name) / 'sync.checkpoint'
+
+        create_pokemon(1, 'bulbasaur')
+        create_pokemon(2, 'ivysaur')
+        create_pokemon(3, 'venusaur')
+
+    def test_only_changed_pokemons_are_written(self):
+        updated_at = Pokemon.objects.get(pokemon_id=1).updated_at
+        report = PokemonSynchronizer(batch_size=2).run()
+
+        self.assertEqual(
+            {key: report[key] for key in ('processed', 'updated', 'unchanged', 'missing', 'errors')},
+            {'processed': 3, 'updated': 1, 'unchanged': 1, 'missing': 1, 'errors': 0},
+        )
+        self.assertEqual(sorted(self.stub.paths), ['/pokemon/1', '/pokemon/2', '/pokemon/3'])
+        self.assertEqual(Pokemon.objects.get(pokemon_id=1).updated_at, updated_at)
+        ivysaur = self.client.get(reverse('pokemon_detail', args=[2])).json()
+        self.assertEqual((ivysaur['weight'], ivysaur['types']), (130, ['grass']))
+
+    def test_writes_during_the_fetch_are_not_undone(self):
+        client = self.client
+
+        class PatchingSynchronizer(PokemonSynchronizer):
+            def fetch_batch(self, executor, pokemons):
+                results = super().fetch_batch(executor, pokemons)
+                # PATCH confirmado mientras se descargaba el bloque.
+                client.patch(reverse('update_pokemon', args=[1]), {'weight': 999}, content_type='application/json')
+                client.patch(reverse('update_pokemon', args=[2]), {'types': ['fire']}, content_type='application/json')
+                return results
+
+        report = PatchingSynchronizer(batch_size=3).run()
+        self.assertEqual((report['updated'], report['unchanged']), (1, 1))
+        bulbasaur = self.client.get(reverse('pokemon_detail', args=[1])).json()
+        ivysaur = self.client.get(reverse('pokemon_detail', args=[2])).json()
+        self.assertEqual((bulbasaur['weight'], ivysaur['types']), (999, ['grass']))
+        self.assertEqual(document(2), reference(2))
+
+    def test_malformed_payloads_are_counted_as_errors(self):
+        self.stub.pokemons['1'] = {'id': 1, 'name': 'bulbasaur'}
+        report = PokemonSynchronizer(batch_size=1).run()
+        self.assertEqual((report['processed'], report['errors'], report['updated']), (3, 1, 1))
+
+    def test_interrupted_sync_resumes_from_the_checkpoint(self):
+        with self.settings(POKEAPI={'BASE_URL': self.stub.url, 'MAX_RETRIES': 0, 'CIRCUIT_FAILURE_THRESHOLD': 1}):
+            PokemonApiService.reset()
+
+            def fail_after_first_batch(report):
+                if report['processed'] == 1:
+                    self.stub.queued_statuses = [500]
+
+            synchronizer = PokemonSynchronizer(checkpoint_path=self.checkpoint, batch_size=1, progress=fail_after_first_batch)
+            # El 500 del pokemon 2 cuenta como error y abre el circuito, que interrumpe el pokemon 3.
+            with self.assertRaises(PokeApiUnavailable):
+                synchronizer.run()
+        self.assertEqual(json.loads(self.checkpoint.read_text())['cursor'], 2)
+
+        PokemonApiService.reset()
+        self.stub.paths.clear()
+        report = PokemonSynchronizer(checkpoint_path=self.checkpoint, batch_size=1).run()
+        self.assertEqual(self.stub.paths, ['/pokemon/3'])
+        self.assertEqual((report['processed'], report['errors'], report['missing']), (3, 1, 1))
+        self.assertFalse(self.checkpoint.exists())
+
+    def test_command_reports_throughput_and_errors(self):
+        out = io.StringIO()
+        call_command('sync_pokemon', '--checkpoint', str(self.checkpoint), '--batch-size', '1', stdout=out)
+        self.assertIn('processed=2 updated=1 unchanged=1 missing=0 errors=0', out.getvalue())
+        self.assertIn('pokemons/s): 1 updated, 1 unchanged, 1 missing, 0 errors.', out.getvalue())
+
+
+class RateLimiterTests(SimpleTestCase):
+
+    def test_calls_are_spaced(self):
+        limiter = RateLimiter(rate=50)
+        start = time.monotonic()
+        for _ in range(6):
+            limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+
+    def test_zero_rate_does_not_wait(self):
+        limiter = RateLimiter(rate=0)
+        start = time.monotonic()
+        for _ in range(100):
+            limiter.acquire()
+        self.assertLess(time.monotonic() - start, 0.05)
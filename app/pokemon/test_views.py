@@ -0,0 +1,704 @@
+import json
+import subprocess
+import sys
+
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+
+from .models import Pokemon
+from .models import Type
+from .models import Ability
+from .models import Stat
+from .benchmarks import field_serializer_class
+from .documents import refresh_documents
+from .filters import filter_pokemons
+from .renderers import ORJSONRenderer, msgpack
+from .response_cache import check_version_cache, get_version_cache, response_cache_stats
+from .serializers import PokemonSerializer
+from .search import VERSION_KEY, bump_version, edit_distance, get_version, publish_changes
+from .service import ScoreService
+from .vocabulary import clear_vocabularies, type_ids, warm_vocabularies
+
+
+def create_pokemon(pokemon_id, name, types=('grass', 'poison'), abilities=('overgrow', 'chlorophyll')):
+    pokemon = Pokemon.objects.create(
+        pokemon_id=pokemon_id,
+        name=name,
+        height=7,
+        weight=69,
+        sprite_url=f'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/{pokemon_id}.png'
+    )
+    pokemon.types.set([Type.objects.get_or_create(name=type_name)[0] for type_name in types])
+    pokemon.abilities.set([Ability.objects.get_or_create(name=ability_name)[0] for ability_name in abilities])
+    Stat.objects.create(pokemon=pokemon, hp=45, attack=49, defense=49, special_attack=65, special_defense=65, speed=45)
+    ScoreService.refresh_scores(Pokemon.objects.filter(pk=pokemon.pk))
+    refresh_documents(Pokemon.objects.filter(pk=pokemon.pk))
+    return pokemon
+
+
+def run_in_another_process(code):
+    """Ejecuta codigo en otro proceso con la misma configuracion, como lo haria otro worker."""
+    subprocess.run([sys.executable, 'manage.py', 'shell', '-c', code], cwd=settings.BASE_DIR, check=True)
+
+
+class ReadQueryCountTests(TestCase):
+    # Validador del GET condicional y lectura de los documentos guardados.
+
+    def test_list_pokemon_query_count_is_constant(self):
+        create_pokemon(1, 'bulbasaur')
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('pokemon_list'))
+        self.assertEqual(len(response.json()), 1)
+
+        for pokemon_id in range(2, 12):
+            create_pokemon(pokemon_id, f'pokemon-{pokemon_id}')
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('pokemon_list'))
+        self.assertEqual(len(response.json()), 11)
+
+    def test_list_pokemon_representation(self):
+        create_pokemon(1, 'bulbasaur')
+        data = self.client.get(reverse('pokemon_list')).json()[0]
+
+        self.assertEqual(data['name'], 'bulbasaur')
+        self.assertEqual(sorted(data['types']), ['grass', 'poison'])
+        self.assertEqual(sorted(data['abilities']), ['chlorophyll', 'overgrow'])
+        self.assertEqual(data['base_stats']['special_attack'], 65)
+
+    def test_get_pokemon_query_count(self):
+        create_pokemon(1, 'bulbasaur')
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('pokemon_detail', args=[1]))
+        self.assertEqual(response.json()['name'], 'bulbasaur')
+
+    def test_pokemon_score_query_count(self):
+        create_pokemon(1, 'bulbasaur')
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('cal_pokemon_score', args=[1]))
+        self.assertEqual(response.json(), {'pokemon_score': 104.2})
+
+
+@override_settings(POKEMON_RESPONSE_CACHE={'ENABLED': False})
+class FieldsetTests(TestCase):
+    # Validador del GET condicional mas las consultas de los campos pedidos.
+
+    def setUp(self):
+        create_pokemon(1, 'bulbasaur')
+        create_pokemon(2, 'ivysaur')
+
+    def test_fields_prune_columns_and_relations(self):
+        with self.assertNumQueries(2) as queries:
+            response = self.client.get(reverse('pokemon_list'), {'fields': 'pokemon_id,name'})
+        self.assertEqual(response.json()[0], {'name': 'bulbasaur', 'pokemon_id': 1})
+        self.assertNotIn('"height"', queries.captured_queries[-1]['sql'])
+
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('pokemon_list'), {'fields': 'name,types', 'limit': 1})
+        self.assertEqual(response.json(), {'results': [{'name': 'bulbasaur', 'types': ['grass', 'poison']}], 'next_cursor': 1})
+
+    def test_exclude_skips_the_relations_it_removes(self):
+        # Sin tipos ni habilidades los pokemons y sus estadisticas salen de una sola consulta.
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('pokemon_list'), {'exclude': 'types,abilities,id'})
+        self.assertEqual(
+            list(response.json()[0]),
+            ['name', 'height', 'weight', 'pokemon_id', 'updated_at', 'sprite_url', 'base_stats'],
+        )
+        self.assertEqual(response.json()[1]['base_stats']['hp'], 45)
+
+    def test_detail_and_stream_accept_fields(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('pokemon_detail', args=[2]), {'fields': 'name,base_stats'})
+        self.assertEqual(response.json(), {'name': 'ivysaur', 'base_stats': {
+            'hp': 45, 'attack': 49, 'defense': 49, 'special_attack': 65, 'special_defense': 65, 'speed': 45,
+        }})
+
+        response = self.client.get(reverse('pokemon_list'), {'stream': 'ndjson', 'fields': 'name'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [{'name': 'bulbasaur'}, {'name': 'ivysaur'}])
+
+    def test_unknown_or_empty_fieldsets_are_rejected(self):
+        response = self.client.get(reverse('pokemon_list'), {'fields': 'name,color'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("'color'", response.json()['detail'])
+        response = self.client.get(reverse('pokemon_detail', args=[1]), {'fields': 'name', 'exclude': 'name'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ListPaginationTests(TestCase):
+
+    def setUp(self):
+        for pokemon_id in range(1, 6):
+            create_pokemon(pokemon_id, f'pokemon-{pokemon_id}')
+
+    def test_keyset_pagination_walks_the_catalog(self):
+        response = self.client.get(reverse('pokemon_list'), {'limit': 2})
+        body = response.json()
+        self.assertEqual([p['pokemon_id'] for p in body['results']], [1, 2])
+        self.assertEqual(body['next_cursor'], 2)
+
+        body = self.client.get(reverse('pokemon_list'), {'limit': 2, 'cursor': 4}).json()
+        self.assertEqual([p['pokemon_id'] for p in body['results']], [5])
+        self.assertIsNone(body['next_cursor'])
+
+    def test_invalid_limit(self):
+        response = self.client.get(reverse('pokemon_list'), {'limit': 0})
+        self.assertEqual(response.status_code, 400)
+
+    def test_ndjson_stream_runs_in_chunks(self):
+        with self.settings(POKEMON_STREAM_CHUNK_SIZE=2):
+            response = self.client.get(reverse('pokemon_list'), {'stream': 'ndjson'})
+            self.assertTrue(response.streaming)
+            self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+            # 3 bloques de una consulta cada uno, que lee los documentos guardados.
+            with self.assertNumQueries(3):
+                lines = b''.join(response.streaming_content).decode().splitlines()
+
+        self.assertEqual([json.loads(line)['pokemon_id'] for line in lines], [1, 2, 3, 4, 5])
+
+
+class FilterTests(TestCase):
+
+    def setUp(self):
+        # Las estimaciones de los filtros se guardan en la cache.
+        cache.clear()
+        create_pokemon(1, 'bulbasaur')
+        create_pokemon(4, 'charmander', types=('fire',), abilities=('blaze',))
+        create_pokemon(6, 'charizard', types=('fire', 'flying'), abilities=('blaze', 'solar-power'))
+        Stat.objects.filter(pokemon__pokemon_id=6).update(speed=100, attack=84)
+        Pokemon.objects.filter(pokemon_id=6).update(weight=905)
+
+    def get_ids(self, **params):
+        response = self.client.get(reverse('pokemon_list'), params)
+        self.assertEqual(response.status_code, 200, response.content)
+        body = response.json()
+        return [p['pokemon_id'] for p in (body['results'] if 'results' in body else body)]
+
+    def test_types_and_abilities(self):
+        self.assertEqual(self.get_ids(types='fire'), [4, 6])
+        self.assertEqual(self.get_ids(types='poison,flying'), [1, 6])
+        self.assertEqual(self.get_ids(types='fire,flying', types_match='all'), [6])
+        self.assertEqual(self.get_ids(types='grass,fire', types_match='all'), [])
+        self.assertEqual(self.get_ids(abilities='blaze', types='fire'), [4, 6])
+        self.assertEqual(self.get_ids(types='water'), [])
+
+    def test_ranges_and_combined_filters(self):
+        self.assertEqual(self.get_ids(min_speed=46), [6])
+        self.assertEqual(self.get_ids(max_attack=49), [1, 4])
+        self.assertEqual(self.get_ids(min_weight=100, max_weight=905), [6])
+        self.assertEqual(self.get_ids(types='fire', max_speed=45), [4])
+
+    def test_ordering(self):
+        self.assertEqual(self.get_ids(ordering='-weight'), [6, 1, 4])
+        self.assertEqual(self.get_ids(ordering='-speed', types='fire'), [6, 4])
+
+    def test_filters_with_keyset_pagination(self):
+        body = self.client.get(reverse('pokemon_list'), {'types': 'fire', 'limit': 1}).json()
+        self.assertEqual([p['pokemon_id'] for p in body['results']], [4])
+        self.assertEqual(self.get_ids(types='fire', limit=1, cursor=body['next_cursor']), [6])
+
+    def test_broad_paged_filters_scan_by_pokemon_id(self):
+        for pokemon_id in range(10, 30):
+            create_pokemon(pokemon_id, f'oddish-{pokemon_id}')
+
+        def sql(params, limit):
+            queryset = filter_pokemons(Pokemon.objects.all(), params, limit).order_by('pokemon_id')
+            return str(queryset.values('pokemon_id')[:limit].query)
+
+        # Casi todos son de tipo poison: la pagina se llena recorriendo los primeros pokemons.
+        self.assertIn('EXISTS', sql({'types': 'poison'}, 2))
+        self.assertIn('EXISTS', sql({'types': 'grass,poison', 'types_match': 'all', 'max_speed': '45'}, 2))
+        # Un filtro selectivo, o leer todos los resultados, sigue con pk IN.
+        self.assertNotIn('EXISTS', sql({'types': 'flying'}, 2))
+        self.assertNotIn('EXISTS', sql({'types': 'poison', 'min_speed': '100'}, 2))
+        self.assertNotIn('EXISTS', sql({'types': 'poison'}, None))
+
+        self.assertEqual(self.get_ids(types='poison,flying', limit=3), [1, 6, 10])
+        self.assertEqual(self.get_ids(types='grass,poison', types_match='all', max_speed=45, limit=2, cursor=10), [11, 12])
+        self.assertEqual(self.get_ids(types='fire', min_speed=46, limit=2), [6])
+
+    def test_filter_estimates_are_cached(self):
+        params = {'types': 'fire', 'min_speed': '46', 'limit': '2'}
+        self.client.get(reverse('pokemon_list'), params)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get_ids(**params), [6])
+        self.assertFalse([query for query in queries if 'COUNT(' in query['sql']])
+
+    def test_invalid_params(self):
+        for params in ({'min_speed': 'fast'}, {'types_match': 'some'}, {'ordering': 'sprite_url'},
+                       {'ordering': '-speed', 'limit': 2}):
+            response = self.client.get(reverse('pokemon_list'), params)
+            self.assertEqual(response.status_code, 400, params)
+
+
+def pokemon_payload(pokemon_id, name):
+    return {
+        'pokemon_id': pokemon_id,
+        'name': name,
+        'height': 7,
+        'weight': 69,
+        'sprite_url': f'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/{pokemon_id}.png',
+        'types': ['grass', 'poison'],
+        'abilities': ['overgrow', 'chlorophyll'],
+        'base_stats': {'hp': 45, 'attack': 49, 'defense': 49, 'special_attack': 65, 'special_defense': 65, 'speed': 45},
+    }
+
+
+class ScoreColumnTests(TestCase):
+
+    def test_score_is_stored_on_add_and_update(self):
+        self.client.post(reverse('add_pokemon'), pokemon_payload(1, 'bulbasaur'), content_type='application/json')
+        self.assertEqual(Pokemon.objects.get(pokemon_id=1).score, 104.2)
+
+        self.client.patch(reverse('update_pokemon', args=[1]), {'weight': 79, 'types': ['grass']}, content_type='application/json')
+        self.assertEqual(Pokemon.objects.get(pokemon_id=1).score, 104.8)
+
+    def test_bulk_import_stores_score(self):
+        self.client.post(reverse('bulk_add_pokemon'), [pokemon_payload(1, 'bulbasaur')], content_type='application/json')
+        self.assertEqual(Pokemon.objects.get(pokemon_id=1).score, 104.2)
+
+    def test_leaderboard_is_ordered_by_score(self):
+        for pokemon_id, types in ((1, ['grass']), (2, ['grass', 'poison']), (3, ['fire']), (4, ['grass', 'poison', 'fire'])):
+            create_pokemon(pokemon_id, f'pokemon-{pokemon_id}', types=types)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('pokemon_leaderboard'), {'limit': 2, 'offset': 1})
+        self.assertEqual(response.json(), [
+            {'rank': 2, 'pokemon_id': 2, 'name': 'pokemon-2', 'pokemon_score': 104.2},
+            {'rank': 3, 'pokemon_id': 1, 'name': 'pokemon-1', 'pokemon_score': 103.8},
+        ])
+        self.assertEqual(self.client.get(reverse('pokemon_leaderboard'), {'limit': 0}).status_code, 400)
+
+    def test_leaderboard_with_custom_weights_is_scored_in_sql(self):
+        create_pokemon(1, 'bulbasaur', types=['grass', 'poison'], abilities=['overgrow'])
+        create_pokemon(2, 'oddish', types=['grass'], abilities=['chlorophyll', 'run-away', 'stench'])
+        Stat.objects.filter(pokemon__pokemon_id=2).update(speed=30)
+        ScoreService.refresh_scores()
+
+        params = {'w_types': 1, 'w_stats': 0, 'w_abilities': 5.125, 'w_other': 0}
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('pokemon_leaderboard'), params)
+        self.assertEqual([row['pokemon_id'] for row in response.json()], [2, 1])
+        self.assertEqual(response.json()[0]['pokemon_score'], 16.38)
+
+        default = self.client.get(reverse('pokemon_leaderboard'), {'w_types': ScoreService.PESO_TIPOS}).json()
+        self.assertEqual([row['pokemon_score'] for row in default], list(Pokemon.objects.order_by('-score').values_list('score', flat=True)))
+        self.assertEqual(self.client.get(reverse('pokemon_leaderboard'), {'w_stats': 'nan'}).status_code, 400)
+
+
+@override_settings(POKEMON_RESPONSE_CACHE={'ENABLED': False})
+class ConditionalGetTests(TestCase):
+
+    def test_detail_returns_304_while_unchanged(self):
+        create_pokemon(1, 'bulbasaur')
+        response = self.client.get(reverse('pokemon_detail', args=[1]))
+        etag = response['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('pokemon_detail', args=[1]), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_relation_updates_change_the_etag(self):
+        create_pokemon(1, 'bulbasaur')
+        etag = self.client.get(reverse('pokemon_detail', args=[1]))['ETag']
+
+        for data in ({'types': ['grass']}, {'base_stats': {**pokemon_payload(1, 'bulbasaur')['base_stats'], 'speed': 50}}):
+            self.client.patch(reverse('update_pokemon', args=[1]), data, content_type='application/json')
+            response = self.client.get(reverse('pokemon_detail', args=[1]), HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+            etag = response['ETag']
+
+    def test_list_validator_uses_one_aggregate_query(self):
+        create_pokemon(1, 'bulbasaur')
+        create_pokemon(2, 'ivysaur')
+        etag = self.client.get(reverse('pokemon_list'))['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('pokemon_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('Accept', response['Vary'])
+
+        self.assertNotEqual(self.client.get(reverse('pokemon_list'), {'limit': 1})['ETag'], etag)
+        self.client.delete(reverse('delete_pokemon', args=[2]))
+        self.assertEqual(self.client.get(reverse('pokemon_list'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_has_no_last_modified(self):
+        # Max(updated_at) no cambia al borrar: If-Modified-Since responderia 304 con el catalogo antiguo.
+        create_pokemon(1, 'bulbasaur')
+        create_pokemon(2, 'ivysaur')
+        response = self.client.get(reverse('pokemon_list'))
+        self.assertNotIn('Last-Modified', response)
+        self.assertIn('Accept', response['Vary'])
+
+        self.client.delete(reverse('delete_pokemon', args=[1]))
+        response = self.client.get(reverse('pokemon_list'), HTTP_IF_MODIFIED_SINCE=http_date())
+        self.assertEqual([pokemon['pokemon_id'] for pokemon in response.json()], [2])
+
+
+class ResponseCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_reads_are_served_from_cache_until_a_write(self):
+        create_pokemon(1, 'bulbasaur')
+        for url in (reverse('pokemon_detail', args=[1]), reverse('cal_pokemon_score', args=[1]), reverse('pokemon_list')):
+            first = self.client.get(url)
+            with self.assertNumQueries(0):
+                second = self.client.get(url)
+            self.assertEqual(second.content, first.content)
+            self.assertEqual(second['Content-Type'], first['Content-Type'])
+
+        self.client.patch(reverse('update_pokemon', args=[1]), {'weight': 79}, content_type='application/json')
+        self.assertEqual(self.client.get(reverse('pokemon_detail', args=[1])).json()['weight'], 79)
+        self.assertEqual(self.client.get(reverse('cal_pokemon_score', args=[1])).json(), {'pokemon_score': 105.2})
+        self.assertEqual(self.client.get(reverse('pokemon_list')).json()[0]['weight'], 79)
+
+        stats = self.client.get(reverse('cache_stats')).json()['responses']
+        self.assertGreaterEqual(stats['detail']['hits'], 1)
+
+    def test_cached_hit_answers_conditional_requests(self):
+        create_pokemon(1, 'bulbasaur')
+        etag = self.client.get(reverse('pokemon_detail', args=[1]))['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('pokemon_detail', args=[1]), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_add_delete_and_id_change_invalidate_not_found_and_list(self):
+        self.assertEqual(self.client.get(reverse('pokemon_detail', args=[1])).status_code, 404)
+        self.client.post(reverse('add_pokemon'), pokemon_payload(1, 'bulbasaur'), content_type='application/json')
+        self.assertEqual(self.client.get(reverse('pokemon_detail', args=[1])).status_code, 200)
+        self.assertEqual(len(self.client.get(reverse('pokemon_list')).json()), 1)
+
+        self.client.patch(reverse('update_pokemon', args=[1]), {'pokemon_id': 2}, content_type='application/json')
+        self.assertEqual(self.client.get(reverse('pokemon_detail', args=[1])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('pokemon_detail', args=[2])).status_code, 200)
+
+        self.client.delete(reverse('delete_pokemon', args=[2]))
+        self.assertEqual(self.client.get(reverse('cal_pokemon_score', args=[2])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('pokemon_list')).json(), [])
+
+    def test_bulk_import_invalidates_everything(self):
+        self.assertEqual(self.client.get(reverse('pokemon_list')).json(), [])
+        self.client.post(reverse('bulk_add_pokemon'), [pokemon_payload(1, 'bulbasaur')], content_type='application/json')
+        self.assertEqual(len(self.client.get(reverse('pokemon_list')).json()), 1)
+
+    def test_writes_in_another_process_invalidate_cached_responses(self):
+        create_pokemon(1, 'bulbasaur')
+        self.client.get(reverse('pokemon_detail', args=[1]))
+        self.client.get(reverse('pokemon_detail', args=[1]))
+        hits, misses = (response_cache_stats()['detail'][counter] for counter in ('hits', 'misses'))
+
+        run_in_another_process('from pokemon.response_cache import invalidate_pokemon; invalidate_pokemon(1)')
+        self.client.get(reverse('pokemon_detail', args=[1]))
+        stats = response_cache_stats()['detail']
+        self.assertEqual((stats['hits'], stats['misses']), (hits, misses + 1))
+
+    def test_version_cache_must_be_shared(self):
+        self.assertEqual(check_version_cache(None), [])
+        locmem = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+        with self.settings(CACHES={'default': locmem, 'pokemon-versions': locmem}):
+            self.assertEqual([error.id for error in check_version_cache(None)], ['pokemon.E001'])
+        with self.settings(CACHES={'default': locmem}):
+            self.assertEqual([error.id for error in check_version_cache(None)], ['pokemon.E002'])
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        # Un contador nuevo obliga a reconstruir el indice con los pokemons de este test.
+        get_version_cache().delete(VERSION_KEY)
+        for pokemon_id, name in ((1, 'bulbasaur'), (2, 'ivysaur'), (3, 'venusaur'), (25, 'pikachu'), (26, 'raichu')):
+            create_pokemon(pokemon_id, name)
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('search_pokemon'), {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(result['name'], result['match'], result['distance']) for result in response.json()]
+
+    def test_results_are_ranked_by_match_kind(self):
+        self.assertEqual(self.search('Ivysaur'), [('ivysaur', 'exact', 0)])
+        self.assertEqual(self.search('saur'), [
+            ('ivysaur', 'substring', 0), ('venusaur', 'substring', 0), ('bulbasaur', 'substring', 0),
+        ])
+        self.assertEqual(self.search('chu'), [('raichu', 'substring', 0), ('pikachu', 'substring', 0)])
+        self.assertEqual(self.search('pi'), [('pikachu', 'prefix', 0)])
+        self.assertEqual(self.search('bulbsaur'), [('bulbasaur', 'fuzzy', 1)])
+        self.assertEqual(self.search('pikahcu'), [('pikachu', 'fuzzy', 1)])
+        self.assertEqual(self.search('saur', limit=1), [('ivysaur', 'substring', 0)])
+        self.assertEqual(self.search('missingno'), [])
+
+    def test_transpositions_at_the_start_are_fuzzy_matches(self):
+        create_pokemon(23, 'ekans')
+        create_pokemon(63, 'abra')
+        self.assertEqual(self.search('keans'), [('ekans', 'fuzzy', 1)])
+        self.assertEqual(self.search('bara'), [('abra', 'fuzzy', 1)])
+        self.assertEqual(self.search('ipkachu'), [('pikachu', 'fuzzy', 1)])
+
+    def test_index_follows_committed_writes(self):
+        self.addCleanup(clear_vocabularies)
+        self.search('pikachu')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('update_pokemon', args=[25]), {'name': 'pichu'}, content_type='application/json')
+            self.client.delete(reverse('delete_pokemon', args=[26]))
+            self.client.post(reverse('bulk_add_pokemon'), [pokemon_payload(4, 'charmander')], content_type='application/json')
+
+        # Las escrituras de este proceso se aplican al indice sin reconstruirlo.
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search('pi'), [('pichu', 'prefix', 0)])
+            self.assertEqual(self.search('raichu'), [('pichu', 'fuzzy', 2)])
+            self.assertEqual(self.search('charmandr'), [('charmander', 'fuzzy', 1)])
+
+    def test_writes_from_another_process_are_replayed(self):
+        self.search('pikachu')
+        raichu = Pokemon.objects.get(pokemon_id=26)
+        # Otro proceso renombra a raichu y borra a pikachu: solo publica las filas.
+        publish_changes(upserts=[(raichu.pk, 'alakazam', 26)])
+        publish_changes(deletes=[Pokemon.objects.get(pokemon_id=25).pk])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search('alakazam'), [('alakazam', 'exact', 0)])
+            self.assertEqual(self.search('pikachu'), [])
+
+    def test_counter_values_taken_by_another_process_are_skipped(self):
+        self.search('pikachu')
+        version = get_version()
+        publish_changes(upserts=[(Pokemon.objects.get(pokemon_id=26).pk, 'alakazam', 26)])
+        # Otro proceso leyo el contador a la vez y obtiene el mismo numero al incrementarlo.
+        get_version_cache().set(VERSION_KEY, version, timeout=None)
+        self.assertEqual(publish_changes(deletes=[Pokemon.objects.get(pokemon_id=25).pk]), version + 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search('alakazam'), [('alakazam', 'exact', 0)])
+            self.assertEqual(self.search('pikachu'), [])
+
+    def test_lost_changes_rebuild_the_index(self):
+        self.search('pikachu')
+        Pokemon.objects.filter(pokemon_id=26).update(name='alakazam')
+        bump_version()
+        # Mientras la escritura puede estar en camino se sigue usando el indice actual.
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search('alakazam'), [])
+        with mock.patch('pokemon.search.PUBLISH_GRACE', 0):
+            self.assertEqual(self.search('alakazam'), [('alakazam', 'exact', 0)])
+
+    def test_missing_query(self):
+        self.assertEqual(self.client.get(reverse('search_pokemon')).status_code, 400)
+        self.assertEqual(self.client.get(reverse('search_pokemon'), {'q': 'pika', 'limit': 0}).status_code, 400)
+
+    def test_edit_distance_counts_adjacent_transpositions_as_one_edit(self):
+        self.assertEqual(edit_distance('pikachu', 'pikachu'), 0)
+        self.assertEqual(edit_distance('pikahcu', 'pikachu'), 1)
+        self.assertEqual(edit_distance('bulbsaur', 'bulbasaur'), 1)
+        self.assertEqual(edit_distance('kitten', 'sitting'), 3)
+        self.assertEqual(edit_distance('ca', 'abc'), 3)
+
+
+class UniquenessTests(TestCase):
+
+    def test_duplicated_pokemon_id_returns_validation_error(self):
+        self.client.post(reverse('add_pokemon'), pokemon_payload(1, 'bulbasaur'), content_type='application/json')
+        response = self.client.post(reverse('add_pokemon'), pokemon_payload(1, 'other'), content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'pokemon_id': ['A Pokemon with Id 1 already exists.']})
+        self.assertEqual(Pokemon.objects.count(), 1)
+
+    def test_duplicated_name_on_update_returns_validation_error(self):
+        create_pokemon(1, 'bulbasaur')
+        create_pokemon(2, 'ivysaur')
+        response = self.client.patch(reverse('update_pokemon', args=[2]), {'name': 'bulbasaur'}, content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'name': ['A Pokemon with name bulbasaur already exists.']})
+        self.assertEqual(Pokemon.objects.get(pokemon_id=2).name, 'ivysaur')
+
+    def test_create_does_not_precheck_uniqueness(self):
+        with self.assertNumQueries(0):
+            serializer = PokemonSerializer(data=pokemon_payload(1, 'bulbasaur'))
+            self.assertTrue(serializer.is_valid())
+
+
+class UpdateTests(TestCase):
+
+    def setUp(self):
+        self.pokemon = create_pokemon(1, 'bulbasaur')
+
+    def patch(self, payload):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(reverse('update_pokemon', args=[1]), payload, content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        # Sin contar el SAVEPOINT / RELEASE del bloque atomic.
+        statements = [query['sql'] for query in queries if 'SAVEPOINT' not in query['sql']]
+        return response.json(), statements
+
+    def test_patch_of_fields_and_stats_runs_four_queries(self):
+        # Lectura del pokemon con su estadistica, lectura de las relaciones y un UPDATE por tabla
+        # (el del pokemon tambien escribe su documento).
+        body, statements = self.patch({'weight': 79, 'base_stats': {'speed': 50}})
+        self.assertEqual(len(statements), 4, statements)
+        self.assertEqual(body['base_stats']['speed'], 50)
+        self.assertEqual(sorted(body['types']), ['grass', 'poison'])
+
+        stat = Stat.objects.get(pokemon=self.pokemon)
+        self.assertEqual((stat.pk, stat.speed, stat.hp), (self.pokemon.base_stats.pk, 50, 45))
+        self.assertEqual(Pokemon.objects.get(pk=self.pokemon.pk).score, 106.7)
+
+    def test_relations_are_updated_by_difference(self):
+        Type.objects.create(name='fire')
+        through = Pokemon.types.through
+        kept = through.objects.get(pokemon=self.pokemon, type__name='grass').pk
+        self.addCleanup(clear_vocabularies)
+        with self.captureOnCommitCallbacks(execute=True):
+            warm_vocabularies()
+
+        body, statements = self.patch({'types': ['grass', 'fire', 'fire']})
+        self.assertEqual(len(statements), 5, statements)
+        self.assertEqual(body['types'], ['grass', 'fire'])
+        self.assertEqual(sorted(through.objects.filter(pokemon=self.pokemon).values_list('type__name', flat=True)), ['fire', 'grass'])
+        self.assertTrue(through.objects.filter(pk=kept).exists())
+
+        body, _ = self.patch({'abilities': ['overgrow', 'new-ability']})
+        self.assertEqual(sorted(self.pokemon.abilities.values_list('name', flat=True)), ['new-ability', 'overgrow'])
+
+    def test_unchanged_payload_does_not_write(self):
+        updated_at = Pokemon.objects.get(pk=self.pokemon.pk).updated_at
+        _, statements = self.patch({'name': 'bulbasaur', 'types': ['poison', 'grass'], 'base_stats': {'hp': 45}})
+        self.assertFalse([sql for sql in statements if not sql.startswith('SELECT')], statements)
+        self.assertEqual(Pokemon.objects.get(pk=self.pokemon.pk).updated_at, updated_at)
+
+
+class VocabularyTests(TestCase):
+
+    def setUp(self):
+        self.addCleanup(clear_vocabularies)
+        create_pokemon(1, 'bulbasaur')
+        with self.captureOnCommitCallbacks(execute=True):
+            warm_vocabularies()
+
+    def vocabulary_queries(self, queries):
+        return [
+            query['sql'] for query in queries
+            if 'FROM "pokemon_type"' in query['sql'] or 'FROM "pokemon_ability"' in query['sql']
+        ]
+
+    def test_writes_with_known_names_do_not_query_the_vocabulary(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('add_pokemon'), pokemon_payload(2, 'ivysaur'), content_type='application/json')
+            self.client.patch(reverse('update_pokemon', args=[1]), {'types': ['poison']}, content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(sorted(response.json()['types']), ['grass', 'poison'])
+        self.assertEqual(self.vocabulary_queries(queries), [])
+
+    def test_new_names_are_remembered_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            ids = type_ids.resolve(['fire'])
+        self.assertEqual(ids, {'fire': Type.objects.get(name='fire').pk})
+        self.assertNotIn('fire', type_ids._ids)
+
+        for callback in callbacks:
+            callback()
+        with self.assertNumQueries(0):
+            self.assertEqual(type_ids.resolve(['fire', 'grass'])['fire'], ids['fire'])
+
+    def test_rename_invalidates_the_vocabulary(self):
+        grass = Type.objects.get(name='grass')
+        grass.name = 'planta'
+        grass.save()
+        # El id de grass ya no vale: se busca, no existe y se crea de nuevo.
+        with CaptureQueriesContext(connection) as queries:
+            self.assertNotEqual(type_ids.resolve(['grass'])['grass'], grass.pk)
+        self.assertEqual(len(self.vocabulary_queries(queries)), 2)
+
+    def test_invalidation_in_another_process_empties_the_vocabulary(self):
+        with self.assertNumQueries(0):
+            grass = type_ids.resolve(['grass'])['grass']
+        run_in_another_process('from pokemon.vocabulary import invalidate_vocabularies; invalidate_vocabularies()')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(type_ids.resolve(['grass'])['grass'], grass)
+        self.assertEqual(len(self.vocabulary_queries(queries)), 1)
+
+
+@override_settings(POKEMON_RESPONSE_CACHE={'ENABLED': False})
+class RendererTests(TestCase):
+
+    def setUp(self):
+        create_pokemon(1, 'bulbasaur')
+        create_pokemon(2, 'nidoran\u2640 \u2028', types=('poison',), abilities=())
+        Stat.objects.filter(pokemon__pokemon_id=2).delete()
+
+    def test_plain_representation_and_orjson_match_drf_byte_for_byte(self):
+        pokemons = Pokemon.objects.with_details().order_by('pokemon_id')
+        expected = JSONRenderer().render(field_serializer_class()(pokemons, many=True).data)
+        self.assertIn(b'\\u2028', expected)
+
+        self.assertEqual(ORJSONRenderer().render(PokemonSerializer(pokemons, many=True).data), expected)
+        self.assertEqual(self.client.get(reverse('pokemon_list')).content, expected)
+        self.assertEqual(
+            self.client.get(reverse('pokemon_detail', args=[2])).content,
+            JSONRenderer().render(field_serializer_class()(pokemons[1]).data),
+        )
+
+    def test_indented_json_uses_the_drf_renderer(self):
+        response = self.client.get(reverse('pokemon_detail', args=[1]), HTTP_ACCEPT='application/json; indent=2')
+        self.assertTrue(response.content.startswith(b'{\n  "id"'))
+
+    @skipUnless(msgpack, 'msgpack is not installed')
+    def test_msgpack_is_negotiated_with_accept(self):
+        response = self.client.get(reverse('pokemon_detail', args=[1]), HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content)['name'], 'bulbasaur')
+
+    @skipUnless(msgpack is None, 'msgpack is installed')
+    def test_msgpack_is_not_offered_without_msgpack(self):
+        response = self.client.get(reverse('pokemon_detail', args=[1]), HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, 406)
+
+
+class BulkImportTests(TestCase):
+
+    def test_bulk_import_json_array_reports_errors_per_item(self):
+        create_pokemon(1, 'bulbasaur')
+        payload = [
+            pokemon_payload(1, 'bulbasaur'),
+            pokemon_payload(2, 'ivysaur'),
+            pokemon_payload(3, 'venusaur'),
+            pokemon_payload(3, 'venusaur'),
+            {'name': 'charmander'},
+        ]
+        response = self.client.post(reverse('bulk_add_pokemon'), payload, content_type='application/json')
+
+        self.assertEqual(response.status_code, 207)
+        body = response.json()
+        self.assertEqual(body['created'], 2)
+        self.assertEqual([error['index'] for error in body['errors']], [0, 3, 4])
+        self.assertEqual(body['errors'][0]['errors'], {'pokemon_id': ['A Pokemon with Id 1 already exists.']})
+
+        ivysaur = Pokemon.objects.with_details().get(pokemon_id=2)
+        self.assertEqual(sorted(t.name for t in ivysaur.types.all()), ['grass', 'poison'])
+        self.assertEqual(ivysaur.base_stats.speed, 45)
+
+    def test_bulk_import_ndjson_query_count_does_not_grow_with_items(self):
+        lines = [json.dumps(pokemon_payload(pokemon_id, f'pokemon-{pokemon_id}')) for pokemon_id in range(1, 51)]
+        lines.insert(10, '{not json')
+        # Savepoint, duplicados, tipos y habilidades (consulta, alta y relectura) y cuatro bulk_create.
+        with self.assertNumQueries(13):
+            response = self.client.post(
+                reverse('bulk_add_pokemon'), '\n'.join(lines), content_type='application/x-ndjson; charset=utf-8'
+            )
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.json()['created'], 50)
+        self.assertEqual(response.json()['errors'][0]['index'], 10)
+        self.assertEqual(Pokemon.objects.count(), 50)
@@ -1,13 +1,29 @@
 from .service import PokemonApiService
 from .service import ScoreService
+from .service import get_pokeapi_settings
+from .client import PokeApiError, PokeApiUnavailable
 
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
 from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from .models import Pokemon
+from .metrics import registry
+from .response_cache import cache_response, response_cache_stats
+from .conditional import (
+    pokemon_detail_etag, pokemon_detail_last_modified, pokemon_list_etag,
+)
 from .serializers import PokemonSerializer
+from .documents import detail_document, document_contents, document_rows, iter_ndjson_documents, list_document, page_document
+from .renderers import renders_compact_json
+from .importer import PokemonImporter, parse_ndjson
+from .search import search_pokemons
+from .filters import FilterError, filter_pokemons, parse_fieldset, parse_ordering
+from .pagination import PaginationError, get_page_max_limit, get_stream_chunk_size, iter_ndjson, keyset_page, parse_positive_int
 from django.db import IntegrityError
 
 
@@ -52,25 +68,132 @@ def add_pokemon(request):
     else:
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def bulk_add_pokemon(request):
+    """Agrega muchos pokemons a la base de datos en una sola transacción.
+    Args:
+        request (Request): Request de la petición. El cuerpo es un array JSON de pokemons con el mismo
+            formato que add_pokemon, o un pokemon por línea si el Content-Type es application/x-ndjson.
+    Returns:
+        Response: Número de pokemons creados y errores por posición del elemento en el cuerpo.
+            201 si se crearon todos, 207 si solo algunos y 400 si ninguno.
+    Examples:
+        >>> bulk_add_pokemon([{"pokemon_id": 1, "name": "bulbasaur", ...}, {"pokemon_id": 1, "name": "bulbasaur", ...}])
+        {
+            "created": 1,
+            "errors": [{"index": 1, "errors": {"pokemon_id": ["A Pokemon with Id 1 already exists."]}}]
+        }
+    """
+    importer = PokemonImporter()
+    # content_type conserva los parametros del media type (por ejemplo '; charset=utf-8').
+    if request.content_type.split(';')[0].strip() == 'application/x-ndjson':
+        items = parse_ndjson(request.stream or [])
+    elif isinstance(request.data, list):
+        items = request.data
+    else:
+        return Response({'detail': 'Expected a list of pokemons.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        report = importer.run(items)
+    except IntegrityError as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    if not report['errors']:
+        return Response(report, status=status.HTTP_201_CREATED)
+    if report['created']:
+        return Response(report, status=status.HTTP_207_MULTI_STATUS)
+    return Response(report, status=status.HTTP_400_BAD_REQUEST)
+
+@cache_response('list')
+@vary_on_headers('Accept')
+@condition(etag_func=pokemon_list_etag)
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def list_pokemon(request):
-    """Lista todos los pokemons de la base de datos."""
+    """Lista todos los pokemons de la base de datos.
+    Args:
+        request (Request): Request de la petición. Acepta los query params opcionales:
+            limit (int): Activa la paginación por cursor ordenada por pokemon_id.
+            cursor (int): Valor de next_cursor devuelto por la página anterior.
+            stream (str): 'ndjson' para exportar el catálogo completo en streaming, una línea JSON por pokemon.
+            types, abilities (str): Nombres separados por comas; types_match / abilities_match 'any' (por defecto) o 'all'.
+            min_<campo>, max_<campo> (int): Rangos inclusivos sobre height, weight y cada estadistica base.
+            ordering (str): Campos separados por comas, con '-' para orden descendente. Solo sin paginación ni streaming.
+            fields, exclude (str): Campos de cada pokemon a incluir o a quitar, separados por comas. Solo se
+                consultan las columnas y relaciones de los campos que quedan.
+        Responde 304 si el ETag de If-None-Match sigue vigente.
+        Las respuestas JSON se construyen concatenando los documentos guardados (ver documents.py).
+    Returns:
+        Response: Array con todos los pokemons, o {"results": [...], "next_cursor": int|null} si se indica limit.
+    Examples:
+        >>> list_pokemon('?limit=2')
+        {
+            "results": [{"pokemon_id": 1, "name": "bulbasaur", ...}, {"pokemon_id": 2, "name": "ivysaur", ...}],
+            "next_cursor": 2
+        }
+    """
     try:
-        pokemons = Pokemon.objects.all()
-        serializer = PokemonSerializer(pokemons, many=True)
+        paginated = 'limit' in request.query_params or 'cursor' in request.query_params
+        stream = request.query_params.get('stream') == 'ndjson'
+        try:
+            ordering = parse_ordering(request.query_params.get('ordering', ''))
+            fields = parse_fieldset(request.query_params)
+            if ordering != ['pokemon_id'] and (paginated or stream):
+                raise FilterError("'ordering' is not supported with cursor pagination or streaming, which are ordered by pokemon_id.")
+            limit = cursor = None
+            if paginated:
+                limit = parse_positive_int(request.query_params.get('limit', get_page_max_limit()), 'limit', minimum=1)
+                limit = min(limit, get_page_max_limit())
+                cursor = request.query_params.get('cursor')
+                cursor = parse_positive_int(cursor, 'cursor') if cursor is not None else None
+            elif stream:
+                limit = get_stream_chunk_size()
+            queryset = Pokemon.objects.with_details() if fields is None else Pokemon.objects.with_fields(fields)
+            pokemons = filter_pokemons(queryset, request.query_params, limit)
+        except (FilterError, PaginationError) as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if stream:
+            if fields is None:
+                lines = iter_ndjson_documents(pokemons, limit)
+            else:
+                lines = iter_ndjson(pokemons, PokemonSerializer, limit, fields=fields)
+            return StreamingHttpResponse(lines, content_type='application/x-ndjson')
+
+        # Los documentos guardados tienen todos los campos: con fields o exclude se serializa.
+        if fields is None and renders_compact_json(request):
+            if paginated:
+                page, next_cursor = keyset_page(document_rows(pokemons), limit, cursor)
+                content = page_document(document_contents(page), next_cursor)
+            else:
+                content = list_document(document_contents(document_rows(pokemons).order_by(*ordering)))
+            return HttpResponse(content, content_type='application/json', status=status.HTTP_200_OK)
+
+        if paginated:
+            page, next_cursor = keyset_page(pokemons, limit, cursor)
+            serializer = PokemonSerializer(page, many=True, fields=fields)
+            return Response({'results': serializer.data, 'next_cursor': next_cursor}, status=status.HTTP_200_OK)
+
+        serializer = PokemonSerializer(pokemons.order_by(*ordering), many=True, fields=fields)
         return Response(serializer.data, status=status.HTTP_200_OK)
     except Pokemon.DoesNotExist:
         return Response([], status=status.HTTP_404_NOT_FOUND)
     
+@cache_response('detail')
+@vary_on_headers('Accept')
+@condition(etag_func=pokemon_detail_etag, last_modified_func=pokemon_detail_last_modified)
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_pokemon(request, pokemon_id):
     """Obtiene un pokemon por su id.
     Args:
         pokemon_id (int): Id del pokemon.
+        request (Request): Acepta ?fields= y ?exclude= como list_pokemon.
     Returns:
         Response: Respuesta de la petición, array con un pokemon si este fue encontrado o un array vacio en el caso contrario.
+        304 sin cuerpo si el ETag o la fecha de If-None-Match / If-Modified-Since siguen vigentes.
+        En JSON se responde con el documento guardado del pokemon si lo tiene (ver documents.py).
     Examples:  
         >>> get_pokemon(1)
         {
@@ -85,8 +208,17 @@ def get_pokemon(request, pokemon_id):
         }
         """
     try:
-        pokemon = get_object_or_404(Pokemon, pokemon_id=pokemon_id)
-        serializer = PokemonSerializer(pokemon)
+        fields = parse_fieldset(request.query_params)
+    except FilterError as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if fields is None and renders_compact_json(request):
+        content = detail_document(pokemon_id)
+        if content is not None:
+            return HttpResponse(content, content_type='application/json', status=status.HTTP_200_OK)
+    try:
+        queryset = Pokemon.objects.with_details() if fields is None else Pokemon.objects.with_fields(fields)
+        pokemon = get_object_or_404(queryset, pokemon_id=pokemon_id)
+        serializer = PokemonSerializer(pokemon, fields=fields)
         return Response(serializer.data, status=status.HTTP_200_OK)
     except Pokemon.DoesNotExist:
         return Response({'error': 'Pokemon not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -99,6 +231,7 @@ def find_pokemon_by_name_or_id(request, text):
         text (str): Nombre o id del pokemon.
     Returns:
         Response: Respuesta de la petición, array con un pokemon si este fue encontrado o un array vacio en el caso contrario.
+            502 si la pokeapi falla y 503 si se ha dejado de llamar a la pokeapi por fallos repetidos.
     Examples:
         >>> find_pokemon_by_name_or_id('bulbasaur')
         {
@@ -114,30 +247,113 @@ def find_pokemon_by_name_or_id(request, text):
     """
     try:
         pokemon_data = PokemonApiService.get_pokemon_data(text)
-        print(pokemon_data)
-        if not pokemon_data:
-            return Response([], status=status.HTTP_404_NOT_FOUND)
-        return Response([pokemon_data], status=status.HTTP_200_OK)
-    except:
+    except PokeApiUnavailable as e:
+        return Response({'detail': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    except PokeApiError as e:
+        return Response({'detail': str(e)}, status=status.HTTP_502_BAD_GATEWAY)
+    if not pokemon_data:
         return Response([], status=status.HTTP_404_NOT_FOUND)
+    return Response([pokemon_data], status=status.HTTP_200_OK)
     
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def find_pokemon_batch(request):
+    """Obtiene varios pokemons de la pokeapi en una sola petición, consultándolos en paralelo.
+    Args:
+        request (Request): Request de la petición con el query param names, nombres o ids separados por comas.
+    Returns:
+        Response: Array con un resultado por nombre, en el mismo orden, con su propio status.
+    Examples:
+        >>> find_pokemon_batch('?names=bulbasaur,missingno')
+        [
+            {"query": "bulbasaur", "status": 200, "data": {"pokemon_id": 1, "name": "bulbasaur", ...}},
+            {"query": "missingno", "status": 404, "data": null}
+        ]
+    """
+    names = [name.strip() for name in request.query_params.get('names', '').split(',') if name.strip()]
+    max_names = get_pokeapi_settings()['BATCH_MAX_NAMES']
+    if not names:
+        return Response({'detail': "The 'names' query parameter is required."}, status=status.HTTP_400_BAD_REQUEST)
+    if len(names) > max_names:
+        return Response({'detail': f'At most {max_names} names are allowed per request.'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(PokemonApiService.get_many_pokemon_data(names), status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def search_pokemon(request):
+    """Busca pokemons registrados por nombre sin consultar la pokeapi.
+    Devuelve primero la coincidencia exacta, despues los nombres que empiezan por el texto, los
+    que lo contienen y por ultimo los que estan a una o dos ediciones (segun su longitud).
+    Args:
+        request (Request): Request de la petición con ?q= y opcionalmente ?limit= (10 por defecto).
+    Returns:
+        Response: Lista de coincidencias ordenadas por relevancia.
+    Examples:
+        >>> search_pokemon('?q=bulbsaur')
+        [{"pokemon_id": 1, "name": "bulbasaur", "match": "fuzzy", "distance": 1}]
+    """
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({'detail': "The 'q' query parameter is required."}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = min(parse_positive_int(request.query_params.get('limit', 10), 'limit', minimum=1), get_page_max_limit())
+    except PaginationError as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(search_pokemons(query, limit), status=status.HTTP_200_OK)
+
+@cache_response('score')
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def pokemon_score(request, pokemon_id):
-    """Calcula el puntaje de un pokemon.
+    """Devuelve el puntaje de un pokemon.
+    El puntaje se guarda en cada escritura, por lo que se lee con una sola consulta.
     Args:
         pokemon_id (int): Id del pokemon.
     Returns:
         Response: Respuesta de la petición, json con el puntaje del pokemon si este fue encontrado o un json vacio en el caso contrario."""
-    try:
-        
-        pokemon = get_object_or_404(Pokemon, pokemon_id=pokemon_id)
-        serializer = PokemonSerializer(pokemon)
-        pokemon_score = ScoreService.calculate_score(serializer.data)
-        return Response(pokemon_score, status=status.HTTP_200_OK)
-    except Exception as e:
+    score = Pokemon.objects.filter(pokemon_id=pokemon_id).values_list('score', flat=True).first()
+    if score is None:
         return Response({}, status=status.HTTP_404_NOT_FOUND)
-    
+    return Response({"pokemon_score": score}, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def pokemon_leaderboard(request):
+    """Lista los pokemons con mayor puntaje.
+    Con los pesos por defecto recorre el indice (-score, pokemon_id), por lo que no ordena la tabla
+    completa. Si se pasa algun peso (?w_types=, ?w_stats=, ?w_abilities=, ?w_other=) el puntaje se
+    calcula y ordena en la base de datos con ScoreService.score_expression, en una sola consulta.
+    Args:
+        request (Request): Request de la petición. Acepta ?limit= (10 por defecto), ?offset= y los pesos.
+    Returns:
+        Response: Lista con la posicion, el id, el nombre y el puntaje de cada pokemon.
+    Examples:
+        >>> pokemon_leaderboard('?limit=2')
+        [
+            {"rank": 1, "pokemon_id": 6, "name": "charizard", "pokemon_score": 253.6},
+            {"rank": 2, "pokemon_id": 3, "name": "venusaur", "pokemon_score": 241.5}
+        ]
+    """
+    try:
+        limit = min(parse_positive_int(request.query_params.get('limit', 10), 'limit', minimum=1), get_page_max_limit())
+        offset = parse_positive_int(request.query_params.get('offset', 0), 'offset')
+        weights = ScoreService.parse_weights(request.query_params)
+    except (PaginationError, ValueError) as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    if any(param in request.query_params for param in ScoreService.WEIGHT_PARAMS):
+        rows = [
+            (pokemon_id, name, round(score, 2))
+            for pokemon_id, name, score in Pokemon.objects.annotate(custom_score=ScoreService.score_expression(weights))
+            .order_by('-custom_score', 'pokemon_id').values_list('pokemon_id', 'name', 'custom_score')[offset:offset + limit]
+        ]
+    else:
+        rows = Pokemon.objects.order_by('-score', 'pokemon_id').values_list('pokemon_id', 'name', 'score')[offset:offset + limit]
+    return Response([
+        {'rank': rank, 'pokemon_id': pokemon_id, 'name': name, 'pokemon_score': score}
+        for rank, (pokemon_id, name, score) in enumerate(rows, start=offset + 1)
+    ], status=status.HTTP_200_OK)
 
 
 @api_view(['DELETE'])
@@ -179,7 +395,8 @@ def update_pokemon(request, pokemon_id):
         }
 
         """
-    pokemon = get_object_or_404(Pokemon, pokemon_id=pokemon_id)
+    # El documento no se lee: update() lo regenera en el mismo UPDATE del pokemon.
+    pokemon = get_object_or_404(Pokemon.objects.select_related('base_stats').defer('document'), pokemon_id=pokemon_id)
     partial = request.method == 'PATCH'
     serializer = PokemonSerializer(pokemon, data=request.data, partial=partial)
 
@@ -187,4 +404,34 @@ def update_pokemon(request, pokemon_id):
         serializer.save()
         return Response(serializer.data, status=status.HTTP_200_OK)
     else:
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def cache_stats(request):
+    """Estadisticas de las caches para monitorizacion.
+    Los contadores son del proceso que atiende la peticion.
+    Returns:
+        Response: Aciertos, fallos y tasa de acierto de la cache de respuestas por endpoint y de la cache de la pokeapi.
+    Examples:
+        >>> cache_stats()
+        {
+            "responses": {"detail": {"hits": 950, "misses": 50, "hit_ratio": 0.95}},
+            "pokeapi": {"hits": 10, "misses": 2, "hit_ratio": 0.8333, ...}
+        }
+    """
+    return Response({
+        'responses': response_cache_stats(),
+        'pokeapi': PokemonApiService.cache_stats(),
+    }, status=status.HTTP_200_OK)
+
+
+def metrics(request):
+    """Histogramas por endpoint de las peticiones de este proceso, en el formato de texto de Prometheus.
+    Es una vista de Django y no de DRF para no pasar por la negociacion de contenido.
+    Examples:
+        >>> metrics()
+        pokemon_request_duration_seconds_bucket{endpoint="pokemon_detail",le="0.005"} 950
+        ...
+    """
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,123 @@
+"""Cache en memoria del proceso de los ids de Type y Ability por nombre.
+
+Los tipos y habilidades son un vocabulario pequeño que casi no cambia, por lo que cada proceso
+guarda el diccionario nombre -> id y las escrituras resuelven sus nombres sin consultas:
+
+- Se carga entera al abrir la primera conexion a la base de datos (ver PokemonConfig.ready).
+- Los nombres que no estan se buscan todos en una consulta y los que no existen se crean en bloque.
+- Los ids leidos o creados dentro de una transaccion solo se guardan al confirmarla, para no
+  quedarse con ids de filas que se revierten.
+- Borrar o renombrar un tipo o una habilidad cambia una version en la cache de versiones, que
+  comparten todos los procesos (VERSION_CACHE_ALIAS, ver response_cache.py), y los procesos que
+  la ven distinta vacian su copia.
+"""
+import threading
+
+from django.db import DatabaseError, transaction
+from django.db.backends.signals import connection_created
+
+from .models import Ability, Type
+from .response_cache import KEY_PREFIX, get_versions, invalidate
+
+VERSION_KEY = f'{KEY_PREFIX}:version:vocabulary'
+WARM_DISPATCH_UID = 'pokemon_warm_vocabularies'
+
+
+class Vocabulary:
+    """Diccionario nombre -> id de un modelo de vocabulario (Type o Ability)."""
+
+    def __init__(self, model):
+        self.model = model
+        self._ids = {}
+        self._version = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _check_version(self):
+        # La base de datos forma parte de la version: los ids de otra (por ejemplo la de los tests)
+        # no sirven.
+        version = (get_versions([VERSION_KEY])[0], transaction.get_connection().settings_dict['NAME'])
+        if version != self._version:
+            with self._lock:
+                self._ids = {}
+                self._version = version
+
+    def _remember(self, ids):
+        version = self._version
+
+        def remember():
+            with self._lock:
+                # Si la cache se ha vaciado entre tanto, los ids leidos pueden estar obsoletos.
+                if self._version == version:
+                    self._ids.update(ids)
+        if transaction.get_connection().in_atomic_block:
+            transaction.on_commit(remember)
+        else:
+            remember()
+
+    def warm(self):
+        """Carga todo el vocabulario con una consulta."""
+        self._check_version()
+        self._remember(dict(self.model.objects.values_list('name', 'id')))
+
+    def resolve(self, names):
+        """Obtiene los ids de una lista de nombres, creando en bloque los que no existen.
+        Sin consultas si todos los nombres ya estan en la cache.
+        Returns:
+            dict: Diccionario nombre -> id.
+        """
+        self._check_version()
+        known = self._ids
+        ids = {name: known[name] for name in names if name in known}
+        missing = {name for name in names if name not in ids}
+        if not missing:
+            return ids
+
+        found = dict(self.model.objects.filter(name__in=missing).values_list('name', 'id'))
+        missing -= found.keys()
+        if missing:
+            self.model.objects.bulk_create([self.model(name=name) for name in missing], ignore_conflicts=True)
+            found.update(self.model.objects.filter(name__in=missing).values_list('name', 'id'))
+        self._remember(found)
+        ids.update(found)
+        return ids
+
+    def clear(self):
+        with self._lock:
+            self._ids = {}
+            self._version = None
+
+
+type_ids = Vocabulary(Type)
+ability_ids = Vocabulary(Ability)
+VOCABULARIES = {Type: type_ids, Ability: ability_ids}
+
+
+def get_vocabulary(model):
+    return VOCABULARIES[model]
+
+
+def warm_vocabularies(**kwargs):
+    """Receptor de connection_created: carga los vocabularios con la primera conexion.
+    Solo se intenta una vez; si las tablas aun no existen (por ejemplo antes de migrate) los
+    nombres se iran cargando al resolverlos.
+    """
+    connection_created.disconnect(warm_vocabularies, dispatch_uid=WARM_DISPATCH_UID)
+    try:
+        for vocabulary in VOCABULARIES.values():
+            vocabulary.warm()
+    except DatabaseError:
+        for vocabulary in VOCABULARIES.values():
+            vocabulary.clear()
+
+
+def invalidate_vocabularies():
+    """Vacia la cache de todos los procesos, tras borrar o renombrar tipos o habilidades."""
+    invalidate([VERSION_KEY])
+
+
+def clear_vocabularies():
+    for vocabulary in VOCABULARIES.values():
+        vocabulary.clear()